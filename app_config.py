@@ -1,7 +1,6 @@
 """Config parser for secure settings (database)."""
 
 import os
-import yaml
 
 APP_DIR = os.path.dirname(os.path.abspath(__file__))
 
@@ -9,6 +8,9 @@ APP_DIR = os.path.dirname(os.path.abspath(__file__))
 class AppConfig:
     """Class for parsing app settings from config file (secure settings)."""
     def __init__(self):
+        # yaml is imported only by processes, which read the config
+        import yaml
+
         db_config_filename = os.path.join(APP_DIR, 'app.yaml')
         if os.path.isfile(db_config_filename):
             try:
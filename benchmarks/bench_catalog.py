@@ -0,0 +1,116 @@
+"""Benchmark of queries of the local catalog index.
+
+Run from the project directory: python -m benchmarks.bench_catalog
+
+--games synthetic games get tags from a long tail of --tags tags (Zipf
+distribution, like user tags of the store), specs, prices, release dates
+of the last 15 years and num of reviews. Time of building, saving and
+loading of the index, size of the file and latency of typical queries
+(median and max of --repeat runs) are printed.
+"""
+import argparse
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from datetime import date, timedelta
+
+from steamscraping.catalog import CatalogIndex
+
+SPECS = ('Single-player', 'Multi-player', 'Online Co-op', 'Steam Achievements',
+         'Full controller support', 'Partial Controller Support',
+         'Steam Trading Cards', 'Steam Cloud', 'Steam Workshop',
+         'Remote Play Together', 'VR Support', 'In-App Purchases')
+TODAY = date(2024, 6, 30)
+
+
+def make_games(count, tags, seed=0):
+    rand = random.Random(seed)
+    names = ['Roguelike', 'Indie', 'Action'] + \
+        ['Tag {}'.format(index) for index in range(3, tags)]
+    weights = [1 / (rank + 1) for rank in range(tags)]
+    for game_id in range(10, 10 * count + 10, 10):
+        yield game_id, {
+            'price': rand.choice((0, 499, 999, 1499, 1999, 2999, 5999)),
+            'release_date': TODAY - timedelta(days=int(
+                rand.expovariate(1 / 1500)) % 5500),
+            'num_reviews': int(rand.paretovariate(0.8)) - 1,
+            'tags': set(rand.choices(names, weights, k=rand.randint(3, 20))),
+            'specs': rand.sample(SPECS, rand.randint(1, 6)),
+        }
+
+
+def timed(function, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        times.append(time.perf_counter() - start)
+    return result, statistics.median(times) * 1000, max(times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--games', help='number of games', type=int,
+                        default=500000)
+    parser.add_argument('--tags', help='number of tags', type=int,
+                        default=400)
+    parser.add_argument('--repeat', help='runs of every query', type=int,
+                        default=20)
+    args = parser.parse_args()
+
+    catalog = CatalogIndex()
+    start = time.perf_counter()
+    for game_id, fields in make_games(args.games, args.tags):
+        catalog.add(game_id, fields)
+    build = time.perf_counter() - start
+
+    directory = tempfile.mkdtemp(prefix='bench_catalog_')
+    try:
+        path = os.path.join(directory, 'catalog.idx')
+        start = time.perf_counter()
+        catalog.save(path)
+        save = time.perf_counter() - start
+        start = time.perf_counter()
+        catalog = CatalogIndex.load(path)
+        load = time.perf_counter() - start
+        print("{} games, {} tags: build {:.1f} sec, save {:.2f} sec, "
+              "load {:.2f} sec, {:.1f} MiB".format(
+                  args.games, args.tags, build, save, load,
+                  os.path.getsize(path) / 2 ** 20
+              ))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+    month = (TODAY - timedelta(days=30), TODAY)
+    queries = (
+        ('roguelike+controller, <=9.99, this month', dict(
+            tags=['Roguelike'], specs=['Full controller support'],
+            price=(None, 999), release_date=month)),
+        ('roguelike+controller, <=9.99', dict(
+            tags=['Roguelike'], specs=['Full controller support'],
+            price=(None, 999))),
+        ('rare tag, top 20 by reviews', dict(
+            tags=['Tag {}'.format(args.tags - 1)], order_by='-num_reviews',
+            limit=20)),
+        ('free, 1000+ reviews', dict(
+            price=(0, 0), num_reviews=(1000, None))),
+        ('indie+action+co-op', dict(
+            tags=['Indie', 'Action'], specs=['Online Co-op'])),
+    )
+    # sorted indexes are built by the first query after adding of games
+    catalog.query(price=(0, 0), release_date=month, num_reviews=(0, 0))
+    print("{:<42} {:>8} {:>10} {:>8}".format('query', 'games', 'median ms',
+                                             'max ms'))
+    for name, filters in queries:
+        result, median, maximum = timed(
+            lambda: catalog.query(**filters), args.repeat
+        )
+        print("{:<42} {:8d} {:10.2f} {:8.2f}".format(name, len(result),
+                                                      median, maximum))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""Benchmark of change detection of games with many tracked games.
+
+Run from the project directory: python -m benchmarks.bench_changes
+
+Synthetic games of the mock store go through ChangesPipeline twice, like
+two crawls: the first crawl adds all games to the hash store, in the
+second one --changed part of games has new price or num of reviews.
+Throughput of the pipeline, games and json bytes passed downstream (to
+database and export) in drop and diff modes, size of the hash store and
+RSS growth are printed.
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+from datetime import datetime
+
+from scrapy.exceptions import DropItem
+
+from benchmarks.mockstore import MockStore
+from steamscraping.changes import FieldHashStore
+from steamscraping.db import diff_to_row, game_to_row
+from steamscraping.items import Game, GameDiff, GameRequirements
+from steamscraping.pipelines import ChangesPipeline
+
+
+def make_games(store, changed, seed):
+    """Make synthetic games, they are not kept in memory.
+
+    :param changed: part of games with changed price or num of reviews
+    """
+    rand = random.Random(seed)
+    for index in range(store.apps):
+        values = store.game(store.app_id(index))
+        if rand.random() < changed:
+            if rand.random() < 0.5:
+                values['price'] += 100
+            else:
+                values['num_reviews'] += rand.randint(1, 50)
+        yield Game(
+            game_id=values['app_id'],
+            title='Game {}'.format(values['app_id']),
+            description=values['description'],
+            num_reviews=values['num_reviews'],
+            release_date=datetime.strptime(values['release_date'],
+                                           '%d %b, %Y'),
+            price=values['price'],
+            tags=values['tags'],
+            specs=values['specs'],
+            system_requirements=GameRequirements(
+                min_os='Windows 7', min_ram='4 GB RAM',
+                min_storage='{} GB available space'.format(values['storage']),
+                rec_os='Windows 10', rec_ram='8 GB RAM'
+            )
+        )
+
+
+def rss():
+    with open('/proc/self/statm') as file:
+        return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+def run_crawl(name, pipeline, games):
+    passed = passed_bytes = all_bytes = 0
+    elapsed = 0.0
+    start_rss = rss()
+    count = 0
+    for game in games:
+        count += 1
+        all_bytes += len(json.dumps(game_to_row(game), default=str))
+        # only time of the pipeline is measured, not making of games
+        start = time.perf_counter()
+        try:
+            item = pipeline.process_item(game, None)
+        except DropItem:
+            continue
+        finally:
+            elapsed += time.perf_counter() - start
+        row = (diff_to_row(item) if isinstance(item, GameDiff)
+               else game_to_row(item))
+        passed += 1
+        passed_bytes += len(json.dumps(row, default=str))
+    start = time.perf_counter()
+    pipeline.store.commit()
+    elapsed += time.perf_counter() - start
+    print("{:<18} {:10.0f} {:9d} {:10.1f} {:10.1f} {:8.1f}".format(
+        name, count / elapsed, passed, passed_bytes / 2 ** 20,
+        all_bytes / 2 ** 20, (rss() - start_rss) / 2 ** 20
+    ))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--games', help='number of games', type=int,
+                        default=1000000)
+    parser.add_argument('--changed', help='part of changed games',
+                        type=float, default=0.05)
+    args = parser.parse_args()
+
+    store = MockStore(apps=args.games)
+    directory = tempfile.mkdtemp(prefix='bench_changes_')
+    try:
+        print("{} games, {:.0%} changed in the second crawl".format(
+            args.games, args.changed
+        ))
+        print("{:<18} {:>10} {:>9} {:>10} {:>10} {:>8}".format(
+            'crawl', 'games/sec', 'passed', 'passed MiB', 'games MiB',
+            'RSS MiB'
+        ))
+        first_path = os.path.join(directory, 'first.db')
+        pipeline = ChangesPipeline(FieldHashStore(first_path))
+        run_crawl('first crawl', pipeline, make_games(store, 0, 0))
+        pipeline.close_spider(None)
+        for mode in ('drop', 'diff'):
+            # both modes start from hashes of the first crawl
+            path = os.path.join(directory, mode + '.db')
+            shutil.copy(first_path, path)
+            pipeline = ChangesPipeline(FieldHashStore(path), mode=mode)
+            run_crawl('second, ' + mode, pipeline,
+                      make_games(store, args.changed, 1))
+            pipeline.close_spider(None)
+        print("hash store {:.1f} MiB".format(
+            os.path.getsize(first_path) / 2 ** 20
+        ))
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
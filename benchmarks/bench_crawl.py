@@ -0,0 +1,104 @@
+"""End-to-end benchmark of crawling the local mock store.
+
+Run from the project directory: python -m benchmarks.bench_crawl --apps 10000
+
+The whole crawl (rules, cookies, dupe filter, middlewares, pipelines)
+runs against benchmarks.mockstore without network. Games are saved into
+sqlite database in temporary directory. Scrapy settings can be changed
+by -s NAME=VALUE, e.g. -s SEARCH_MODE=json -s CONCURRENT_REQUESTS=64.
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+from scrapy.crawler import CrawlerProcess
+from scrapy.utils.project import get_project_settings
+
+from benchmarks import mockstore
+from steamscraping.spiders.game import GameParser
+
+
+def crawl_settings(store, directory, overrides):
+    """Get settings for crawling the whole mock store.
+
+    :param overrides: list of NAME=VALUE settings
+    """
+    # all games of the store are relevant
+    days = store.apps // store.games_per_day + 1
+    settings = get_project_settings()
+    settings.setdict({
+        'DAYS_EARLIER': days,
+        'HTTPCACHE_ENABLED': False,
+        'CRAWL_STATE_PATH': os.path.join(directory, 'crawlstate.db'),
+        'RECRAWL_QUEUE_PATH': os.path.join(directory, 'recrawl.db'),
+        'DB_URL': 'sqlite:///' + os.path.join(directory, 'games.db'),
+        'LOG_LEVEL': 'INFO',
+        'ROBOTSTXT_OBEY': False,
+        'AUTOTHROTTLE_ENABLED': False,
+        # enable to test it against --rate-limit of the store
+        'RATE_CONTROL_ENABLED': False,
+        'DOWNLOAD_DELAY': 0,
+        'CONCURRENT_REQUESTS': 32,
+        'CONCURRENT_REQUESTS_PER_DOMAIN': 32,
+        'TELNETCONSOLE_ENABLED': False,
+        # filters of Game are not changed, so the prefilter would skip most
+        # games; enable it to measure skipped app pages
+        'SEARCH_PREFILTER_ENABLED': False,
+    }, priority='cmdline')
+    for setting in overrides:
+        name, _, value = setting.partition('=')
+        settings.set(name, value, priority='cmdline')
+    return settings
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    mockstore.add_arguments(parser)
+    parser.add_argument('-s', help='scrapy setting (NAME=VALUE)',
+                        action='append', default=[], dest='settings')
+    args = parser.parse_args()
+
+    store = mockstore.store_from_args(args)
+    directory = tempfile.mkdtemp(prefix='bench_crawl_')
+    settings = crawl_settings(store, directory, args.settings)
+
+    process = CrawlerProcess(settings)
+    _, store_url = mockstore.listen(store)
+    crawler = process.create_crawler(GameParser)
+    process.crawl(crawler, store_url=store_url, full='1')
+
+    started = time.time()
+    try:
+        process.start()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    elapsed = time.time() - started
+
+    stats = crawler.stats.get_stats()
+    items = stats.get('item_scraped_count', 0)
+    requests = stats.get('downloader/request_count', 0)
+    response_bytes = stats.get('downloader/response_bytes', 0)
+    print("\n{} games in store, {} games scraped in {:.1f} sec".format(
+        store.apps, items, elapsed
+    ))
+    print("{:<24} {:10.1f}".format('items/sec', items / elapsed))
+    print("{:<24} {:10.1f}".format('requests/sec', requests / elapsed))
+    if items:
+        print("{:<24} {:10.2f}".format('requests/item', requests / items))
+        print("{:<24} {:10.1f}".format('response KiB/item',
+                                       response_bytes / 1024 / items))
+    print("{:<24} {}".format('store requests', dict(store.requests)))
+    print("{:<24} {}".format('age check', {
+        name.split('/')[1]: value for name, value in stats.items()
+        if name.startswith('agecheck/')
+    }))
+    print("{:<24} {}".format('prefilter', {
+        name.split('/')[1]: value for name, value in stats.items()
+        if name.startswith('prefilter/')
+    }))
+
+
+if __name__ == "__main__":
+    main()
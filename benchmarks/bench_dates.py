@@ -0,0 +1,72 @@
+"""Benchmark of release dates parsing on dates from search pages.
+
+Run from the project directory: python -m benchmarks.bench_dates
+"""
+import argparse
+import os
+import timeit
+from datetime import datetime
+
+from steamscraping.dates import ReleaseDateParser, ENGLISH_MONTHS
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+LEGACY_FORMATS = ('%d %b, %Y', '%b %Y', '%B %Y', '%B, %Y', '%Y')
+
+
+def legacy_str_to_date(date_str):
+    """Parsing of the date, as it was made by trying strptime formats."""
+    for datetime_format in LEGACY_FORMATS:
+        try:
+            return datetime.strptime(date_str, datetime_format)
+        except ValueError:
+            pass
+    return date_str
+
+
+def load_corpus(file_name='release_dates.txt'):
+    with open(os.path.join(DATA_DIR, file_name), 'r') as file:
+        return [line.rstrip('\n') for line in file if line.strip()]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', help='number of runs', type=int,
+                        default=5)
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    cached_parser = ReleaseDateParser(ENGLISH_MONTHS)
+    # the new parser must give the same dates as the old one
+    for date_str in corpus:
+        assert cached_parser(date_str) == legacy_str_to_date(date_str)
+
+    def run_legacy():
+        for date_str in corpus:
+            legacy_str_to_date(date_str)
+
+    def run_uncached():
+        parser = ReleaseDateParser(ENGLISH_MONTHS, cache_size=0)
+        for date_str in corpus:
+            parser(date_str)
+
+    def run_cached():
+        parser = ReleaseDateParser(ENGLISH_MONTHS)
+        for date_str in corpus:
+            parser(date_str)
+
+    print("{} dates, {} unique".format(len(corpus), len(set(corpus))))
+    results = {}
+    for name, func in (('strptime loop', run_legacy),
+                       ('regex', run_uncached),
+                       ('regex + lru cache', run_cached)):
+        results[name] = min(timeit.repeat(func, number=1, repeat=args.repeat))
+    for name, seconds in results.items():
+        print("{:<20} {:8.2f} ms  {:12.0f} dates/sec  x{:.1f}".format(
+            name, seconds * 1000, len(corpus) / seconds,
+            results['strptime loop'] / seconds
+        ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,106 @@
+"""Benchmark of memory and time of dupe filters on a large crawl.
+
+Run from the project directory: python -m benchmarks.bench_dupefilter
+
+Requests are game pages with snr parameter (like links from search pages)
+and a part of other pages (--other). Every request is seen twice.
+SteamDupeFilter (set of hex fingerprints) is compared with AppIdDupeFilter
+with exact set and with bloom filter of other fingerprints. Time of
+saving and loading of JOBDIR is measured too. Memory is traced, so
+times are slower than in a real crawl, memory of all filters grows
+linearly with number of requests.
+"""
+import argparse
+import gc
+import shutil
+import tempfile
+import time
+import tracemalloc
+
+from scrapy import Request
+from scrapy.utils.test import get_crawler
+
+from steamscraping.dupefilters import AppIdDupeFilter
+from steamscraping.middlewares import SteamDupeFilter
+from steamscraping.spiders.game import GameParser
+
+STORE_URL = 'https://store.steampowered.com'
+
+
+def make_requests(count, other):
+    """Make requests, other of them are not game pages.
+
+    Requests are not kept, because url and fingerprint caches of scrapy
+    would take memory of all of them.
+    """
+    for i in range(count):
+        if other and i % round(1 / other) == 0:
+            url = '{}/search/?page={}&snr=1_7_7_230_7'.format(STORE_URL, i)
+        else:
+            url = '{}/app/{}/Game_{}/?snr=1_7_7_230_150_{}'.format(
+                STORE_URL, i * 10, i, i // 25
+            )
+        yield Request(url)
+
+
+def create(dupefilter_class, **settings):
+    crawler = get_crawler(GameParser, dict(settings,
+                                           CRAWL_STATE_ENABLED=False))
+    return dupefilter_class.from_crawler(crawler)
+
+
+def bench(name, dupefilter_class, args, **settings):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    dupefilter = create(dupefilter_class, **settings)
+    for request in make_requests(args.requests, args.other):
+        dupefilter.request_seen(request)
+    seen = sum(dupefilter.request_seen(request)
+               for request in make_requests(args.requests, args.other))
+    elapsed = time.perf_counter() - start
+    memory, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert seen == args.requests
+
+    persistence = ''
+    if dupefilter_class is AppIdDupeFilter:
+        directory = tempfile.mkdtemp(prefix='bench_dupefilter_')
+        try:
+            dupefilter.path = directory
+            start = time.perf_counter()
+            dupefilter.close('finished')
+            saved = time.perf_counter() - start
+            start = time.perf_counter()
+            create(dupefilter_class, JOBDIR=directory, **settings)
+            loaded = time.perf_counter() - start
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+        persistence = 'save {:.3f} sec, load {:.3f} sec'.format(saved,
+                                                                loaded)
+    print("{:<24} {:10.1f} MiB {:8.2f} us/request  {}".format(
+        name, memory / 2 ** 20, elapsed * 10 ** 6 / args.requests / 2,
+        persistence
+    ))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--requests', help='number of requests', type=int,
+                        default=200000)
+    parser.add_argument('--other', help='part of requests, which are not '
+                                        'game pages', type=float,
+                        default=0.04)
+    args = parser.parse_args()
+
+    print("{} requests, {:.0%} of them are not game pages".format(
+        args.requests, args.other
+    ))
+    bench('SteamDupeFilter', SteamDupeFilter, args)
+    bench('AppIdDupeFilter', AppIdDupeFilter, args)
+    bench('AppIdDupeFilter (bloom)', AppIdDupeFilter, args,
+          DUPEFILTER_BLOOM_CAPACITY=args.requests)
+
+
+if __name__ == "__main__":
+    main()
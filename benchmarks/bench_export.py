@@ -0,0 +1,164 @@
+"""Benchmark of export of games into files and loading of them.
+
+Run from the project directory: python -m benchmarks.bench_export
+
+Synthetic games of the mock store are exported by scrapy JsonItemExporter
+(one json array, like the default feed) and by writers of ExportPipeline
+(gzip json lines and parquet, if pyarrow is installed). Write time, file
+size and peak memory of writing are printed, then time of loading the
+whole file and of loading only price and tags columns for analytics.
+Memory is traced in a separate pass, python memory is traced by
+tracemalloc, memory of arrow buffers by its memory pool.
+"""
+import argparse
+import gc
+import gzip
+import json
+import os
+import shutil
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+from scrapy.exporters import JsonItemExporter
+
+from benchmarks.mockstore import MockStore
+from steamscraping.db import game_to_row
+from steamscraping.exporters import (JsonLinesWriter, ParquetWriter,
+                                     pyarrow)
+from steamscraping.items import Game, GameRequirements
+
+
+def make_rows(count):
+    """Make rows of synthetic games, they are not kept in memory."""
+    store = MockStore(apps=count)
+    for index in range(count):
+        values = store.game(store.app_id(index))
+        yield game_to_row(Game(
+            game_id=values['app_id'],
+            title='Game {}'.format(values['app_id']),
+            description=values['description'],
+            num_reviews=values['num_reviews'],
+            release_date=datetime.strptime(values['release_date'],
+                                           '%d %b, %Y'),
+            price=values['price'],
+            tags=values['tags'],
+            specs=values['specs'],
+            system_requirements=GameRequirements(
+                min_os='Windows 7', min_ram='4 GB RAM',
+                min_storage='{} GB available space'.format(values['storage']),
+                rec_os='Windows 10', rec_ram='8 GB RAM'
+            )
+        ))
+
+
+class JsonArrayWriter:
+    """Scrapy exporter of rows into one json array."""
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, 'wb')
+        self.exporter = JsonItemExporter(self.file)
+        self.exporter.start_exporting()
+
+    def write(self, row):
+        self.exporter.export_item(row)
+
+    def close(self):
+        self.exporter.finish_exporting()
+        self.file.close()
+
+
+def load_json(path, columns=None):
+    with open(path, 'rb') as file:
+        rows = json.load(file)
+    if columns:
+        rows = [{column: row[column] for column in columns} for row in rows]
+    return len(rows)
+
+
+def load_jsonl(path, columns=None):
+    rows = []
+    with gzip.open(path, 'rb') as file:
+        for line in file:
+            row = json.loads(line)
+            rows.append({column: row[column] for column in columns}
+                        if columns else row)
+    return len(rows)
+
+
+def load_parquet(path, columns=None):
+    return pyarrow.parquet.read_table(path, columns=columns).num_rows
+
+
+def write(create_writer, path, count):
+    writer = create_writer(path)
+    for row in make_rows(count):
+        writer.write(row)
+    writer.close()
+    # parquet writer renames the file, when it is complete
+    return writer.path
+
+
+def bench(name, create_writer, load, path, args):
+    gc.collect()
+    start = time.perf_counter()
+    path = write(create_writer, path, args.games)
+    # rows are generated in the same loop, so their time is measured too
+    elapsed = time.perf_counter() - start
+    size = os.path.getsize(path)
+
+    gc.collect()
+    tracemalloc.start()
+    if pyarrow is not None:
+        pool = pyarrow.default_memory_pool()
+        arrow_start = pool.max_memory()
+    write(create_writer, path + '.traced', args.games)
+    _, memory = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    if pyarrow is not None:
+        memory += pool.max_memory() - arrow_start
+
+    start = time.perf_counter()
+    assert load(path) == args.games
+    loaded = time.perf_counter() - start
+    start = time.perf_counter()
+    assert load(path, ['price', 'tags']) == args.games
+    columns_loaded = time.perf_counter() - start
+    print("{:<16} {:8.2f} {:10.0f} {:9.1f} {:10.1f} {:8.2f} {:12.3f}".format(
+        name, elapsed, args.games / elapsed, size / 2 ** 20,
+        memory / 2 ** 20, loaded, columns_loaded
+    ))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--games', help='number of games', type=int,
+                        default=100000)
+    parser.add_argument('--batch-size', help='games per parquet row group',
+                        type=int, default=5000)
+    args = parser.parse_args()
+
+    directory = tempfile.mkdtemp(prefix='bench_export_')
+    try:
+        print("{} games".format(args.games))
+        print("{:<16} {:>8} {:>10} {:>9} {:>10} {:>8} {:>12}".format(
+            'format', 'write s', 'games/sec', 'file MiB', 'memory MiB',
+            'load s', 'price,tags s'
+        ))
+        bench('json (scrapy)', JsonArrayWriter, load_json,
+              os.path.join(directory, 'games.json'), args)
+        bench('jsonl.gz', JsonLinesWriter, load_jsonl,
+              os.path.join(directory, 'games.jsonl.gz'), args)
+        if pyarrow is None:
+            print("parquet is skipped, pyarrow is not installed")
+            return
+        bench('parquet', lambda path: ParquetWriter(
+            path, batch_size=args.batch_size
+        ), load_parquet, os.path.join(directory, 'games.parquet'), args)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Benchmark of extracting game fields from recorded game pages.
+
+Run from the project directory: python -m benchmarks.bench_extractor
+Pages are taken from tests/responses (app_*.html) or from given directory.
+"""
+import argparse
+import glob
+import os
+import timeit
+
+from scrapy.http import HtmlResponse
+
+from steamscraping.extractors import SelectorsExtractor
+from steamscraping.items import Game
+from steamscraping.spiders.game import GameParser, GameItemLoader
+
+RESPONSES_DIR = os.path.join(
+    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+    'tests', 'responses'
+)
+
+
+def load_pages(directory):
+    pages = []
+    for path in sorted(glob.glob(os.path.join(directory, 'app_*.html'))):
+        with open(path, 'rb') as file:
+            pages.append(file.read())
+    return pages
+
+
+def make_responses(pages):
+    # new response every time, parsed document is cached in response
+    return [HtmlResponse(url=GameParser.store_url + '/app/1/', body=body,
+                         encoding='utf-8') for body in pages]
+
+
+def load_by_css(response):
+    loader = GameItemLoader(item=Game(), response=response)
+    for field, selector in GameParser.selectors.items():
+        loader.add_css(field, selector)
+    return loader.load_item()
+
+
+def load_by_extractor(extractor):
+    def load(response):
+        loader = GameItemLoader(item=Game(), response=response)
+        for field, values in extractor.extract(response).items():
+            loader.add_value(field, values)
+        return loader.load_item()
+    return load
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pages', help='directory with app_*.html pages',
+                        default=RESPONSES_DIR)
+    parser.add_argument('--number', help='number of passes over pages',
+                        type=int, default=100)
+    parser.add_argument('--repeat', help='number of runs', type=int,
+                        default=5)
+    args = parser.parse_args()
+
+    pages = load_pages(args.pages)
+    if not pages:
+        parser.error('no app_*.html pages in {}'.format(args.pages))
+    extractor = SelectorsExtractor(GameParser.selectors,
+                                   root_css=GameParser.game_root_css)
+
+    def run(load):
+        def run_loader():
+            for response in make_responses(pages):
+                load(response)
+        return run_loader
+
+    # time of building responses and html parsing is the same for both
+    baseline = min(timeit.repeat(run(lambda response: response.selector),
+                                 number=args.number, repeat=args.repeat))
+    total = len(pages) * args.number
+    print("{} pages x {} passes".format(len(pages), args.number))
+    results = {}
+    for name, load in (('add_css', load_by_css),
+                       ('precompiled', load_by_extractor(extractor))):
+        seconds = min(timeit.repeat(run(load), number=args.number,
+                                    repeat=args.repeat)) - baseline
+        results[name] = seconds
+    for name, seconds in results.items():
+        print("{:<12} {:8.3f} ms/page  {:10.0f} pages/sec  x{:.1f}".format(
+            name, seconds * 1000 / total, total / seconds,
+            results['add_css'] / seconds
+        ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,392 @@
+"""Benchmark of parsing recorded search and game pages.
+
+Run from the project directory: python -m benchmarks.bench_parser
+
+Pages are replayed through GameParser.parse_page, GameParser.parse_game
+and processors of Game fields. Corpus is a directory with search_<page>.html
+and app_<id>.html files (benchmarks/data/pages and tests/responses by
+default) or the http cache of a real crawl (--httpcache DIR).
+
+With --pool-workers game pages are parsed also by ParsePoolPipeline
+worker processes, pages/sec is printed for every number of workers
+(it should grow with number of cores).
+
+With --against REV the benchmark of git revision REV is run first on
+the same corpus, so the current tree is compared with results recorded
+on the same machine in the same run, e.g. before merging a branch:
+
+    python -m benchmarks.bench_parser --against master
+
+Results can be also saved as baseline (--save-baseline, it is not
+committed, as it is machine dependent) and compared with on next runs.
+Only aggregate results (pages/sec and peak memory) are compared, the exit
+code is 1 if some of them is worse than baseline by more than --tolerance.
+"""
+import argparse
+import glob
+import gzip
+import io
+import json
+import multiprocessing
+import os
+import pickle
+import re
+import shutil
+import subprocess
+import sys
+import tarfile
+import tempfile
+import time
+import timeit
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from scrapy.http import HtmlResponse, Request
+from scrapy.utils.test import get_crawler
+
+from steamscraping.items import Game
+from steamscraping.parsepool import init_worker, parse_game_page
+from steamscraping.spiders.game import GameParser, GameItemLoader
+from steamscraping.urls import app_id_from_url, search_page_from_url
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(BENCHMARKS_DIR)
+CORPUS_DIRS = [
+    os.path.join(BENCHMARKS_DIR, 'data', 'pages'),
+    os.path.join(PROJECT_DIR, 'tests', 'responses'),
+]
+BASELINE_PATH = os.path.join(BENCHMARKS_DIR, 'data', 'parser_baseline.json')
+
+SEARCH_URL = GameParser.start_urls[0] + '&page={page}'
+APP_URL = GameParser.store_url + '/app/{app_id}/'
+# the oldest release date, which is relevant on recorded search pages
+RELEVANT_SINCE = datetime(2019, 7, 1)
+
+
+def load_directory(directory):
+    """Get (url, body) of search and game pages from directory."""
+    pages = []
+    for path in sorted(glob.glob(os.path.join(directory, '*.html'))):
+        name = os.path.basename(path)
+        match = re.match(r'(search|app)_(\d+)\.html$', name)
+        if match is None:
+            continue
+        kind, number = match.groups()
+        if kind == 'search':
+            url = SEARCH_URL.format(page=number)
+        else:
+            url = APP_URL.format(app_id=number)
+        with open(path, 'rb') as file:
+            pages.append((url, file.read()))
+    return pages
+
+
+def load_httpcache(directory):
+    """Get (url, body) of search and game pages from compressed http cache."""
+    pages = []
+    for path in sorted(glob.glob(os.path.join(directory, '**', '*.pickle.gz'),
+                                 recursive=True)):
+        with gzip.open(path, 'rb') as file:
+            data = pickle.load(file)
+        if data['status'] == 200:
+            pages.append((data['url'], data['body']))
+    return pages
+
+
+def split_corpus(pages):
+    """Make responses of search pages and game pages."""
+    search_pages, game_pages = [], []
+    for url, body in pages:
+        response = HtmlResponse(url=url, request=Request(url), body=body,
+                                encoding='utf-8')
+        if app_id_from_url(url) is not None and '/agecheck/' not in url:
+            game_pages.append(response)
+        elif search_page_from_url(url) is not None:
+            search_pages.append(response)
+    return search_pages, game_pages
+
+
+def follow_links(spider):
+    """Parsing of relevant search page, like CrawlSpider.parse does it."""
+    def parse(response):
+        return (list(spider.parse_start_url(response)) +
+                list(spider._requests_to_follow(response)))
+    return parse
+
+
+def copy_responses(responses):
+    # parsed document is cached in response, so every run gets new ones
+    return [response.replace() for response in responses]
+
+
+def best_time(func, responses, repeat, parsed=False):
+    """Get the best time of calling func for all responses.
+
+    If parsed is True, time of html parsing is not included.
+    """
+    times = []
+    for _ in range(repeat):
+        copies = copy_responses(responses)
+        if parsed:
+            for response in copies:
+                response.selector
+        start = time.perf_counter()
+        for response in copies:
+            func(response)
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def bench_pages(spider, search_pages, game_pages, repeat):
+    """Get pages/sec of parse_page and parse_game."""
+    def parse_page(response):
+        spider.parse_page(response)
+
+    def parse_game(response):
+        list(spider.parse_game(response))
+
+    results = {}
+    for name, func, responses in (('parse_page', parse_page, search_pages),
+                                  ('parse_game', parse_game, game_pages)):
+        if responses:
+            seconds = best_time(func, responses, repeat)
+            results[name] = len(responses) / seconds
+    return results
+
+
+def bench_fields(spider, game_pages, repeat):
+    """Get time (ms per page) of extraction and processing of every field.
+
+    Time of html parsing is shared by all fields, so it is not included.
+    """
+    extract_ms, process_ms = {}, {}
+    values = [spider.extractor.extract(response) for response in game_pages]
+    for field in spider.selectors:
+        def extract(response):
+            spider.extractor.extract(response, [field])
+
+        def process(page_values):
+            loader = GameItemLoader(item=Game(), **spider.item_context)
+            loader.add_value(field, page_values[field])
+            loader.load_item()
+
+        seconds = best_time(extract, game_pages, repeat, parsed=True)
+        extract_ms[field] = seconds * 1000 / len(game_pages)
+        seconds = min(timeit.repeat(lambda: [process(page_values)
+                                             for page_values in values],
+                                    number=1, repeat=repeat))
+        process_ms[field] = seconds * 1000 / len(game_pages)
+    return extract_ms, process_ms
+
+
+def peak_memory(spider, search_pages, game_pages):
+    """Get peak memory (KiB) allocated during parsing of the corpus."""
+    search_pages = copy_responses(search_pages)
+    game_pages = copy_responses(game_pages)
+    tracemalloc.start()
+    for response in search_pages:
+        spider.parse_page(response)
+    for response in game_pages:
+        list(spider.parse_game(response))
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return peak / 1024
+
+
+def bench_pool(spider, game_pages, workers_list, pages, repeat):
+    """Get pages/sec of parsing game pages in process pool.
+
+    :param pages: number of pages parsed in every run (corpus is repeated)
+    """
+    tasks = [(response.url, response.body, response.encoding,
+              app_id_from_url(response.url), {})
+             for response in game_pages]
+    tasks = (tasks * (pages // len(tasks) + 1))[:pages]
+    results = {}
+    for workers in workers_list:
+        with ProcessPoolExecutor(
+                workers, mp_context=multiprocessing.get_context('spawn'),
+                initializer=init_worker,
+                initargs=(spider.selectors, spider.game_root_css,
+                          spider.item_context)) as executor:
+            # start workers and import modules in them
+            list(executor.map(parse_game_page, *zip(*tasks[:workers])))
+            times = []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                list(executor.map(parse_game_page, *zip(*tasks),
+                                  chunksize=4))
+                times.append(time.perf_counter() - start)
+        results[str(workers)] = len(tasks) / min(times)
+    return results
+
+
+def bench_revision(revision, options):
+    """Run the benchmark of git revision and get its results.
+
+    Revision is exported into a temporary directory and its own benchmark
+    is run there with options (the same corpus and repeat), None is
+    returned, if there is no benchmark in the revision or it failed.
+    """
+    if subprocess.run(['git', 'cat-file', '-e',
+                       revision + ':benchmarks/bench_parser.py'],
+                      cwd=PROJECT_DIR, stderr=subprocess.DEVNULL).returncode:
+        return None
+    archive = subprocess.run(['git', 'archive', revision], cwd=PROJECT_DIR,
+                             stdout=subprocess.PIPE, check=True).stdout
+    directory = tempfile.mkdtemp(prefix='bench_parser_')
+    try:
+        with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+            tar.extractall(directory)
+        # older revisions read database config on import of settings
+        if os.path.exists(os.path.join(PROJECT_DIR, 'app.yaml')):
+            shutil.copy(os.path.join(PROJECT_DIR, 'app.yaml'), directory)
+        path = os.path.join(directory, 'results.json')
+        if subprocess.run([sys.executable, '-m', 'benchmarks.bench_parser',
+                           '--baseline', path, '--save-baseline'] + options,
+                          cwd=directory,
+                          stdout=subprocess.DEVNULL).returncode:
+            return None
+        with open(path, 'r') as file:
+            return json.load(file)
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+def compare(results, baseline, tolerance):
+    """Print comparison with baseline and get names of regressions.
+
+    Timings of single fields are too short to be compared reliably, so
+    only aggregate results are compared.
+    """
+    regressions = []
+    for section, higher_is_better in (('pages_per_sec', True),
+                                      ('peak_memory_kib', False)):
+        current = results[section]
+        previous = baseline.get(section, {})
+        if not isinstance(current, dict):
+            current, previous = {'': current}, {'': previous or None}
+        for name, value in current.items():
+            base = previous.get(name)
+            if not base:
+                continue
+            ratio = value / base if higher_is_better else base / value
+            label = '{} {}'.format(section, name).strip()
+            print("{:<40} {:10.2f} vs {:10.2f}  x{:.2f}".format(
+                label, value, base, ratio
+            ))
+            if ratio < 1 - tolerance:
+                regressions.append(label)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--corpus', help='directory with recorded pages',
+                        action='append')
+    parser.add_argument('--httpcache', help='directory of http cache with '
+                                            'recorded pages')
+    parser.add_argument('--repeat', help='number of runs', type=int,
+                        default=5)
+    parser.add_argument('--against', help='git revision to compare with, '
+                                          'its benchmark is run first')
+    parser.add_argument('--baseline', help='path of baseline results',
+                        default=BASELINE_PATH)
+    parser.add_argument('--save-baseline', help='save results as baseline',
+                        action='store_true')
+    parser.add_argument('--tolerance', help='allowed slowdown (0.2 = 20%%)',
+                        type=float, default=0.2)
+    parser.add_argument('--pool-workers', help='numbers of workers of '
+                                               'process pool to compare',
+                        type=int, nargs='*', default=[])
+    parser.add_argument('--pool-pages', help='pages parsed by process pool '
+                                             'in every run',
+                        type=int, default=1000)
+    args = parser.parse_args()
+
+    pages = []
+    if args.httpcache:
+        pages.extend(load_httpcache(args.httpcache))
+    for directory in args.corpus or ([] if args.httpcache else CORPUS_DIRS):
+        pages.extend(load_directory(directory))
+    search_pages, game_pages = split_corpus(pages)
+    if not game_pages:
+        parser.error('no game pages in the corpus')
+
+    baseline = None
+    if args.against:
+        # paths are absolute, revision is run in another directory
+        options = ['--repeat', str(args.repeat)]
+        if args.httpcache:
+            options += ['--httpcache', os.path.abspath(args.httpcache)]
+        for directory in args.corpus or ([] if args.httpcache
+                                         else CORPUS_DIRS):
+            options += ['--corpus', os.path.abspath(directory)]
+        print("running benchmark of {}".format(args.against))
+        baseline = bench_revision(args.against, options)
+        if baseline is None:
+            parser.error('benchmark of {} failed'.format(args.against))
+
+    spider = get_crawler(GameParser, {
+        'CRAWL_STATE_ENABLED': False,
+        'SEARCH_FANOUT_ENABLED': False,
+        # search pages are relevant, so links are extracted too
+        'DAYS_EARLIER': (datetime.now() - RELEVANT_SINCE).days,
+    })._create_spider()
+    spider.parse = follow_links(spider)
+
+    print("{} search pages, {} game pages".format(len(search_pages),
+                                                  len(game_pages)))
+    results = {
+        'pages_per_sec': bench_pages(spider, search_pages, game_pages,
+                                     args.repeat),
+        'peak_memory_kib': peak_memory(spider, search_pages, game_pages),
+    }
+    results['extract_ms'], results['process_ms'] = bench_fields(
+        spider, game_pages, args.repeat
+    )
+
+    for name, value in results['pages_per_sec'].items():
+        print("{:<24} {:10.0f} pages/sec".format(name, value))
+    print("{:<24} {:>10} {:>10}  ms/page".format('field', 'extract',
+                                                 'process'))
+    for name, value in results['extract_ms'].items():
+        print("{:<24} {:10.3f} {:10.3f}".format(
+            name, value, results['process_ms'][name]
+        ))
+    print("{:<24} {:10.0f} KiB".format('peak memory',
+                                       results['peak_memory_kib']))
+    if args.pool_workers:
+        # it depends on number of cores, so it is not compared with baseline
+        pool = bench_pool(spider, game_pages, args.pool_workers,
+                          args.pool_pages, args.repeat)
+        print("{} cores".format(os.cpu_count()))
+        for workers, value in pool.items():
+            print("{:<24} {:10.0f} pages/sec".format(
+                'pool of {} workers'.format(workers), value
+            ))
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+        print("baseline saved to {}".format(args.baseline))
+        return 0
+
+    if baseline is None:
+        if not os.path.exists(args.baseline):
+            print("no baseline, run with --against REV to compare with "
+                  "a revision or with --save-baseline to save one")
+            return 0
+        with open(args.baseline, 'r') as file:
+            baseline = json.load(file)
+    print("\ncomparison with {}:".format(args.against or 'baseline'))
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print("regressions: {}".format(', '.join(regressions)))
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
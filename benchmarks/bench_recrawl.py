@@ -0,0 +1,132 @@
+"""Benchmark of recrawl queue with many tracked games.
+
+Run from the project directory: python -m benchmarks.bench_recrawl
+
+--apps games are added to the queue as if they were fetched during the
+last week, then --runs recrawl runs are simulated every --run-interval
+hours, each run refetches at most --batch-size due games. Games change
+like a Poisson process: few hot games change several times a day (sales,
+reviews of popular new games), some change every few days, most are
+stable. A fetch sees a change, if there was any since the last fetch.
+
+The queue with volatility (RECRAWL_MIN_INTERVAL to RECRAWL_MAX_INTERVAL)
+is compared with the same queue, where all games have the same interval,
+i.e. the oldest fetched games are refetched first. Time of queue
+operations, size of the database, changes seen per fetch and share of
+change events seen are printed for both.
+"""
+import argparse
+import math
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from steamscraping import settings
+from steamscraping.recrawl import RecrawlQueue
+
+HOUR = 60 * 60
+DAY = 24 * HOUR
+# (share of games, changes per day)
+CLASSES = ((0.02, 4.0), (0.18, 0.5), (0.8, 0.02))
+
+
+def change_rates(apps, seed=0):
+    rand = random.Random(seed)
+    rates = []
+    for _ in range(apps):
+        value = rand.random()
+        for share, rate in CLASSES:
+            if value < share:
+                break
+            value -= share
+        rates.append(rate / DAY)
+    return rates
+
+
+def bench_policy(name, queue, rates, args):
+    rand = random.Random(1)
+    values = [0] * len(rates)
+    fetched_at = [0.0] * len(rates)
+
+    start = time.perf_counter()
+    for game_id in range(len(rates)):
+        fetched_at[game_id] = -rand.random() * settings.RECRAWL_MAX_INTERVAL
+        queue.update(game_id, 999, values[game_id], None,
+                     now=fetched_at[game_id])
+    queue.commit()
+    fill = time.perf_counter() - start
+
+    due_times = []
+    update_time = 0.0
+    fetches = seen = 0
+    for run in range(args.runs):
+        now = run * args.run_interval * HOUR
+        start = time.perf_counter()
+        games = queue.due(now, args.batch_size)
+        due_times.append(time.perf_counter() - start)
+        start = time.perf_counter()
+        for game_id in games:
+            elapsed = now - fetched_at[game_id]
+            if rand.random() < 1 - math.exp(-rates[game_id] * elapsed):
+                values[game_id] += 1
+            if queue.update(game_id, 999, values[game_id], None, now=now):
+                seen += 1
+            fetched_at[game_id] = now
+        update_time += time.perf_counter() - start
+        fetches += len(games)
+    queue.commit()
+
+    start = time.perf_counter()
+    queue.count_due(now)
+    count_time = time.perf_counter() - start
+    duration = args.runs * args.run_interval * HOUR
+    events = sum(rates) * duration
+    size = os.path.getsize(queue.path)
+    print("{:<14} {:8.0f} {:8.2f} {:9.2f} {:9.0f} {:8.1f} {:9.3f} "
+          "{:8.1%}".format(
+              name, len(rates) / fill, sum(due_times) / len(due_times) *
+              1000, count_time * 1000, fetches / update_time,
+              size / 2 ** 20, seen / fetches, seen / events
+          ))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--apps', help='number of tracked games', type=int,
+                        default=1000000)
+    parser.add_argument('--runs', help='number of recrawl runs', type=int,
+                        default=120)
+    parser.add_argument('--run-interval', help='hours between runs',
+                        type=float, default=6)
+    parser.add_argument('--batch-size', help='games refetched by every run',
+                        type=int, default=25000)
+    args = parser.parse_args()
+
+    rates = change_rates(args.apps)
+    print("{} games, {} runs every {:g} hours, {} games per run".format(
+        args.apps, args.runs, args.run_interval, args.batch_size
+    ))
+    print("{:<14} {:>8} {:>8} {:>9} {:>9} {:>8} {:>9} {:>8}".format(
+        'queue', 'adds/s', 'due ms', 'count ms', 'updates/s', 'db MiB',
+        'seen/fetch', 'seen'
+    ))
+    directory = tempfile.mkdtemp(prefix='bench_recrawl_')
+    try:
+        for name, min_interval in (
+                ('volatility', settings.RECRAWL_MIN_INTERVAL),
+                ('oldest first', settings.RECRAWL_MAX_INTERVAL)):
+            queue = RecrawlQueue(
+                os.path.join(directory, name.replace(' ', '_') + '.db'),
+                min_interval=min_interval,
+                max_interval=settings.RECRAWL_MAX_INTERVAL
+            )
+            bench_policy(name, queue, rates, args)
+            queue.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
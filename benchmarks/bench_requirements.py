@@ -0,0 +1,109 @@
+"""Benchmark of building system requirements from scraped game pages.
+
+Run from the project directory: python -m benchmarks.bench_requirements
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+
+from steamscraping.items import GameRequirementsBuilder
+
+DATA_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+
+class LegacyGameRequirements:
+    def __init__(self, min_os, min_cpu, min_ram, min_gpu, rec_os, rec_cpu,
+                 rec_ram, rec_gpu):
+        self.min_os = min_os
+        self.min_cpu = min_cpu
+        self.min_ram = min_ram
+        self.min_gpu = min_gpu
+        self.rec_os = rec_os
+        self.rec_cpu = rec_cpu
+        self.rec_ram = rec_ram
+        self.rec_gpu = rec_gpu
+
+
+class LegacyGameRequirementsBuilder:
+    """Building of requirements, as it was made by searching every label."""
+    MIN_LABEL = 'Minimum:'
+    REC_LABEL = 'Recommended:'
+    OS_LABEL = 'OS:'
+    CPU_LABEL = 'Processor:'
+    GPU_LABEL = 'Graphics:'
+    RAM_LABEL = 'Memory:'
+
+    def __call__(self, data):
+        data = [x.strip() for x in data]
+        data = [x for x in data if x]
+        min_index_start = 0
+        rec_index_start = len(data)
+        try:
+            min_index_start = data.index(self.MIN_LABEL)
+        except ValueError:
+            pass
+        try:
+            rec_index_start = data.index(self.REC_LABEL)
+        except ValueError:
+            pass
+        min_list = data[min_index_start: rec_index_start]
+        rec_list = data[rec_index_start:]
+        return LegacyGameRequirements(
+            *[self._get(min_list, label) for label in
+              (self.OS_LABEL, self.CPU_LABEL, self.RAM_LABEL, self.GPU_LABEL)],
+            *[self._get(rec_list, label) for label in
+              (self.OS_LABEL, self.CPU_LABEL, self.RAM_LABEL, self.GPU_LABEL)]
+        )
+
+    @staticmethod
+    def _get(requirements_list, label):
+        try:
+            return requirements_list[requirements_list.index(label) + 1]
+        except (ValueError, IndexError):
+            return None
+
+
+def load_corpus(file_name='requirements.json'):
+    with open(os.path.join(DATA_DIR, file_name), 'r') as file:
+        return json.load(file)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', help='number of runs', type=int,
+                        default=5)
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    legacy_builder = LegacyGameRequirementsBuilder()
+    builder = GameRequirementsBuilder()
+
+    def run(build):
+        def run_builder():
+            for data in corpus:
+                build(data)
+        return run_builder
+
+    print("{} pages".format(len(corpus)))
+    results = {}
+    for name, build in (('index per label', legacy_builder),
+                        ('single pass', builder)):
+        results[name] = min(timeit.repeat(run(build), number=1,
+                                          repeat=args.repeat))
+    for name, seconds in results.items():
+        print("{:<16} {:8.2f} ms  {:10.0f} pages/sec  x{:.1f}".format(
+            name, seconds * 1000, len(corpus) / seconds,
+            results['index per label'] / seconds
+        ))
+
+    legacy = legacy_builder(corpus[0])
+    requirements = builder(corpus[0])
+    print("object size: {} bytes with __dict__, {} bytes with __slots__"
+          .format(sys.getsizeof(legacy) + sys.getsizeof(vars(legacy)),
+                  sys.getsizeof(requirements)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,141 @@
+"""Benchmark of sharded crawling of the local mock store by N workers.
+
+Run from the project directory:
+python -m benchmarks.bench_sharding --apps 4000 --latency 0.2 --workers 1 2 4
+
+Mock store runs in its own process, every worker is a separate crawl
+process with SHARDING_ENABLED, all of them share sqlite queue in
+temporary directory. Throughput of every number of workers is printed
+by the crawl time (the longest elapsed time of workers, startup of
+processes is not included) and by the wall time.
+
+Each worker is limited by -s CONCURRENT_REQUESTS (8 by default), so with
+store latency the crawl is bound by concurrency of one worker and should
+scale with number of workers until CPU cores or the store are saturated.
+"""
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from scrapy.crawler import CrawlerProcess
+
+from benchmarks import mockstore
+from benchmarks.bench_crawl import crawl_settings
+from steamscraping.sharding import SqliteShardQueue
+from steamscraping.spiders.game import GameParser
+
+CRAWL_ID = 'bench'
+
+
+def run_worker(args):
+    """Crawl the store as one of the workers."""
+    store = mockstore.store_from_args(args)
+    worker_dir = os.path.join(args.directory, 'worker_{}'.format(args.index))
+    os.makedirs(worker_dir)
+    settings = crawl_settings(store, worker_dir, [
+        'LOG_LEVEL=WARNING',
+        'CONCURRENT_REQUESTS=8',
+        'CONCURRENT_REQUESTS_PER_DOMAIN=8',
+        'METRICS_ENABLED=0',
+        # small crawls are balanced better with small batches
+        'SHARD_BATCH_SIZE=20',
+    ] + args.settings)
+    settings.setdict({
+        'SHARDING_ENABLED': True,
+        'SHARD_COUNT': args.workers,
+        'SHARD_INDEX': args.index,
+        'SHARD_CRAWL_ID': CRAWL_ID,
+        'SHARD_QUEUE_PATH': os.path.join(args.directory, 'shards.db'),
+    }, priority='cmdline')
+    process = CrawlerProcess(settings)
+    process.crawl(GameParser, store_url=args.store_url, full='1')
+    process.start()
+
+
+def run_crawl(args, store_url, workers):
+    """Run workers and get (wall time, crawl time, aggregated stats)."""
+    directory = tempfile.mkdtemp(prefix='bench_sharding_')
+    command = [sys.executable, '-W', 'ignore', '-m',
+               'benchmarks.bench_sharding', '--worker',
+               '--store-url', store_url, '--directory', directory,
+               '--workers', str(workers), '--apps', str(args.apps),
+               '--games-per-day', str(args.games_per_day)]
+    for setting in args.settings:
+        command += ['-s', setting]
+    try:
+        started = time.time()
+        processes = [subprocess.Popen(command + ['--index', str(index)])
+                     for index in range(workers)]
+        for process in processes:
+            process.wait()
+        elapsed = time.time() - started
+        queue = SqliteShardQueue(os.path.join(directory, 'shards.db'),
+                                 CRAWL_ID)
+        stats = queue.stats()
+        crawl_time = max(worker['elapsed_time_seconds']
+                         for worker in queue.worker_stats().values())
+        queue.close()
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+    return elapsed, crawl_time, stats
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    mockstore.add_arguments(parser)
+    parser.add_argument('--workers', help='numbers of workers to compare',
+                        type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('-s', help='scrapy setting of workers (NAME=VALUE)',
+                        action='append', default=[], dest='settings')
+    # options of worker processes
+    parser.add_argument('--worker', help=argparse.SUPPRESS,
+                        action='store_true')
+    parser.add_argument('--index', help=argparse.SUPPRESS, type=int)
+    parser.add_argument('--store-url', help=argparse.SUPPRESS)
+    parser.add_argument('--directory', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        args.workers = args.workers[0]
+        run_worker(args)
+        return
+
+    port = 8000 + os.getpid() % 1000
+    store = subprocess.Popen([
+        sys.executable, '-m', 'benchmarks.mockstore', '--port', str(port),
+        '--apps', str(args.apps), '--games-per-day', str(args.games_per_day),
+        '--agecheck-every', str(args.agecheck_every),
+        '--latency', str(args.latency), '--error-rate', str(args.error_rate),
+        '--retry-after', str(args.retry_after),
+    ], stdout=subprocess.DEVNULL)
+    store_url = 'http://127.0.0.1:{}'.format(port)
+    try:
+        time.sleep(2)
+        results = []
+        for workers in args.workers:
+            results.append((workers,) + run_crawl(args, store_url, workers))
+    finally:
+        store.terminate()
+        store.wait()
+
+    print("\n{:>8} {:>8} {:>10} {:>10} {:>8} {:>10} {:>8}".format(
+        'workers', 'games', 'crawl sec', 'games/sec', 'speedup',
+        'wall sec', 'speedup'
+    ))
+    base_time = base_wall_time = None
+    for workers, wall_time, crawl_time, stats in results:
+        base_time = base_time or crawl_time
+        base_wall_time = base_wall_time or wall_time
+        items = stats.get('item_scraped_count', 0)
+        print("{:>8} {:>8.0f} {:>10.1f} {:>10.1f} {:>8.2f} {:>10.1f} "
+              "{:>8.2f}".format(workers, items, crawl_time, items / crawl_time,
+                                base_time / crawl_time, wall_time,
+                                base_wall_time / wall_time))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""Benchmark of startup time of processes of the project.
+
+Run from the project directory: python -m benchmarks.bench_startup
+
+Every command is run --repeat times in a new python process: bare
+interpreter for reference, import of items (unit tests), import of the
+game spider, `scrapy list` and start of a parse pool worker (spawned
+process with init_worker, until it runs the first task). Median and min
+wall time are printed.
+"""
+import argparse
+import multiprocessing
+import os
+import statistics
+import subprocess
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from steamscraping.parsepool import init_worker
+from steamscraping.spiders.game import GameParser
+
+PROJECT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+COMMANDS = (
+    ('python', [sys.executable, '-c', 'pass']),
+    ('import items', [sys.executable, '-c', 'import steamscraping.items']),
+    ('import game spider',
+     [sys.executable, '-c', 'import steamscraping.spiders.game']),
+    ('scrapy list', [sys.executable, '-m', 'scrapy', 'list']),
+)
+
+
+def run_command(command):
+    start = time.perf_counter()
+    subprocess.run(command, cwd=PROJECT_DIR, check=True,
+                   stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return time.perf_counter() - start
+
+
+def start_worker():
+    start = time.perf_counter()
+    executor = ProcessPoolExecutor(
+        1, mp_context=multiprocessing.get_context('spawn'),
+        initializer=init_worker,
+        initargs=(GameParser.selectors, GameParser.game_root_css, {})
+    )
+    executor.submit(os.getpid).result()
+    elapsed = time.perf_counter() - start
+    executor.shutdown()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--repeat', help='runs of every command', type=int,
+                        default=10)
+    args = parser.parse_args()
+
+    print("{:<20} {:>10} {:>8}".format('process', 'median ms', 'min ms'))
+    runs = [(name, lambda command=command: run_command(command))
+            for name, command in COMMANDS]
+    runs.append(('parse pool worker', start_worker))
+    for name, run in runs:
+        times = [run() for _ in range(args.repeat)]
+        print("{:<20} {:10.1f} {:8.1f}".format(
+            name, statistics.median(times) * 1000, min(times) * 1000
+        ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""Benchmark of memory of in-flight game pages with and without trimming.
+
+Run from the project directory: python -m benchmarks.bench_trim
+
+Heavy game pages are made from tests/responses/app_620.html with reviews,
+screenshots and inline json scripts like on real store pages (sizes are
+set by options). --pages pages are held at once with their parsed
+documents, like responses of concurrent requests, while parse_game runs.
+Memory of lxml documents is not traced by tracemalloc, so every mode
+runs in its own process and RSS growth is measured. Games of both modes
+are checked to be identical.
+"""
+import argparse
+import hashlib
+import os
+import subprocess
+import sys
+import time
+
+from scrapy.http import HtmlResponse, Request
+from scrapy.utils.test import get_crawler
+
+from steamscraping import settings
+from steamscraping.middlewares import TrimResponseMiddleware
+from steamscraping.spiders.game import GameParser
+
+PAGE_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)),
+                         'tests', 'responses', 'app_620.html')
+
+
+def heavy_page(app_id, reviews, screenshots, script_kib):
+    """Make game page with heavy regions."""
+    with open(PAGE_PATH, 'rb') as file:
+        body = file.read()
+    review = (b'<div class="review_box"><div class="persona_name">'
+              b'<a href="https://steamcommunity.com/id/user%d/">user%d</a>'
+              b'</div><div class="content">' + b'Great game. ' * 100 +
+              b'</div></div>')
+    screenshot = (b'<div class="highlight_player_item highlight_screenshot">'
+                  b'<div class="screenshot_holder"><a href="https://cdn/'
+                  b'ss_%d.1920x1080.jpg"><img src="https://cdn/ss_%d.116x65'
+                  b'.jpg"></a></div></div>')
+    data = b'{"id": %d, "name": "Item", "tags": [1, 2, 3]},'
+    script = (b'<script type="text/javascript">GStoreItemData.AddStoreItem'
+              b'DataSet([' + b''.join(data % i for i in range(
+                  script_kib * 1024 // len(data))) + b']);</script>')
+    body = body.replace(
+        b'<div id="Reviews_summary">',
+        b'<div id="Reviews_summary">' + b''.join(
+            review % (i, i) for i in range(reviews)
+        )
+    ).replace(
+        b'<div id="highlight_player_area">',
+        b'<div id="highlight_player_area">' + b''.join(
+            screenshot % (i, i) for i in range(screenshots)
+        )
+    ).replace(b'</body>', script + b'</body>')
+    url = 'https://store.steampowered.com/app/{}/Game/'.format(app_id)
+    return HtmlResponse(url, body=body, encoding='utf-8',
+                        request=Request(url))
+
+
+def rss():
+    with open('/proc/self/statm') as file:
+        return int(file.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+
+
+def run_mode(args):
+    """Hold pages and their documents, print RSS growth and games."""
+    spider = get_crawler(GameParser)._create_spider()
+    middleware = TrimResponseMiddleware(settings.TRIM_RESPONSE_REGIONS,
+                                        settings.TRIM_RESPONSE_MAX_SIZE)
+    start_rss = rss()
+    start = time.perf_counter()
+    held = []
+    body_size = 0
+    for app_id in range(args.pages):
+        response = heavy_page(app_id, args.reviews, args.screenshots,
+                              args.script_kib)
+        if args.mode == 'trimmed':
+            response = middleware.process_response(response.request,
+                                                   response, spider)
+        body_size += len(response.body)
+        # document is parsed and kept with the response
+        response.selector.root
+        held.append(response)
+    elapsed = time.perf_counter() - start
+    memory = rss() - start_rss
+    games = [dict(next(spider.parse_game(response))) for response in held]
+    digest = hashlib.sha1(repr([sorted(game.items())
+                                for game in games]).encode()).hexdigest()
+    print(body_size, memory, elapsed, digest)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--pages', help='number of pages held at once',
+                        type=int, default=64)
+    parser.add_argument('--reviews', help='reviews on every page',
+                        type=int, default=30)
+    parser.add_argument('--screenshots', help='screenshots on every page',
+                        type=int, default=20)
+    parser.add_argument('--script-kib', help='size of inline json script',
+                        type=int, default=150)
+    parser.add_argument('--mode', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.mode:
+        run_mode(args)
+        return
+
+    results = {}
+    for mode in ('full', 'trimmed'):
+        output = subprocess.check_output([
+            sys.executable, '-W', 'ignore', '-m', 'benchmarks.bench_trim',
+            '--mode', mode, '--pages', str(args.pages),
+            '--reviews', str(args.reviews),
+            '--screenshots', str(args.screenshots),
+            '--script-kib', str(args.script_kib)
+        ])
+        results[mode] = output.split()
+
+    print("{} pages held at once, {:.0f} KiB per page".format(
+        args.pages, int(results['full'][0]) / args.pages / 1024
+    ))
+    print("{:<10} {:>10} {:>10} {:>14}".format('mode', 'body MiB', 'RSS MiB',
+                                               'ms/page'))
+    for mode, (body_size, memory, elapsed, _) in results.items():
+        print("{:<10} {:10.1f} {:10.1f} {:14.2f}".format(
+            mode, int(body_size) / 2 ** 20, int(memory) / 2 ** 20,
+            float(elapsed) * 1000 / args.pages
+        ))
+    assert results['full'][3] == results['trimmed'][3]
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,440 @@
+"""Local mock of steam store for crawling without network.
+
+Run from the project directory: python -m benchmarks.mockstore --apps 10000
+
+Store has the given number of synthetic games, the newest are released
+today, games_per_day games are released every day. It serves:
+
+- search pages (/search/?page=N) with pagination, 25 games per page
+- json search results (/search/results/?start=N&count=M)
+- game pages (/app/<id>/<name>/), every agecheck_every game redirects
+  to /agecheck/app/<id>/ if request has no age cookies, every
+  expire_cookies_every game page deletes age cookies of the client
+- appdetails json (/api/appdetails/?appids=<id>)
+
+Responses are delayed by latency (seconds, +-50%), error_rate of them
+are 429 Too Many Requests with Retry-After header. If rate_limit is set,
+requests above rate_limit per second get 429 too.
+"""
+import argparse
+import json
+import math
+import random
+import time
+from collections import Counter, deque
+from datetime import datetime, timedelta
+
+from twisted.internet import reactor
+from twisted.web import resource, server
+from w3lib.url import add_or_replace_parameter
+
+PER_PAGE = 25
+SEARCH_PATH = '/search/?sort_by=Released_DESC&category1=998'
+
+TAGS = ('Action', 'Adventure', 'Indie', 'RPG', 'Strategy', 'Simulation',
+        'Casual', 'Puzzle', 'Co-op', 'Sci-fi', 'Open World', 'Horror')
+SPECS = ('Single-player', 'Multi-player', 'Co-op', 'Steam Achievements',
+         'Full controller support', 'Steam Cloud', 'Steam Trading Cards')
+
+SEARCH_ROW = '''
+<a href="{store_url}/app/{app_id}/Game_{app_id}/?snr=1_7_7_230_150_{page}"
+   data-ds-appid="{app_id}" class="search_result_row ds_collapse_flag">
+    <div class="col search_capsule"><img src="/capsule_{app_id}.jpg"></div>
+    <div class="responsive_search_name_combined">
+        <div class="col search_name ellipsis">
+            <span class="title">Game {app_id}</span>
+        </div>
+        <div class="col search_released responsive_secondrow">{release_date}</div>
+        <div class="col search_reviewscore responsive_secondrow">
+            <span class="search_review_summary positive"
+                  data-tooltip-html="Very Positive&lt;br&gt;92% of the {num_reviews:,} user reviews for this game are positive.">
+            </span>
+        </div>
+        <div class="col search_price_discount_combined responsive_secondrow"
+             data-price-final="{price}">
+            <div class="col search_price responsive_secondrow">${price_str}</div>
+        </div>
+    </div>
+</a>
+'''
+
+SEARCH_PAGE = '''<!DOCTYPE html>
+<html><head><title>Steam Search</title>
+<script type="text/javascript">var g_sessionID = "0";</script>
+</head><body>
+<div id="search_result_container">
+    <div id="search_resultsRows">{rows}</div>
+    <div class="search_pagination">
+        <div class="search_pagination_left">
+            showing {first} - {last} of {total_count}
+        </div>
+        <div class="search_pagination_right">{pagination}</div>
+    </div>
+</div>
+</body></html>
+'''
+
+GAME_PAGE = '''<!DOCTYPE html>
+<html><head><title>Game {app_id} on Steam</title>
+<script type="text/javascript">var g_AccountID = 0;</script>
+</head><body>
+<div class="game_page_background game" data-miniprofile-appid={app_id}>
+    <div class="apphub_AppName" id="appHubAppName">Game {app_id}</div>
+    <div id="userReviews" class="user_reviews">
+        <div class="user_reviews_summary_row">
+            <div class="subtitle column all">All Reviews:</div>
+            <span class="game_review_summary positive">Very Positive</span>
+            <span class="responsive_hidden">({num_reviews:,})</span>
+        </div>
+    </div>
+    <div class="release_date">
+        <div class="subtitle column">Release Date:</div>
+        <div class="date">{release_date}</div>
+    </div>
+    <div class="glance_tags popular_tags" data-appid="{app_id}">{tags}</div>
+    <div class="game_area_details_specs_ctn">{specs}</div>
+    <div class="game_area_purchase_game">
+        <div class="game_purchase_action">
+            <div class="game_purchase_price price" data-price-final="{price}">
+                ${price_str}
+            </div>
+        </div>
+    </div>
+    <div id="game_area_description" class="game_area_description">
+        <h2>About This Game</h2>
+        {description}
+    </div>
+    <div class="game_area_sys_req sysreq_content active" data-os="win">
+        <div class="game_area_sys_req_leftCol">
+            <ul><strong>MINIMUM:</strong><br><ul class="bb_ul">
+                <li><strong>OS:</strong> Windows 7<br></li>
+                <li><strong>Processor:</strong> Intel Core i5-2400<br></li>
+                <li><strong>Memory:</strong> 8 GB RAM<br></li>
+                <li><strong>Graphics:</strong> GeForce GTX 660<br></li>
+                <li><strong>DirectX:</strong> Version 11<br></li>
+                <li><strong>Storage:</strong> {storage} GB available space</li>
+            </ul></ul>
+        </div>
+        <div class="game_area_sys_req_rightCol">
+            <ul><strong>RECOMMENDED:</strong><br><ul class="bb_ul">
+                <li><strong>OS:</strong> Windows 10<br></li>
+                <li><strong>Processor:</strong> Intel Core i7-4770<br></li>
+                <li><strong>Memory:</strong> 16 GB RAM<br></li>
+                <li><strong>Graphics:</strong> GeForce GTX 970<br></li>
+                <li><strong>DirectX:</strong> Version 12<br></li>
+                <li><strong>Storage:</strong> {storage} GB available space</li>
+            </ul></ul>
+        </div>
+    </div>
+</div>
+</body></html>
+'''
+
+AGECHECK_PAGE = '''<!DOCTYPE html>
+<html><head><title>Site Error</title></head><body>
+<div class="agegate_birthday_desc">Please enter your birth date to continue:</div>
+<form action="{store_url}/agecheckset/app/{app_id}/" method="post"></form>
+</body></html>
+'''
+
+
+class MockStore(object):
+    """Catalog of synthetic games and statistics of requests to them."""
+
+    def __init__(self, apps=10000, games_per_day=20, agecheck_every=20,
+                 latency=0.0, error_rate=0.0, retry_after=1, rate_limit=0,
+                 expire_cookies_every=0, seed=0):
+        self.apps = apps
+        self.games_per_day = games_per_day
+        self.agecheck_every = agecheck_every
+        self.expire_cookies_every = expire_cookies_every
+        self.latency = latency
+        self.error_rate = error_rate
+        self.retry_after = retry_after
+        self.rate_limit = rate_limit
+        self.today = datetime.now().replace(hour=0, minute=0, second=0,
+                                            microsecond=0)
+        self.random = random.Random(seed)
+        self.requests = Counter()
+        self.bytes_sent = 0
+        self._request_times = deque()
+
+    def is_throttled(self):
+        """Check if the current request is throttled."""
+        if self.error_rate and self.random.random() < self.error_rate:
+            return True
+        if not self.rate_limit:
+            return False
+        now = time.monotonic()
+        times = self._request_times
+        while times and times[0] <= now - 1:
+            times.popleft()
+        if len(times) >= self.rate_limit:
+            return True
+        times.append(now)
+        return False
+
+    def app_id(self, index):
+        """Get id of the game by index (0 is the newest game)."""
+        return (index + 1) * 10
+
+    def game(self, app_id):
+        """Get values of the game, they are the same on every request."""
+        if app_id % 10 or not 0 < app_id <= self.apps * 10:
+            return None
+        index = app_id // 10 - 1
+        rand = random.Random(app_id)
+        price = rand.choice((0, 499, 999, 1499, 1999, 2999, 5999))
+        return {
+            'app_id': app_id,
+            'release_date': (self.today - timedelta(
+                days=index // self.games_per_day
+            )).strftime('%d %b, %Y').lstrip('0'),
+            'num_reviews': int(rand.paretovariate(1.2) * 10),
+            'price': price,
+            'price_str': '{:.2f}'.format(price / 100),
+            'tags': rand.sample(TAGS, 4),
+            'specs': rand.sample(SPECS, 3),
+            'storage': rand.randint(1, 100),
+            'description': ''.join('<p>Paragraph {} of game {}.</p>'.format(
+                i, app_id
+            ) for i in range(rand.randint(1, 10))),
+        }
+
+    def is_age_checked(self, app_id):
+        return bool(self.agecheck_every) and (
+            app_id // 10 % self.agecheck_every == 0
+        )
+
+    @property
+    def page_count(self):
+        return math.ceil(self.apps / PER_PAGE)
+
+
+class StoreResource(resource.Resource):
+    """Resource of the whole store, requests are routed by path."""
+    isLeaf = True
+
+    def __init__(self, store, store_url):
+        super().__init__()
+        self.store = store
+        self.store_url = store_url
+
+    def render_GET(self, request):
+        path = request.path.decode('utf-8')
+        kind = path.strip('/').split('/')[0] or 'index'
+        if kind == 'search' and path.startswith('/search/results'):
+            kind = 'search_results'
+        self.store.requests[kind] += 1
+
+        if self.store.is_throttled():
+            self.store.requests['429'] += 1
+            request.setResponseCode(429)
+            request.setHeader('Retry-After', str(self.store.retry_after))
+            return self._respond(request, b'Too Many Requests')
+
+        handler = getattr(self, 'render_' + kind, None)
+        if handler is None:
+            request.setResponseCode(404)
+            return self._respond(request, b'Not Found')
+        return self._respond(request, handler(request))
+
+    def _respond(self, request, body):
+        if isinstance(body, str):
+            body = body.encode('utf-8')
+        self.store.bytes_sent += len(body)
+        if not self.store.latency:
+            return body
+
+        def finish():
+            if not request.finished and not request._disconnected:
+                request.write(body)
+                request.finish()
+
+        delay = self.store.latency * (0.5 + self.store.random.random())
+        reactor.callLater(delay, finish)
+        return server.NOT_DONE_YET
+
+    def render_search(self, request):
+        page = max(_int_arg(request, 'page', 1), 1)
+        return self._search_page(page)
+
+    def render_search_results(self, request):
+        start = _int_arg(request, 'start', 0)
+        count = min(_int_arg(request, 'count', PER_PAGE), 100)
+        request.setHeader('Content-Type', 'application/json')
+        return json.dumps({
+            'success': 1,
+            'results_html': self._rows(start, start + count, 1),
+            'total_count': self.store.apps,
+            'start': start,
+        })
+
+    def render_app(self, request):
+        app_id = _path_id(request)
+        game = self.store.game(app_id)
+        if game is None:
+            # steam redirects unknown games to the main page
+            request.redirect(self.store_url.encode('utf-8') + b'/')
+            return b''
+        cookies = request.received_cookies
+        if self.store.is_age_checked(app_id) and not (
+                b'birthtime' in cookies or b'lastagecheckage' in cookies):
+            self.store.requests['agecheck_redirect'] += 1
+            request.redirect('{}/agecheck/app/{}/'.format(
+                self.store_url, app_id
+            ).encode('utf-8'))
+            return b''
+        if self.store.expire_cookies_every and \
+                self.store.requests['app'] % \
+                self.store.expire_cookies_every == 0:
+            # like expired session, age cookies are deleted from the client
+            self.store.requests['cookies_expired'] += 1
+            for name in (b'birthtime', b'lastagecheckage'):
+                request.addCookie(name, b'', path=b'/',
+                                  expires=b'Thu, 01 Jan 1970 00:00:00 GMT')
+        return GAME_PAGE.format(
+            tags=''.join('<a href="/tags/{0}/" class="app_tag">{0}</a>'
+                         .format(tag) for tag in game['tags']),
+            specs=''.join('<div class="game_area_details_specs"><a '
+                          'class="name" href="/search/">{}</a></div>'
+                          .format(spec) for spec in game['specs']),
+            **{key: value for key, value in game.items()
+               if key not in ('tags', 'specs')}
+        )
+
+    def render_agecheck(self, request):
+        return AGECHECK_PAGE.format(store_url=self.store_url,
+                                    app_id=_path_id(request))
+
+    def render_api(self, request):
+        app_id = _int_arg(request, 'appids', 0)
+        game = self.store.game(app_id)
+        request.setHeader('Content-Type', 'application/json')
+        if game is None:
+            return json.dumps({str(app_id): {'success': False}})
+        return json.dumps({str(app_id): {'success': True, 'data': {
+            'name': 'Game {}'.format(app_id),
+            'about_the_game': game['description'],
+            'release_date': {'coming_soon': False,
+                             'date': game['release_date']},
+            'categories': [{'id': i, 'description': spec}
+                           for i, spec in enumerate(game['specs'])],
+            'price_overview': {'currency': 'USD', 'final': game['price']},
+            'pc_requirements': {
+                'minimum': '<strong>Minimum:</strong><br><ul>'
+                           '<li><strong>OS:</strong> Windows 7</li></ul>'
+            },
+        }}})
+
+    def _search_page(self, page):
+        start = (page - 1) * PER_PAGE
+        total_count = self.store.apps
+        page_count = self.store.page_count
+        links = sorted({1, page - 2, page - 1, page + 1, page + 2,
+                        page_count})
+        url = self.store_url + SEARCH_PATH
+        pagination = ''.join(
+            '<a href="{}">{}</a> '.format(
+                add_or_replace_parameter(url, 'page', str(link)), link
+            )
+            for link in links if 1 <= link <= page_count and link != page
+        )
+        if page < page_count:
+            pagination += '<a href="{}">&gt;</a>'.format(
+                add_or_replace_parameter(url, 'page', str(page + 1))
+            )
+        return SEARCH_PAGE.format(
+            rows=self._rows(start, start + PER_PAGE, page),
+            pagination=pagination,
+            first=min(start + 1, total_count),
+            last=min(start + PER_PAGE, total_count),
+            total_count=total_count
+        )
+
+    def _rows(self, start, end, page):
+        rows = []
+        for index in range(start, min(end, self.store.apps)):
+            game = self.store.game(self.store.app_id(index))
+            rows.append(SEARCH_ROW.format(store_url=self.store_url,
+                                          page=page, **game))
+        return ''.join(rows)
+
+
+def _int_arg(request, name, default):
+    values = request.args.get(name.encode('utf-8'))
+    try:
+        return int(values[0])
+    except (TypeError, ValueError, IndexError):
+        return default
+
+
+def _path_id(request):
+    for part in request.path.decode('utf-8').split('/'):
+        if part.isdigit():
+            return int(part)
+    return 0
+
+
+def listen(store, port=0, interface='127.0.0.1'):
+    """Start serving the store in the running (or not yet running) reactor.
+
+    :return: listening port and url of the store
+    """
+    site_resource = StoreResource(store, None)
+    listening_port = reactor.listenTCP(port, server.Site(site_resource),
+                                       interface=interface)
+    store_url = 'http://{}:{}'.format(interface,
+                                      listening_port.getHost().port)
+    site_resource.store_url = store_url
+    return listening_port, store_url
+
+
+def add_arguments(parser):
+    parser.add_argument('--apps', help='number of games', type=int,
+                        default=10000)
+    parser.add_argument('--games-per-day', help='games released every day',
+                        type=int, default=20)
+    parser.add_argument('--agecheck-every', help='every N-th game has '
+                                                 'age check (0 for none)',
+                        type=int, default=20)
+    parser.add_argument('--latency', help='delay of responses (sec)',
+                        type=float, default=0.0)
+    parser.add_argument('--error-rate', help='part of requests with 429',
+                        type=float, default=0.0)
+    parser.add_argument('--retry-after', help='Retry-After of 429 (sec)',
+                        type=int, default=1)
+    parser.add_argument('--rate-limit', help='requests per second without '
+                                             '429 (0 for no limit)',
+                        type=int, default=0)
+    parser.add_argument('--expire-cookies-every', help='age cookies are '
+                                                       'deleted by every '
+                                                       'N-th game page',
+                        type=int, default=0)
+
+
+def store_from_args(args):
+    return MockStore(apps=args.apps, games_per_day=args.games_per_day,
+                     agecheck_every=args.agecheck_every,
+                     latency=args.latency, error_rate=args.error_rate,
+                     retry_after=args.retry_after,
+                     rate_limit=args.rate_limit,
+                     expire_cookies_every=args.expire_cookies_every)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    add_arguments(parser)
+    parser.add_argument('--port', help='port to listen', type=int,
+                        default=8000)
+    args = parser.parse_args()
+
+    store = store_from_args(args)
+    _, store_url = listen(store, args.port)
+    print("Serving {} games at {}".format(store.apps, store_url))
+    print("Crawl it: scrapy crawl games -a store_url={}".format(store_url))
+    reactor.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+# -*- coding: utf-8 -*-
+"""Read-optimized local index of scraped games.
+
+Games get dense document numbers in order of adding. Tags and specs are
+indexed by bitmaps of documents (one per term), price, release date and
+num of reviews are kept in arrays by document and in arrays of documents
+sorted by value, so a query starts from the most selective filter and
+checks other filters per document in constant time.
+"""
+
+import json
+import os
+import re
+import struct
+from array import array
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime
+from typing import Dict, Iterable, Iterator, List, Tuple, Union
+
+# fields with inverted indexes of terms
+TERM_FIELDS = ('tags', 'specs')
+# fields with sorted indexes of values (release date is in days)
+RANGE_FIELDS = ('price', 'release_date', 'num_reviews')
+# value of the missing field, it doesn't match any range
+MISSING = -2 ** 63
+NONZERO_RE = re.compile(b'[^\x00]')
+# positions of set bits of every byte
+BYTE_BITS = tuple(tuple(bit for bit in range(8) if byte & (1 << bit))
+                  for byte in range(256))
+
+Range = Tuple[Union[int, date, None], Union[int, date, None]]
+
+
+def _bit_count(bitmap: int) -> int:
+    return bin(bitmap).count('1')
+
+
+def _to_value(field: str, value) -> int:
+    if value is None:
+        return MISSING
+    if field == 'release_date':
+        if not isinstance(value, date):
+            # release date is not known yet ("Coming soon")
+            return MISSING
+        if isinstance(value, datetime):
+            value = value.date()
+        return value.toordinal()
+    return int(value)
+
+
+class CatalogIndex:
+    """Index of games for queries by tags, specs and ranges of values."""
+    HEADER = struct.Struct('<4sI')
+    MAGIC = b'SCAT'
+
+    def __init__(self):
+        self.game_ids = array('q')
+        self.documents = {}  # type: Dict[int, int]
+        self.values = {field: array('q') for field in RANGE_FIELDS}
+        # field -> lower case term -> (term, bitmap)
+        self.terms = {field: {} for field in TERM_FIELDS}
+        # sorted (values, documents) of every range field, they are
+        # rebuilt on the first query after changes
+        self._sorted = {}  # type: Dict[str, Tuple[array, array]]
+        # bitmaps of terms as integers for fast intersection
+        self._term_ints = {}  # type: Dict[Tuple[str, str], int]
+
+    def __len__(self) -> int:
+        return len(self.game_ids)
+
+    def add(self, game_id: int, fields: Dict, partial: bool = False) -> None:
+        """Add or replace the game.
+
+        :param game_id: id of the game
+        :param fields: values of fields of the game
+        :param partial: only given fields are replaced (fields of GameDiff),
+                        otherwise missing fields are removed
+        """
+        document = self.documents.get(game_id)
+        new = document is None
+        if new:
+            document = len(self.game_ids)
+            self.documents[game_id] = document
+            self.game_ids.append(game_id)
+            for values in self.values.values():
+                values.append(MISSING)
+        for field in RANGE_FIELDS:
+            if not partial or field in fields:
+                self.values[field][document] = _to_value(field,
+                                                         fields.get(field))
+                self._sorted.pop(field, None)
+        for field in TERM_FIELDS:
+            if not partial or field in fields:
+                self._set_terms(field, document, fields.get(field) or (),
+                                new)
+
+    def _set_terms(self, field: str, document: int, terms: Iterable[str],
+                   new: bool) -> None:
+        index, mask = document >> 3, 1 << (document & 7)
+        keys = {term.lower(): term for term in terms}
+        # a new document is not in bitmaps of other terms
+        for key, (_, bits) in () if new else self.terms[field].items():
+            if key not in keys and index < len(bits) and bits[index] & mask:
+                bits[index] &= ~mask
+                self._term_ints.pop((field, key), None)
+        for key, term in keys.items():
+            entry = self.terms[field].get(key)
+            if entry is None:
+                entry = self.terms[field][key] = (term, bytearray())
+            bits = entry[1]
+            if index >= len(bits):
+                bits.extend(bytes(max(index + 1, 2 * len(bits)) - len(bits)))
+            bits[index] |= mask
+            self._term_ints.pop((field, key), None)
+
+    def query(self, tags: Iterable[str] = (), specs: Iterable[str] = (),
+              price: Range = None, release_date: Range = None,
+              num_reviews: Range = None, order_by: str = None,
+              limit: int = None) -> List[int]:
+        """Get ids of games with all given tags and specs and values in
+        given ranges.
+
+        Ranges are (min, max) with inclusive bounds, None bound is not
+        checked. Tags and specs are case insensitive.
+
+        :param order_by: range field to sort games by, '-' prefix for
+                         descending order (games are in order of adding
+                         by default)
+        :param limit: max number of games
+        """
+        ranges = {field: bounds for field, bounds in (
+            ('price', price), ('release_date', release_date),
+            ('num_reviews', num_reviews)
+        ) if bounds is not None}
+        terms = [('tags', tag) for tag in tags] + \
+                [('specs', spec) for spec in specs]
+        documents = self._match(terms, ranges)
+        if order_by is not None:
+            field = order_by.lstrip('-')
+            values = self.values[field]
+            documents = sorted(documents, key=values.__getitem__,
+                               reverse=order_by.startswith('-'))
+            # games without the value are at the end
+            documents = [document for document in documents
+                         if values[document] != MISSING] + \
+                        [document for document in documents
+                         if values[document] == MISSING]
+        else:
+            documents.sort()
+        if limit is not None:
+            documents = documents[:limit]
+        return [self.game_ids[document] for document in documents]
+
+    def count(self, **filters) -> int:
+        return len(self.query(**filters))
+
+    def _match(self, terms: List[Tuple[str, str]],
+               ranges: Dict[str, Range]) -> List[int]:
+        """Get documents matching all terms and ranges."""
+        bounds = {field: self._bounds(field, minimum, maximum)
+                  for field, (minimum, maximum) in ranges.items()}
+        # positions of documents of every range in sorted index
+        slices = {field: self._range_slice(field, *bounds[field])
+                  for field in bounds}
+
+        bitmap = None
+        if terms:
+            bitmap = -1
+            for field, term in terms:
+                bitmap &= self._term_int(field, term.lower())
+                if not bitmap:
+                    return []
+        # the smallest set of documents is checked by other filters
+        driver = min(slices, key=lambda field: slices[field][1] -
+                     slices[field][0], default=None)
+        if driver is not None and (
+                bitmap is None or
+                slices[driver][1] - slices[driver][0] < _bit_count(bitmap)):
+            start, stop = slices.pop(driver)
+            candidates = self._sorted[driver][1][start:stop]
+        elif bitmap is not None:
+            candidates = self._bitmap_documents(bitmap)
+            bitmap = None
+        else:
+            candidates = range(len(self.game_ids))
+
+        # filters are applied one by one, comprehensions are much faster,
+        # than checks of all filters per document
+        if bitmap is not None:
+            bits = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, 'little')
+            size = len(bits)
+            candidates = [document for document in candidates
+                          if document >> 3 < size and
+                          bits[document >> 3] & (1 << (document & 7))]
+        for field in slices:
+            values, (minimum, maximum) = self.values[field], bounds[field]
+            candidates = [document for document in candidates
+                          if minimum <= values[document] <= maximum]
+        return list(candidates)
+
+    @staticmethod
+    def _bounds(field: str, minimum, maximum) -> Tuple[int, int]:
+        return (MISSING + 1 if minimum is None else _to_value(field, minimum),
+                2 ** 63 - 1 if maximum is None else _to_value(field, maximum))
+
+    def _range_slice(self, field: str, minimum: int,
+                     maximum: int) -> Tuple[int, int]:
+        """Get positions of the range of values in sorted index."""
+        values, _ = self._get_sorted(field)
+        return bisect_left(values, minimum), bisect_right(values, maximum)
+
+    def _get_sorted(self, field: str) -> Tuple[array, array]:
+        if field not in self._sorted:
+            values = self.values[field]
+            documents = array('q', sorted(range(len(values)),
+                                          key=values.__getitem__))
+            self._sorted[field] = (
+                array('q', (values[document] for document in documents)),
+                documents
+            )
+        return self._sorted[field]
+
+    def _term_int(self, field: str, key: str) -> int:
+        value = self._term_ints.get((field, key))
+        if value is None:
+            entry = self.terms[field].get(key)
+            value = int.from_bytes(entry[1], 'little') if entry else 0
+            self._term_ints[(field, key)] = value
+        return value
+
+    @staticmethod
+    def _bitmap_documents(bitmap: int) -> Iterator[int]:
+        """Get documents of the bitmap in increasing order."""
+        data = bitmap.to_bytes((bitmap.bit_length() + 7) // 8, 'little')
+        for match in NONZERO_RE.finditer(data):
+            index = match.start()
+            start = index * 8
+            for bit in BYTE_BITS[data[index]]:
+                yield start + bit
+
+    def term_counts(self, field: str) -> Dict[str, int]:
+        """Get number of games of every term of the field."""
+        return {term: _bit_count(self._term_int(field, key))
+                for key, (term, _) in self.terms[field].items()}
+
+    def save(self, path: str) -> None:
+        """Save the index into the file (it is replaced at once)."""
+        blobs = [self.game_ids.tobytes()]
+        blobs += [self.values[field].tobytes() for field in RANGE_FIELDS]
+        for field in RANGE_FIELDS:
+            values, documents = self._get_sorted(field)
+            blobs += [values.tobytes(), documents.tobytes()]
+        header = {'count': len(self.game_ids), 'terms': {}}
+        for field in TERM_FIELDS:
+            header['terms'][field] = [
+                [term, len(bits)] for term, bits in self.terms[field].values()
+            ]
+            blobs += [bytes(bits) for _, bits in self.terms[field].values()]
+        data = json.dumps(header).encode('utf-8')
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        with open(path + '.tmp', 'wb') as file:
+            file.write(self.HEADER.pack(self.MAGIC, len(data)))
+            file.write(data)
+            for blob in blobs:
+                file.write(blob)
+        os.replace(path + '.tmp', path)
+
+    @classmethod
+    def load(cls, path: str) -> 'CatalogIndex':
+        """Load the index from the file, saved by save."""
+        with open(path, 'rb') as file:
+            data = file.read()
+        magic, size = cls.HEADER.unpack_from(data)
+        if magic != cls.MAGIC:
+            raise ValueError('{} is not a catalog index'.format(path))
+        position = cls.HEADER.size
+        header = json.loads(data[position:position + size])
+        position += size
+        count = header['count']
+
+        def read_array():
+            nonlocal position
+            values = array('q')
+            values.frombytes(data[position:position + count *
+                                  values.itemsize])
+            position += count * values.itemsize
+            return values
+
+        catalog = cls()
+        catalog.game_ids = read_array()
+        catalog.documents = {game_id: document for document, game_id
+                             in enumerate(catalog.game_ids)}
+        for field in RANGE_FIELDS:
+            catalog.values[field] = read_array()
+        for field in RANGE_FIELDS:
+            catalog._sorted[field] = (read_array(), read_array())
+        for field in TERM_FIELDS:
+            for term, length in header['terms'][field]:
+                catalog.terms[field][term.lower()] = (
+                    term, bytearray(data[position:position + length])
+                )
+                position += length
+        return catalog
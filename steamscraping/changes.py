@@ -0,0 +1,110 @@
+# -*- coding: utf-8 -*-
+"""Per-field hashes of games for detection of changed fields."""
+
+import hashlib
+import json
+import os
+import sqlite3
+from typing import List, Union
+
+from scrapy.exceptions import DropItem
+
+from steamscraping.items import Game, GameRequirements
+
+# hashed fields in fixed order (game_id is the key of the hashes)
+FIELDS = tuple(sorted(field for field in Game.fields if field != 'game_id'))
+DIGEST_SIZE = 8
+# hash of the missing field
+EMPTY_HASH = bytes(DIGEST_SIZE)
+
+
+class UnchangedGame(DropItem):
+    """Game is dropped, because it is the same, as in the last crawl."""
+
+
+def normalize_value(value):
+    """Get value of the field, which doesn't depend on formatting.
+
+    System requirements are converted into the record of not empty
+    requirements with collapsed whitespace.
+    """
+    if isinstance(value, GameRequirements):
+        return {field: ' '.join(requirement.split())
+                for field, requirement in value.as_dict().items()
+                if requirement and not requirement.isspace()}
+    return value
+
+
+def field_hash(value) -> bytes:
+    if value is None:
+        return EMPTY_HASH
+    data = json.dumps(normalize_value(value), sort_keys=True, default=str,
+                      ensure_ascii=False)
+    return hashlib.blake2b(data.encode('utf-8'),
+                           digest_size=DIGEST_SIZE).digest()
+
+
+def field_hashes(item) -> bytes:
+    """Get concatenated hashes of fields of the game in order of FIELDS."""
+    return b''.join(field_hash(item.get(field)) for field in FIELDS)
+
+
+def changed_fields(old: Union[bytes, None], new: bytes) -> List[str]:
+    """Get names of fields, which hashes are different.
+
+    All fields are changed, if there are no old hashes or they were made
+    for other fields of Game.
+    """
+    if old is None or len(old) != len(new):
+        return list(FIELDS)
+    return [field for index, field in enumerate(FIELDS)
+            if old[index * DIGEST_SIZE:(index + 1) * DIGEST_SIZE] !=
+            new[index * DIGEST_SIZE:(index + 1) * DIGEST_SIZE]]
+
+
+class FieldHashStore:
+    """Store of field hashes of every game in sqlite database.
+
+    Hashes of a game are one blob in the row with game_id primary key,
+    so a lookup is a single index search and only pages of the database
+    are cached in memory, not all games.
+    """
+    COMMIT_EVERY = 1000
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS field_hashes ('
+            'game_id INTEGER PRIMARY KEY, '
+            'hashes BLOB NOT NULL)'
+        )
+        self._uncommitted = 0
+
+    def get(self, game_id: int) -> Union[bytes, None]:
+        row = self.connection.execute(
+            'SELECT hashes FROM field_hashes WHERE game_id = ?', (game_id,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def set(self, game_id: int, hashes: bytes) -> None:
+        self.connection.execute(
+            'INSERT OR REPLACE INTO field_hashes (game_id, hashes) '
+            'VALUES (?, ?)', (game_id, hashes)
+        )
+        self._uncommitted += 1
+        if self._uncommitted >= self.COMMIT_EVERY:
+            self.commit()
+
+    def commit(self) -> None:
+        self.connection.commit()
+        self._uncommitted = 0
+
+    def close(self) -> None:
+        self.commit()
+        self.connection.close()
@@ -0,0 +1,100 @@
+# -*- coding: utf-8 -*-
+"""Persistent state of crawled games for incremental crawling."""
+
+import hashlib
+import json
+import os
+import sqlite3
+from collections import namedtuple
+from typing import Union
+
+GameState = namedtuple('GameState',
+                       ['game_id', 'fetched_at', 'content_hash',
+                        'unchanged_runs'])
+
+
+def game_content_hash(item) -> str:
+    """Get hash of game fields, that doesn't depend on fields order."""
+    values = {}
+    for field, value in item.items():
+        if hasattr(value, 'as_dict'):
+            value = value.as_dict()
+        values[field] = value
+    data = json.dumps(values, sort_keys=True, default=str)
+    return hashlib.sha1(data.encode('utf-8')).hexdigest()
+
+
+class CrawlState:
+    """Store with last fetch time and content hash of every game.
+
+    Game is considered fresh during refresh interval after fetching.
+    Every time the game is fetched without changes, the interval is doubled
+    (up to max interval), so stable games are requested more rarely.
+    """
+    COMMIT_EVERY = 100
+
+    def __init__(self, path: str, refresh_interval: float,
+                 max_interval: float):
+        self.path = path
+        self.refresh_interval = refresh_interval
+        self.max_interval = max_interval
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS games_state ('
+            'game_id INTEGER PRIMARY KEY, '
+            'fetched_at REAL NOT NULL, '
+            'content_hash TEXT NOT NULL, '
+            'unchanged_runs INTEGER NOT NULL DEFAULT 0)'
+        )
+        self._uncommitted = 0
+
+    def get(self, game_id: int) -> Union[GameState, None]:
+        row = self.connection.execute(
+            'SELECT game_id, fetched_at, content_hash, unchanged_runs '
+            'FROM games_state WHERE game_id = ?', (game_id,)
+        ).fetchone()
+        return GameState(*row) if row else None
+
+    def is_fresh(self, game_id: int, now: float) -> bool:
+        """Check if game was fetched recently enough to skip it."""
+        state = self.get(game_id)
+        if state is None:
+            return False
+        interval = min(self.refresh_interval * 2 ** state.unchanged_runs,
+                       self.max_interval)
+        return now - state.fetched_at < interval
+
+    def update(self, game_id: int, content_hash: str, now: float) -> bool:
+        """Save fetching of the game.
+
+        :param game_id: id of the game
+        :param content_hash: hash of scraped game
+        :param now: time of fetching (timestamp)
+
+        :return: True if game is new or changed since last fetching
+        """
+        state = self.get(game_id)
+        changed = state is None or state.content_hash != content_hash
+        unchanged_runs = 0 if changed else state.unchanged_runs + 1
+        self.connection.execute(
+            'INSERT OR REPLACE INTO games_state '
+            '(game_id, fetched_at, content_hash, unchanged_runs) '
+            'VALUES (?, ?, ?, ?)',
+            (game_id, now, content_hash, unchanged_runs)
+        )
+        self._uncommitted += 1
+        if self._uncommitted >= self.COMMIT_EVERY:
+            self.commit()
+        return changed
+
+    def commit(self) -> None:
+        self.connection.commit()
+        self._uncommitted = 0
+
+    def close(self) -> None:
+        self.commit()
+        self.connection.close()
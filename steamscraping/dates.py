@@ -0,0 +1,99 @@
+# -*- coding: utf-8 -*-
+"""Parser of release dates from steam store."""
+
+import logging
+import re
+from datetime import datetime
+from functools import lru_cache
+from typing import Dict, Union
+
+logger = logging.getLogger(__name__)
+
+ENGLISH_MONTHS = {
+    'jan': 1, 'feb': 2, 'mar': 3, 'apr': 4, 'may': 5, 'jun': 6,
+    'jul': 7, 'aug': 8, 'sep': 9, 'sept': 9, 'oct': 10, 'nov': 11,
+    'dec': 12,
+    'january': 1, 'february': 2, 'march': 3, 'april': 4, 'june': 6,
+    'july': 7, 'august': 8, 'september': 9, 'october': 10,
+    'november': 11, 'december': 12,
+}
+
+# 18 Aug, 2019
+DAY_MONTH_YEAR_RE = re.compile(r'^(\d{1,2}) ([A-Za-z]+),? (\d{4})$')
+# Aug 18, 2019
+MONTH_DAY_YEAR_RE = re.compile(r'^([A-Za-z]+) (\d{1,2}), (\d{4})$')
+# Aug 2019, August, 2019
+MONTH_YEAR_RE = re.compile(r'^([A-Za-z]+),? (\d{4})$')
+# 2019
+YEAR_RE = re.compile(r'^(\d{4})$')
+
+
+class ReleaseDateParser:
+    """Parser of release dates.
+
+    Format of the date is detected by regular expressions instead of
+    trying strptime with every format. Release dates are repeated a lot
+    on search pages, so parsed dates are cached.
+
+    Strings, which are not dates (Coming soon, Q3 2019), are returned
+    as is and counted in stats (release_date/unparsed) of the crawler,
+    which parses them. Parser has no state of crawlers, so one parser
+    is shared by all crawlers of the process.
+    """
+    def __init__(self, months: Dict[str, int], cache_size: int = 4096):
+        self.months = months
+        self._parse_cached = lru_cache(maxsize=cache_size)(self._parse)
+
+    def __call__(self, date_str: str,
+                 stats=None) -> Union[datetime, str]:
+        """Get datetime instance from string if it is possible.
+
+        :param date_str: string with date
+        :param stats: stats of the crawler to count unparsed dates
+
+        :return: datetime instance if it is possible (otherwise given string)
+        """
+        result = self._parse_cached(date_str)
+        if result is None:
+            if stats is not None:
+                stats.inc_value('release_date/unparsed')
+            return date_str
+        return result
+
+    def cache_info(self):
+        return self._parse_cached.cache_info()
+
+    def _parse(self, date_str: str) -> Union[datetime, None]:
+        value = date_str.strip()
+        try:
+            match = DAY_MONTH_YEAR_RE.match(value)
+            if match:
+                day, month, year = match.groups()
+                return self._make_date(year, month, day)
+
+            match = MONTH_DAY_YEAR_RE.match(value)
+            if match:
+                month, day, year = match.groups()
+                return self._make_date(year, month, day)
+
+            match = MONTH_YEAR_RE.match(value)
+            if match:
+                month, year = match.groups()
+                return self._make_date(year, month, 1)
+
+            match = YEAR_RE.match(value)
+            if match:
+                return datetime(int(match.group(1)), 1, 1)
+        except (KeyError, ValueError):
+            # unknown month name or day out of range
+            pass
+
+        logger.debug("Can't parse release date: %r", date_str)
+        return None
+
+    def _make_date(self, year, month, day) -> datetime:
+        return datetime(int(year), self.months[month.lower()], int(day))
+
+
+# parser shared by all processors of the process
+english_date_parser = ReleaseDateParser(ENGLISH_MONTHS)
@@ -0,0 +1,196 @@
+# -*- coding: utf-8 -*-
+"""Database schema and storage helpers for scraped games."""
+
+from typing import Dict, Iterable, List
+
+from sqlalchemy import (MetaData, Table, Column, Integer, Text, DateTime,
+                        JSON, create_engine)
+from sqlalchemy.engine import Engine, Connection
+
+from app_config import AppConfig
+from steamscraping.items import GameRequirements
+
+# system requirements are flattened into columns with the same names
+REQUIREMENTS_COLUMNS = GameRequirements.__slots__
+
+metadata = MetaData()
+
+games = Table(
+    'games', metadata,
+    Column('game_id', Integer, primary_key=True, autoincrement=False),
+    Column('title', Text),
+    Column('description', Text),
+    Column('num_reviews', Integer),
+    Column('release_date', DateTime),
+    Column('price', Integer),
+    Column('specs', JSON),
+    Column('tags', JSON),
+    *[Column(field, Text) for field in REQUIREMENTS_COLUMNS]
+)
+
+# sqlite before 3.32 does not accept more than 999 bound parameters
+# in one statement, so multi-row inserts are split into chunks
+SQLITE_MAX_VARIABLES = 999
+
+
+def build_db_url(settings) -> str:
+    """Get database url from crawler settings.
+
+    DB_URL has priority, otherwise url is built from DB_* settings.
+    Connection settings, which are not set, are read from app.yaml.
+
+    :param settings: crawler settings
+
+    :return: url for sqlalchemy engine
+    """
+    db_url = settings.get('DB_URL')
+    if db_url:
+        return db_url
+    values = {name: settings.get('DB_' + name.upper())
+              for name in ('host', 'port', 'user', 'password')}
+    if any(value is None for value in values.values()):
+        app_config = AppConfig()
+        for name, value in values.items():
+            if value is None:
+                values[name] = getattr(app_config, 'db_' + name)
+    return '{driver}://{user}:{password}@{host}:{port}/{name}'.format(
+        driver=settings.get('DB_DRIVER'),
+        name=settings.get('DB_NAME'),
+        **values
+    )
+
+
+def create_db_engine(db_url: str, pool_size: int) -> Engine:
+    """Create engine with connection pool for given number of writers."""
+    kwargs = {'pool_pre_ping': True}
+    if not db_url.startswith('sqlite'):
+        kwargs.update(pool_size=pool_size, max_overflow=0)
+    engine = create_engine(db_url, **kwargs)
+    metadata.create_all(engine)
+    return engine
+
+
+def game_to_row(item) -> Dict:
+    """Convert Game item to the row of games table."""
+    row = {column.name: item.get(column.name) for column in games.columns
+           if column.name not in REQUIREMENTS_COLUMNS}
+    requirements = item.get('system_requirements')
+    for column in REQUIREMENTS_COLUMNS:
+        row[column] = getattr(requirements, column, None)
+    return row
+
+
+def diff_to_row(diff) -> Dict:
+    """Convert GameDiff item to the partial row with changed columns."""
+    row = {'game_id': diff['game_id']}
+    for field, value in diff['changed'].items():
+        if field == 'system_requirements':
+            for column in REQUIREMENTS_COLUMNS:
+                row[column] = getattr(value, column, None)
+        elif field in games.columns:
+            row[field] = value
+    return row
+
+
+def upsert_games(connection: Connection, rows: List[Dict]) -> None:
+    """Insert rows into games table, updating rows with the same game_id.
+
+    Rows are written with multi-row statements, using native upsert
+    of the database if it is supported. Partial rows (from diff_to_row)
+    update only their columns.
+
+    :param connection: opened connection (inside of transaction)
+    :param rows: rows for games table
+    """
+    if not rows:
+        return
+    # the last value for the game wins, as it would with separate upserts
+    merged = {}  # type: Dict[int, Dict]
+    for row in rows:
+        merged.setdefault(row['game_id'], {}).update(row)
+    # rows of one statement must have the same columns
+    groups = {}  # type: Dict[tuple, List[Dict]]
+    for row in merged.values():
+        groups.setdefault(tuple(sorted(row)), []).append(row)
+
+    insert = _get_dialect_insert(connection.dialect.name)
+    for columns, group in groups.items():
+        if insert is not None:
+            _upsert(connection, insert, columns, group)
+        elif len(columns) == len(games.columns):
+            _delete_insert(connection, group)
+        else:
+            _update_insert(connection, group)
+
+
+def _upsert(connection: Connection, insert, columns: tuple,
+            rows: List[Dict]) -> None:
+    """Native upsert of rows with the same columns."""
+    for chunk in _chunks(rows, _rows_per_statement(connection,
+                                                   len(columns))):
+        statement = insert(games).values(chunk)
+        updated = {name: _excluded(statement, name) for name in columns
+                   if name != 'game_id'}
+        if connection.dialect.name == 'mysql':
+            statement = statement.on_duplicate_key_update(**updated)
+        else:
+            statement = statement.on_conflict_do_update(
+                index_elements=[games.c.game_id], set_=updated
+            )
+        connection.execute(statement)
+
+
+def _get_dialect_insert(dialect_name: str):
+    """Get insert construct with upsert support for the dialect."""
+    try:
+        if dialect_name == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        elif dialect_name == 'mysql':
+            from sqlalchemy.dialects.mysql import insert
+        elif dialect_name == 'sqlite':
+            # available since sqlalchemy 1.4
+            from sqlalchemy.dialects.sqlite import insert
+        else:
+            return None
+    except ImportError:
+        return None
+    return insert
+
+
+def _excluded(statement, column_name: str):
+    """Get reference to the value proposed for insertion."""
+    if hasattr(statement, 'excluded'):
+        return statement.excluded[column_name]
+    return statement.inserted[column_name]
+
+
+def _delete_insert(connection: Connection, rows: List[Dict]) -> None:
+    """Generic upsert for databases without native support."""
+    game_ids = [row['game_id'] for row in rows]
+    connection.execute(games.delete().where(games.c.game_id.in_(game_ids)))
+    connection.execute(games.insert(), rows)
+
+
+def _update_insert(connection: Connection, rows: List[Dict]) -> None:
+    """Generic upsert of partial rows for databases without native
+    support."""
+    for row in rows:
+        values = {name: value for name, value in row.items()
+                  if name != 'game_id'}
+        result = connection.execute(
+            games.update().where(games.c.game_id == row['game_id'])
+            .values(**values)
+        )
+        if not result.rowcount:
+            connection.execute(games.insert(), [row])
+
+
+def _rows_per_statement(connection: Connection, columns: int) -> int:
+    if connection.dialect.name == 'sqlite':
+        return SQLITE_MAX_VARIABLES // columns
+    return 1000
+
+
+def _chunks(rows: List[Dict], size: int) -> Iterable[List[Dict]]:
+    for i in range(0, len(rows), size):
+        yield rows[i: i + size]
@@ -0,0 +1,221 @@
+# -*- coding: utf-8 -*-
+"""Compact dupe filter for very large crawls."""
+
+import math
+import os
+import re
+import struct
+from typing import Union
+
+from scrapy.utils.httpobj import urlparse_cached
+from scrapy.utils.job import job_dir
+
+from steamscraping.middlewares import SteamDupeFilter
+from steamscraping.urls import canonical_url
+
+APP_PATH_RE = re.compile(r'/app/(\d+)(?:/|$)')
+# larger ids (16 MiB of bitmap) are not expected in the store
+MAX_APP_ID = 2 ** 27
+
+
+class AppIdBitmap:
+    """Set of non-negative integers as a bitmap, one bit per id.
+
+    Steam app ids are dense, so a million of them take less than 1 MiB.
+    """
+    __slots__ = ('bits', 'count')
+
+    def __init__(self, bits: bytes = b''):
+        self.bits = bytearray(bits)
+        self.count = bin(int.from_bytes(self.bits, 'little')).count('1')
+
+    def add(self, app_id: int) -> bool:
+        """Add id to the set.
+
+        :return: True if id was not in the set
+        """
+        index, mask = app_id >> 3, 1 << (app_id & 7)
+        if index >= len(self.bits):
+            self.bits.extend(bytes(max(index + 1, 2 * len(self.bits)) -
+                                   len(self.bits)))
+        elif self.bits[index] & mask:
+            return False
+        self.bits[index] |= mask
+        self.count += 1
+        return True
+
+    def __contains__(self, app_id: int) -> bool:
+        index = app_id >> 3
+        return index < len(self.bits) and \
+            bool(self.bits[index] & (1 << (app_id & 7)))
+
+    def __len__(self) -> int:
+        return self.count
+
+
+class BloomFilter:
+    """Bloom filter of request fingerprints.
+
+    Fingerprints are already uniform hashes, so bit positions are taken
+    from them by double hashing instead of hashing them again.
+    """
+    HEADER = struct.Struct('<QQQ')
+    __slots__ = ('num_bits', 'num_hashes', 'bits', 'count')
+
+    def __init__(self, num_bits: int, num_hashes: int, bits: bytes = None,
+                 count: int = 0):
+        self.num_bits = num_bits
+        self.num_hashes = num_hashes
+        self.bits = bytearray(bits or (num_bits + 7) // 8)
+        self.count = count
+
+    @classmethod
+    def for_capacity(cls, capacity: int,
+                     error_rate: float) -> 'BloomFilter':
+        """Make filter with given false positive rate for capacity items."""
+        num_bits = math.ceil(-capacity * math.log(error_rate) /
+                             math.log(2) ** 2)
+        num_hashes = max(1, round(num_bits / capacity * math.log(2)))
+        return cls(num_bits, num_hashes)
+
+    def add(self, fingerprint: bytes) -> bool:
+        """Add fingerprint to the filter.
+
+        :return: True if fingerprint was not in the filter (false
+                 positives are possible, false negatives are not)
+        """
+        first = int.from_bytes(fingerprint[:8], 'little')
+        second = int.from_bytes(fingerprint[8:16], 'little') | 1
+        bits, num_bits = self.bits, self.num_bits
+        added = False
+        for i in range(self.num_hashes):
+            position = (first + i * second) % num_bits
+            index, mask = position >> 3, 1 << (position & 7)
+            if not bits[index] & mask:
+                bits[index] |= mask
+                added = True
+        if added:
+            self.count += 1
+        return added
+
+    def to_bytes(self) -> bytes:
+        return self.HEADER.pack(self.num_bits, self.num_hashes,
+                                self.count) + bytes(self.bits)
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'BloomFilter':
+        num_bits, num_hashes, count = cls.HEADER.unpack_from(data)
+        return cls(num_bits, num_hashes, data[cls.HEADER.size:], count)
+
+    def __len__(self) -> int:
+        return self.count
+
+
+class AppIdDupeFilter(SteamDupeFilter):
+    """Dupe filter, which keeps games by app id and other requests by
+    binary fingerprints.
+
+    GET requests to /app/<id>/ pages are the same game whatever the rest
+    of the url is, they are kept in AppIdBitmap. Fingerprints of other
+    requests (and redirected game requests, e.g. /app/<id>/ to
+    /app/<id>/<Name>/, which must not be filtered as the same game) are
+    kept in a set of 20-byte digests or, if
+    DUPEFILTER_BLOOM_CAPACITY is set, in BloomFilter with
+    DUPEFILTER_BLOOM_ERROR_RATE false positives.
+
+    With JOBDIR the state is loaded on open and written on close as a
+    few binary files instead of a line per request.
+    """
+    APP_IDS_FILE = 'appids.bitmap'
+    FINGERPRINTS_FILE = 'fingerprints.seen'
+    BLOOM_FILE = 'fingerprints.bloom'
+
+    def __init__(self, path: Union[str, None] = None, debug: bool = False,
+                 *, fingerprinter=None, bloom_capacity: int = 0,
+                 bloom_error_rate: float = 0.001):
+        super().__init__(None, debug, fingerprinter=fingerprinter)
+        self.path = path
+        self.app_ids = AppIdBitmap()
+        if bloom_capacity:
+            self.fingerprints = BloomFilter.for_capacity(bloom_capacity,
+                                                         bloom_error_rate)
+        else:
+            self.fingerprints = set()
+        if path:
+            self._load()
+
+    @classmethod
+    def from_settings(cls, settings, *, fingerprinter=None):
+        return cls(job_dir(settings), settings.getbool('DUPEFILTER_DEBUG'),
+                   fingerprinter=fingerprinter,
+                   bloom_capacity=settings.getint('DUPEFILTER_BLOOM_CAPACITY'),
+                   bloom_error_rate=settings.getfloat(
+                       'DUPEFILTER_BLOOM_ERROR_RATE', 0.001
+                   ))
+
+    def request_seen(self, request):
+        app_id = self.app_id(request)
+        if app_id is not None and 'redirect_times' not in request.meta:
+            return not self.app_ids.add(app_id)
+
+        fingerprint = self.fingerprinter.fingerprint(
+            request.replace(url=canonical_url(request.url))
+        )
+        if isinstance(self.fingerprints, BloomFilter):
+            return not self.fingerprints.add(fingerprint)
+        if fingerprint in self.fingerprints:
+            return True
+        self.fingerprints.add(fingerprint)
+        return False
+
+    @staticmethod
+    def app_id(request) -> Union[int, None]:
+        """Get id of the game, if request is GET of the game page."""
+        if request.method != 'GET':
+            return None
+        match = APP_PATH_RE.match(urlparse_cached(request).path)
+        if match is None:
+            return None
+        app_id = int(match.group(1))
+        return app_id if app_id < MAX_APP_ID else None
+
+    def close(self, reason):
+        if self.path:
+            self._save()
+
+    def _load(self):
+        data = _read(os.path.join(self.path, self.APP_IDS_FILE))
+        if data:
+            self.app_ids = AppIdBitmap(data)
+        if isinstance(self.fingerprints, BloomFilter):
+            data = _read(os.path.join(self.path, self.BLOOM_FILE))
+            if data:
+                self.fingerprints = BloomFilter.from_bytes(data)
+        else:
+            data = _read(os.path.join(self.path, self.FINGERPRINTS_FILE))
+            self.fingerprints.update(data[i:i + 20]
+                                     for i in range(0, len(data), 20))
+
+    def _save(self):
+        _write(os.path.join(self.path, self.APP_IDS_FILE),
+               bytes(self.app_ids.bits))
+        if isinstance(self.fingerprints, BloomFilter):
+            _write(os.path.join(self.path, self.BLOOM_FILE),
+                   self.fingerprints.to_bytes())
+        else:
+            _write(os.path.join(self.path, self.FINGERPRINTS_FILE),
+                   b''.join(self.fingerprints))
+
+
+def _read(path: str) -> bytes:
+    if not os.path.exists(path):
+        return b''
+    with open(path, 'rb') as file:
+        return file.read()
+
+
+def _write(path: str, data: bytes) -> None:
+    temp_path = path + '.tmp'
+    with open(temp_path, 'wb') as file:
+        file.write(data)
+    os.replace(temp_path, path)
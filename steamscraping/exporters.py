@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+"""Streaming export of games into rotated compressed files.
+
+Games are written as rows of games table (system requirements are
+flattened into columns), so files can be loaded by analytics tools
+without scrapy. Every file is written with PART_SUFFIX and renamed,
+when it is complete, so readers never see partial files.
+"""
+
+import bz2
+import gzip
+import json
+import lzma
+import os
+import time
+from datetime import datetime
+from typing import Callable, Dict, List, Union
+
+from steamscraping.db import REQUIREMENTS_COLUMNS
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:
+    pyarrow = None
+
+PART_SUFFIX = '.part'
+
+# compressions of json lines and their file extensions
+COMPRESSIONS = {
+    None: (None, ''),
+    'gzip': (lambda file, level: gzip.GzipFile(fileobj=file, mode='wb',
+                                               compresslevel=level), '.gz'),
+    'bz2': (lambda file, level: bz2.BZ2File(file, 'wb',
+                                            compresslevel=level), '.bz2'),
+    'xz': (lambda file, level: lzma.LZMAFile(file, 'wb', preset=level),
+           '.xz'),
+}
+
+
+def game_schema() -> 'pyarrow.Schema':
+    """Get arrow schema of games table."""
+    labels = pyarrow.list_(pyarrow.string())
+    return pyarrow.schema(
+        [('game_id', pyarrow.int64()),
+         ('title', pyarrow.string()),
+         ('description', pyarrow.string()),
+         ('num_reviews', pyarrow.int32()),
+         ('release_date', pyarrow.timestamp('s')),
+         ('price', pyarrow.int32()),
+         ('specs', labels),
+         ('tags', labels)] +
+        [(column, pyarrow.string()) for column in REQUIREMENTS_COLUMNS]
+    )
+
+
+class GameFileWriter:
+    """Writer of rows of games into one file."""
+    extension = ''
+
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path + PART_SUFFIX, 'wb')
+        self.count = 0
+
+    @classmethod
+    def suffix(cls, compression) -> str:
+        """Get extension of files with given compression."""
+        return cls.extension
+
+    @property
+    def size(self) -> int:
+        """Number of bytes written into the file."""
+        return self.file.tell()
+
+    def write(self, row: Dict) -> None:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        self.file.close()
+        os.replace(self.path + PART_SUFFIX, self.path)
+
+
+class JsonLinesWriter(GameFileWriter):
+    """Writer of games as compressed json lines.
+
+    Every row is compressed at once, so memory does not depend on the
+    size of the file.
+    """
+    extension = '.jsonl'
+
+    def __init__(self, path: str, compression: Union[str, None] = 'gzip',
+                 level: int = 6):
+        super().__init__(path)
+        wrap, _ = COMPRESSIONS[compression]
+        self.stream = self.file if wrap is None else wrap(self.file, level)
+        self.encoder = json.JSONEncoder(ensure_ascii=False,
+                                        default=_json_default)
+
+    @classmethod
+    def suffix(cls, compression):
+        return cls.extension + COMPRESSIONS[compression][1]
+
+    def write(self, row):
+        self.stream.write(self.encoder.encode(row).encode('utf-8') + b'\n')
+        self.count += 1
+
+    def close(self):
+        if self.stream is not self.file:
+            self.stream.close()
+        super().close()
+
+
+class ParquetWriter(GameFileWriter):
+    """Writer of games into parquet file by record batches.
+
+    Rows are collected into columns and written as a row group of
+    batch_size games, so memory is bounded by one batch. Columns are
+    dictionary encoded in the file (parquet falls back to plain encoding
+    for columns with many distinct values like descriptions), so tags,
+    specs and requirements take a few bits per value. They are plain
+    strings in arrow schema, because arrow dictionaries inside lists
+    can't be read back from several row groups.
+    """
+
+    extension = '.parquet'
+
+    def __init__(self, path: str, compression: str = 'zstd',
+                 batch_size: int = 5000):
+        super().__init__(path)
+        self.batch_size = batch_size
+        self.schema = game_schema()
+        self.writer = pyarrow.parquet.ParquetWriter(
+            self.file, self.schema, compression=compression
+        )
+        self._columns = {name: [] for name in self.schema.names}
+
+    def write(self, row):
+        for name, column in self._columns.items():
+            column.append(row.get(name))
+        self.count += 1
+        if len(self._columns['game_id']) >= self.batch_size:
+            self.flush()
+
+    def flush(self) -> None:
+        """Write collected rows as a record batch."""
+        if not self._columns['game_id']:
+            return
+        self.writer.write_batch(pyarrow.RecordBatch.from_pydict(
+            self._columns, schema=self.schema
+        ))
+        self._columns = {name: [] for name in self.schema.names}
+
+    def close(self):
+        self.flush()
+        self.writer.close()
+        super().close()
+
+
+WRITERS = {
+    'jsonl': JsonLinesWriter,
+    'parquet': ParquetWriter,
+}
+
+
+class RotatingExporter:
+    """Exporter of games into files, which are rotated by size and time.
+
+    Files are named <prefix>-<start time>-<number><suffix>, a new file is
+    started, when the current one has at least rotate_size bytes or was
+    opened rotate_interval sec ago (zero disables the limit).
+    """
+    def __init__(self, directory: str, create_writer: Callable[[str],
+                                                               GameFileWriter],
+                 suffix: str, rotate_size: int = 0,
+                 rotate_interval: float = 0, prefix: str = 'games'):
+        self.directory = directory
+        self.create_writer = create_writer
+        self.suffix = suffix
+        self.rotate_size = rotate_size
+        self.rotate_interval = rotate_interval
+        self.prefix = '{}-{}'.format(prefix, time.strftime('%Y%m%dT%H%M%S'))
+
+        self.writer = None  # type: Union[GameFileWriter, None]
+        self.opened_at = None
+        self.files = []  # type: List[str]
+        self.rows = 0
+        self.bytes = 0
+
+    def write(self, row: Dict, now: float) -> None:
+        if self.writer is None:
+            self._open(now)
+        self.writer.write(row)
+        self.rows += 1
+        if (self.rotate_size and self.writer.size >= self.rotate_size or
+                self.rotate_interval and
+                now - self.opened_at >= self.rotate_interval):
+            self.rotate()
+
+    def rotate(self) -> None:
+        """Complete the current file, next rows go into a new file."""
+        if self.writer is None:
+            return
+        self.writer.close()
+        self.bytes += os.path.getsize(self.writer.path)
+        self.files.append(self.writer.path)
+        self.writer = None
+
+    def close(self) -> None:
+        self.rotate()
+
+    def _open(self, now: float) -> None:
+        if not os.path.exists(self.directory):
+            os.makedirs(self.directory)
+        path = os.path.join(self.directory, '{}-{:04d}{}'.format(
+            self.prefix, len(self.files) + 1, self.suffix
+        ))
+        self.writer = self.create_writer(path)
+        self.opened_at = now
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError('{!r} is not JSON serializable'.format(value))
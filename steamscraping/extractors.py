@@ -0,0 +1,61 @@
+# -*- coding: utf-8 -*-
+"""Extraction of game fields by precompiled selectors."""
+
+from typing import Dict, Iterable, List, Union
+
+from lxml import etree
+from parsel.csstranslator import HTMLTranslator
+
+
+class SelectorsExtractor:
+    """Extractor of fields by CSS selectors.
+
+    Selectors are translated into XPath and compiled once, not on every
+    add_css call. They are evaluated inside the root element (if it is
+    found), not over the whole document.
+    """
+    def __init__(self, selectors: Dict[str, str],
+                 root_css: Union[str, None] = None):
+        translator = HTMLTranslator()
+        self.xpaths = {
+            field: etree.XPath(translator.css_to_xpath(css),
+                               smart_strings=False)
+            for field, css in selectors.items()
+        }
+        self.root_xpath = None
+        if root_css is not None:
+            self.root_xpath = etree.XPath(translator.css_to_xpath(root_css))
+
+    def extract(self, response,
+                fields: Union[Iterable[str], None] = None
+                ) -> Dict[str, List[str]]:
+        """Get values of fields from the response.
+
+        Values are the same as add_css of item loader gets: strings
+        for text and attributes, html for elements.
+
+        :param response: html response
+        :param fields: fields to extract (all by default)
+
+        :return: values of every field
+        """
+        root = self._find_root(response.selector.root)
+        if fields is None:
+            fields = self.xpaths.keys()
+        return {field: [self._to_string(value)
+                        for value in self.xpaths[field](root)]
+                for field in fields}
+
+    def _find_root(self, document):
+        if self.root_xpath is not None:
+            roots = self.root_xpath(document)
+            if roots:
+                return roots[0]
+        return document
+
+    @staticmethod
+    def _to_string(value) -> str:
+        if isinstance(value, str):
+            return value
+        return etree.tostring(value, method='html', encoding='unicode',
+                              with_tail=False)
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+"""Compressed on-disk storage for HttpCacheMiddleware."""
+
+import gzip
+import hashlib
+import logging
+import os
+import pickle
+from time import time
+
+from scrapy.extensions.httpcache import RFC2616Policy
+from scrapy.http import Headers
+from scrapy.responsetypes import responsetypes
+from scrapy.utils.project import data_path
+from w3lib.http import headers_dict_to_raw, headers_raw_to_dict
+from w3lib.url import canonicalize_url
+
+from steamscraping.urls import canonical_url
+
+logger = logging.getLogger(__name__)
+
+
+def cache_key(request) -> str:
+    """Get key of the request in the cache.
+
+    Urls are identified by hash of canonical url without snr parameter.
+    Slug of the game and other parameters (l, cc) are kept, so pages of
+    other languages and regions don't replace each other and cached
+    redirect of /app/<id>/ is not served for its target.
+    """
+    url = canonicalize_url(canonical_url(request.url))
+    data = '{} {}'.format(request.method, url).encode('utf-8')
+    return hashlib.sha1(data).hexdigest()
+
+
+class RevalidatingPolicy(RFC2616Policy):
+    """RFC2616 policy, that revalidates no-cache responses.
+
+    RFC2616Policy refetches responses with no-cache completely, but no-cache
+    means only that response must be revalidated before using, so such
+    responses are requested with conditional validators too.
+    """
+    def is_cached_response_fresh(self, cachedresponse, request):
+        if b'no-cache' in self._parse_cachecontrol(cachedresponse):
+            self._set_conditional_validators(request, cachedresponse)
+            return False
+        return super().is_cached_response_fresh(cachedresponse, request)
+
+
+class CompressedCacheStorage(object):
+    """Cache storage, that keeps every response in one gzip file.
+
+    Entries, which were not used during HTTPCACHE_MAX_AGE seconds, are
+    removed on spider opening. If total size of the cache exceeds
+    HTTPCACHE_MAX_SIZE bytes, the least recently used entries are removed.
+    Entries are not expired by storage, validation of cached responses
+    is made by cache policy.
+    """
+    EXTENSION = '.pickle.gz'
+
+    def __init__(self, settings):
+        self.cachedir = data_path(settings['HTTPCACHE_DIR'])
+        self.max_age = settings.getint('HTTPCACHE_MAX_AGE', 0)
+        self.max_size = settings.getint('HTTPCACHE_MAX_SIZE', 0)
+        self.compresslevel = settings.getint('HTTPCACHE_GZIP_LEVEL', 6)
+        self.stats = None
+        self.spider_dir = None
+        # sizes of entries by path and their total size
+        self._sizes = {}
+        self._total_size = 0
+
+    def open_spider(self, spider):
+        self.stats = spider.crawler.stats
+        self.spider_dir = os.path.join(self.cachedir, spider.name)
+        os.makedirs(self.spider_dir, exist_ok=True)
+        logger.debug("Using compressed cache storage in %s", self.spider_dir)
+
+        now = time()
+        for directory, _, filenames in os.walk(self.spider_dir):
+            for filename in filenames:
+                if not filename.endswith(self.EXTENSION):
+                    continue
+                path = os.path.join(directory, filename)
+                stat = os.stat(path)
+                if 0 < self.max_age < now - stat.st_mtime:
+                    self._remove(path)
+                    self._inc_stats('httpcache/evicted')
+                    continue
+                self._add_size(path, stat.st_size)
+        self._evict_by_size()
+
+    def close_spider(self, spider):
+        pass
+
+    def retrieve_response(self, spider, request):
+        """Return response if present in cache, or None otherwise."""
+        path = self._get_path(request)
+        try:
+            with gzip.open(path, 'rb') as file:
+                data = pickle.load(file)
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError, pickle.UnpicklingError) as e:
+            logger.warning("Broken cache entry %s: %s", path, e)
+            self._remove(path)
+            return None
+
+        # entry is used, so it is not evicted by age
+        os.utime(path, None)
+
+        headers = Headers(headers_raw_to_dict(data['headers']))
+        response_class = responsetypes.from_args(headers=headers,
+                                                 url=data['url'],
+                                                 body=data['body'])
+        return response_class(url=data['url'], headers=headers,
+                              status=data['status'], body=data['body'])
+
+    def store_response(self, spider, request, response):
+        """Store the given response in the cache."""
+        path = self._get_path(request)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = {
+            'url': response.url,
+            'status': response.status,
+            'headers': headers_dict_to_raw(response.headers),
+            'body': response.body,
+            'timestamp': time(),
+        }
+        # write into temporary file, so readers never see partial entry
+        temp_path = path + '.tmp'
+        with gzip.open(temp_path, 'wb',
+                       compresslevel=self.compresslevel) as file:
+            pickle.dump(data, file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+
+        self._add_size(path, os.path.getsize(path))
+        self._evict_by_size()
+
+    def _get_path(self, request) -> str:
+        key = cache_key(request)
+        return os.path.join(self.spider_dir, key[-2:], key + self.EXTENSION)
+
+    def _add_size(self, path: str, size: int) -> None:
+        self._total_size += size - self._sizes.get(path, 0)
+        self._sizes[path] = size
+
+    def _remove(self, path: str) -> None:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+        self._total_size -= self._sizes.pop(path, 0)
+
+    def _evict_by_size(self) -> None:
+        """Remove the least recently used entries until cache fits size."""
+        if self.max_size <= 0 or self._total_size <= self.max_size:
+            return
+        entries = []
+        for path in self._sizes:
+            try:
+                entries.append((os.path.getmtime(path), path))
+            except FileNotFoundError:
+                entries.append((0, path))
+        entries.sort()
+        # free some space at once, not to scan the cache on every store
+        target_size = self.max_size * 0.9
+        for _, path in entries:
+            if self._total_size <= target_size:
+                break
+            self._remove(path)
+            self._inc_stats('httpcache/evicted')
+
+    def _inc_stats(self, key: str) -> None:
+        if self.stats is not None:
+            self.stats.inc_value(key)
@@ -6,13 +6,15 @@
 # https://doc.scrapy.org/en/latest/topics/items.html
 
 import re
-from typing import Union, List, Tuple
+from typing import Union, List, Dict
 from datetime import datetime
 
 import scrapy
-from scrapy.loader.processors import MapCompose, Compose, TakeFirst, Identity
+from itemloaders.processors import MapCompose, Compose, TakeFirst, Identity
 
-from steamscraping.settings import REVIEWS_TO_PASS, DAYS_EARLIER, LANGUAGE
+from steamscraping.dates import english_date_parser
+
+DEFAULT_LANGUAGE = 'english'
 
 
 class LanguageSelectError(ValueError):
@@ -23,6 +25,38 @@ class LanguageSelectError(ValueError):
         super().__init__(message)
 
 
+def item_settings(settings) -> Dict:
+    """Get settings used by item processors from crawler settings.
+
+    Processors get them in loader context, games are not filtered by
+    DAYS_EARLIER and REVIEWS_TO_PASS, if they are not in the context.
+
+    :param settings: crawler settings
+    """
+    context = {'LANGUAGE': settings.get('LANGUAGE') or DEFAULT_LANGUAGE}
+    for name in ('DAYS_EARLIER', 'REVIEWS_TO_PASS'):
+        if settings.get(name) is not None:
+            context[name] = settings.getint(name)
+    return context
+
+
+def get_date_parser(language: str):
+    """Get parser of release dates for the language.
+
+    :return: parser or None, if dates of the language are not parsed
+    """
+    if language == 'english':
+        return english_date_parser
+    elif language == 'russian':
+        # TODO: to implement
+        return None
+    raise LanguageSelectError()
+
+
+def _get_language(loader_context) -> str:
+    return (loader_context or {}).get('LANGUAGE') or DEFAULT_LANGUAGE
+
+
 class StrToInt:
     def __init__(self, default=None):
         self.default = default
@@ -41,46 +75,39 @@ class StrToInt:
 
 
 class StrToDate:
-    def __init__(self):
-        if LANGUAGE == 'english':
-            self.datetime_formats = (
-                '%d %b, %Y', '%b %Y', '%B %Y', '%B, %Y', '%Y'
-            )
-        elif LANGUAGE == 'russian':
-            # TODO: to implement
-            pass
-        else:
-            raise LanguageSelectError()
-        pass
+    """Processor for parsing release dates.
 
-    def __call__(self, date_str):
+    Parser is selected by LANGUAGE of loader context on every call, all
+    instances share one parser (with its cache) for the language.
+    Unparsed dates are counted in stats of loader context, if it is given.
+    """
+    def __call__(self, date_str, loader_context=None):
         """Get datetime instance from string if it is possible.
 
         :param date_str: string with date
 
         :return: datetime instance if it is possible (otherwise given string)
         """
-        for datetime_format in self.datetime_formats:
-            try:
-                return datetime.strptime(date_str, datetime_format)
-            except ValueError:
-                pass
-        # TODO: add logging for fixing this cases
-        print("-------------{}------------".format(date_str))
-        return date_str
+        parser = get_date_parser(_get_language(loader_context))
+        if parser is None:
+            return date_str
+        return parser(date_str, (loader_context or {}).get('stats'))
 
 
 class GameNumReviews:
     """Service methods for processing num of reviews."""
     @staticmethod
-    def filter_by_num_review(num_reviews: int) -> Union[int, None]:
+    def filter_by_num_review(num_reviews: int,
+                             loader_context=None) -> Union[int, None]:
         """Filter games, that have enough reviews.
 
         :param num_reviews: num of reviews
+        :param loader_context: context with REVIEWS_TO_PASS
 
         :return: num of reviews if it is enough, otherwise None
         """
-        if num_reviews >= REVIEWS_TO_PASS:
+        reviews_to_pass = (loader_context or {}).get('REVIEWS_TO_PASS')
+        if reviews_to_pass is None or num_reviews >= reviews_to_pass:
             return num_reviews
         else:
             return None
@@ -89,15 +116,17 @@ class GameNumReviews:
 class GameReleaseDate:
     """Service methods for processing game release date."""
     @staticmethod
-    def filter_by_date(release_date):
+    def filter_by_date(release_date, loader_context=None):
         """Filter games with relevant release date.
 
         :param release_date: release date
+        :param loader_context: context with DAYS_EARLIER
 
         :return: release date if it was filtered, otherwise None
         """
-        if (isinstance(release_date, datetime) and
-                (datetime.now() - release_date).days > DAYS_EARLIER):
+        days_earlier = (loader_context or {}).get('DAYS_EARLIER')
+        if (days_earlier is not None and isinstance(release_date, datetime)
+                and (datetime.now() - release_date).days > days_earlier):
             return None
         else:
             return release_date
@@ -110,129 +139,146 @@ class GameDescription:
         """Remove div tags around the description."""
         left_border = value.find('>')
         right_border = value.rfind('<')
-        return value[left_border + 1, right_border]
+        return value[left_border + 1: right_border]
+
+    @staticmethod
+    def remove_heading(value):
+        """Remove heading (About This Game) before the description."""
+        return re.sub(r'^\s*<h2[^>]*>.*?</h2>', '', value, count=1,
+                      flags=re.DOTALL)
+
+
+REQUIREMENTS_FIELDS = ('os', 'cpu', 'ram', 'gpu', 'directx', 'storage')
 
 
 class GameRequirements:
-    """Class for storing system requirements."""
-    def __init__(self, min_os, min_cpu, min_ram, min_gpu, rec_os, rec_cpu,
-                 rec_ram, rec_gpu):
-        self.min_os = min_os
-        self.min_cpu = min_cpu
-        self.min_ram = min_ram
-        self.min_gpu = min_gpu
-        self.rec_os = rec_os
-        self.rec_cpu = rec_cpu
-        self.rec_ram = rec_ram
-        self.rec_gpu = rec_gpu
-        # We can add new useful fields, such as below
-        # self.direct_x = direct_x
+    """Class for storing system requirements.
+
+    It is not a tuple, because item loader would split tuple into values.
+    """
+    __slots__ = tuple(['min_' + field for field in REQUIREMENTS_FIELDS] +
+                      ['rec_' + field for field in REQUIREMENTS_FIELDS])
+
+    def __init__(self, **requirements):
+        for field in self.__slots__:
+            setattr(self, field, requirements.get(field))
+
+    @classmethod
+    def from_values(cls, values: List[Union[str, None]]):
+        """Create requirements from values in order of fields."""
+        requirements = cls.__new__(cls)
+        # unpacking is several times faster than setattr in loop
+        (requirements.min_os, requirements.min_cpu, requirements.min_ram,
+         requirements.min_gpu, requirements.min_directx,
+         requirements.min_storage,
+         requirements.rec_os, requirements.rec_cpu, requirements.rec_ram,
+         requirements.rec_gpu, requirements.rec_directx,
+         requirements.rec_storage) = values
+        return requirements
+
+    def as_dict(self) -> Dict[str, Union[str, None]]:
+        return {field: getattr(self, field) for field in self.__slots__}
+
+    def __eq__(self, other):
+        if not isinstance(other, GameRequirements):
+            return NotImplemented
+        return self.as_dict() == other.as_dict()
+
+    def __repr__(self):
+        return '{}({})'.format(
+            self.__class__.__name__,
+            ', '.join('{}={!r}'.format(field, value)
+                      for field, value in self.as_dict().items()
+                      if value is not None)
+        )
 
 
 class GameRequirementsBuilder:
     """Class for building object for storing system requirements.
 
-    We can pass additional parameters for building
+    Labels are selected by LANGUAGE of loader context, they are built
+    on the first use of the language.
     """
+    # markers of sections in labels map
+    MIN_SECTION = -1
+    REC_SECTION = -2
+
     def __init__(self):
-        if LANGUAGE == 'english':
-            self.MIN_LABEL = 'Minimum:'
-            self.REC_LABEL = 'Recommended:'
-            self.OS_LABEL = 'OS:'
-            self.CPU_LABEL = 'Processor:'
-            self.GPU_LABEL = 'Graphics:'
-            self.RAM_LABEL = 'Memory:'
-        elif LANGUAGE == 'russian':
+        # language -> labels map
+        self._labels = {}  # type: Dict[str, Dict[str, int]]
+
+    def get_labels(self, language: str) -> Dict[str, int]:
+        """Get map of scraped label (OS:, OS *:) to index of the field
+        in minimum section or to the section marker."""
+        labels = self._labels.get(language)
+        if labels is None:
+            labels = self._labels[language] = self._build_labels(language)
+        return labels
+
+    def _build_labels(self, language: str) -> Dict[str, int]:
+        if language == 'english':
+            min_label = 'Minimum'
+            rec_label = 'Recommended'
+            # labels (without colon) and requirements fields
+            labels = {'OS': 'os',
+                      'Processor': 'cpu',
+                      'Memory': 'ram',
+                      'Graphics': 'gpu',
+                      'DirectX': 'directx',
+                      'Storage': 'storage',
+                      'Hard Drive': 'storage',
+                      'Hard Disk Space': 'storage'}
+        elif language == 'russian':
             # TODO: to implement
-            pass
+            min_label = rec_label = None
+            labels = {}
         else:
             raise LanguageSelectError()
 
-    def __call__(self, data_from_scraper: List[str]) -> GameRequirements:
+        result = {}
+        for label, field in labels.items():
+            for suffix in (':', ' *:'):
+                result[label + suffix] = REQUIREMENTS_FIELDS.index(field)
+        if min_label is not None:
+            result[min_label + ':'] = self.MIN_SECTION
+            result[rec_label + ':'] = self.REC_SECTION
+        return result
+
+    def __call__(self, data_from_scraper: List[str],
+                 loader_context=None) -> GameRequirements:
         """Building GameRequirements object.
 
+        Requirements are collected in one pass: the first not empty string
+        after label is the value of requirement. Labels before "Recommended:"
+        are minimum requirements (even if there is no "Minimum:" label).
+
         :param data_from_scraper: data collected by scraper
+        :param loader_context: context with LANGUAGE
 
         :return: GameRequirements instance
         """
-        # remove white spaces from collected data
-        self._remove_white_spaces(data_from_scraper)
-
-        # split requirements into minimum and recommended requirements
-        min_req_list, rec_req_list = self._split_requirements(
-            data_from_scraper
-        )
-
-        # get operating system
-        min_os = self._get_requirement(min_req_list, self.OS_LABEL)
-        rec_os = self._get_requirement(rec_req_list, self.OS_LABEL)
-
-        # get processor
-        min_cpu = self._get_requirement(min_req_list, self.CPU_LABEL)
-        rec_cpu = self._get_requirement(rec_req_list, self.CPU_LABEL)
-
-        # get graphics card
-        min_gpu = self._get_requirement(min_req_list, self.GPU_LABEL)
-        rec_gpu = self._get_requirement(rec_req_list, self.GPU_LABEL)
-
-        # get ram
-        min_ram = self._get_requirement(min_req_list, self.RAM_LABEL)
-        rec_ram = self._get_requirement(rec_req_list, self.RAM_LABEL)
-
-        # create GameRequirements object and return it
-        return GameRequirements(min_os, min_cpu, min_ram, min_gpu,
-                                rec_os, rec_cpu, rec_ram, rec_gpu)
-
-    @staticmethod
-    def _remove_white_spaces(data_from_scraper: List[str]) -> None:
-        """Remove redundant white spaces (\r, \n, \t)."""
-        data_from_scraper = list(map(lambda x: x.strip(), data_from_scraper))
-        data_from_scraper.remove('')
-
-    def _split_requirements(
-            self, data_from_scraper: List[str]
-    ) -> Tuple[List[str], List[str]]:
-        """Find sublists contains minimum and recommended system requirements.
-
-        :param data_from_scraper: scraped data
-
-        :return: two sublists
-        """
-        min_index_start = 0
-        rec_index_start = len(data_from_scraper)
-        try:
-            min_index_start = data_from_scraper.index(self.MIN_LABEL)
-        except ValueError:
-            # TODO: add logging for storing errors
-            pass
-        try:
-            rec_index_start = data_from_scraper.index(self.REC_LABEL)
-        except ValueError:
-            pass
-        min_req_list = data_from_scraper[min_index_start: rec_index_start]
-        rec_req_list = data_from_scraper[:rec_index_start]
-        return min_req_list, rec_req_list
-
-    @staticmethod
-    def _get_requirement(
-            requirements_list: List[str], label: str
-    ) -> Union[str, None]:
-        """Get from system requirements list the element by label.
-
-        :param requirements_list: list with requirements
-        :param label: обозначение для требования, которое нужно достать
-        :param label: label for requirement to get
-
-        :return: found string or None
-        """
-        if not requirements_list:
-            return None
-        try:
-            cpu_label_index = requirements_list.index(label)
-            return requirements_list[cpu_label_index + 1]
-        except (ValueError, IndexError):
-            # TODO: to add logging
-            return None
+        labels = self.get_labels(_get_language(loader_context))
+        values = [None] * len(GameRequirements.__slots__)
+        # offset of current section in values
+        offset = 0
+        index = None
+        for value in map(str.strip, data_from_scraper):
+            if not value:
+                continue
+            label_index = labels.get(value)
+            if label_index is None:
+                if index is not None:
+                    if values[index] is None:
+                        values[index] = value
+                    index = None
+            elif label_index == self.MIN_SECTION:
+                offset, index = 0, None
+            elif label_index == self.REC_SECTION:
+                offset, index = len(REQUIREMENTS_FIELDS), None
+            else:
+                index = offset + label_index
+
+        return GameRequirements.from_values(values)
 
 
 class Game(scrapy.Item):
@@ -241,36 +287,47 @@ class Game(scrapy.Item):
     title = scrapy.Field()
     description = scrapy.Field(
         output_processor=Compose(
+            TakeFirst(),
             GameDescription.remove_divs,
+            GameDescription.remove_heading,
             lambda x: x.strip()
         )
     )
     num_reviews = scrapy.Field(
         input_processor=Compose(
             MapCompose(
-                lambda x: re.search(r'\((.*?)\)', x).group(0),
+                lambda x: re.search(r'\((.*?)\)', x).group(1),
+                lambda x: x.replace(',', ''),
                 StrToInt(0)
             ),
             max
         ),
-        output_processor=GameNumReviews.filter_by_num_review
+        output_processor=Compose(
+            TakeFirst(),
+            GameNumReviews.filter_by_num_review
+        )
     )
     release_date = scrapy.Field(
         input_processor=Compose(
             TakeFirst(),
             StrToDate()
         ),
-        output_processor=GameReleaseDate.filter_by_date
+        output_processor=Compose(
+            TakeFirst(),
+            GameReleaseDate.filter_by_date
+        )
     )
     specs = scrapy.Field(
         input_processor=MapCompose(
             lambda x: x.strip()
-        )
+        ),
+        output_processor=Identity()
     )
     tags = scrapy.Field(
         input_processor=MapCompose(
             lambda x: x.strip()
-        )
+        ),
+        output_processor=Identity()
     )
     price = scrapy.Field(
         input_processor=Compose(
@@ -285,3 +342,21 @@ class Game(scrapy.Item):
 
     # developer = scrapy.Field()
     # pictures = scrapy.Filed()
+
+
+class GameDiff(scrapy.Item):
+    """Changed fields of the game, which ChangesPipeline passes instead
+    of the whole game. Values of removed fields are None."""
+    game_id = scrapy.Field()
+    changed = scrapy.Field()
+
+
+class RawGame(scrapy.Item):
+    """Downloaded game page, which is parsed into Game by ParsePoolPipeline
+    in other process."""
+    url = scrapy.Field()
+    body = scrapy.Field()
+    encoding = scrapy.Field()
+    game_id = scrapy.Field()
+    # values collected from appdetails for this game
+    game_values = scrapy.Field()
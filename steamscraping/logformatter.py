@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+import logging
+
+from scrapy.logformatter import LogFormatter
+
+from steamscraping.changes import UnchangedGame
+
+
+class SteamLogFormatter(LogFormatter):
+    """Log formatter, which logs unchanged games at debug level.
+
+    Most of games are unchanged in every crawl, they are counted in stats
+    instead of warnings.
+    """
+    def dropped(self, item, exception, response, spider):
+        result = super().dropped(item, exception, response, spider)
+        if isinstance(exception, UnchangedGame):
+            result['level'] = logging.DEBUG
+        return result
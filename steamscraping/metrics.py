@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+"""Low-overhead metrics of the crawl and their export."""
+
+import logging
+import os
+from bisect import bisect_left
+from collections import OrderedDict
+from typing import Iterable, List, Tuple, Union
+
+from scrapy import signals
+from scrapy.exceptions import NotConfigured
+from twisted.internet import reactor
+from twisted.internet.task import LoopingCall
+from twisted.web import resource, server
+
+logger = logging.getLogger(__name__)
+
+PREFIX = 'steamscraping_'
+
+# 1 us .. ~67 sec
+SECONDS_BUCKETS = tuple(0.000001 * 2 ** i for i in range(27))
+# 1 KiB .. 32 MiB
+BYTES_BUCKETS = tuple(1024 * 2 ** i for i in range(16))
+# 1 .. 65536
+COUNT_BUCKETS = tuple(float(2 ** i) for i in range(17))
+
+
+class Histogram:
+    """Histogram with fixed buckets.
+
+    Observation is one binary search and a few additions, values
+    themselves are not stored.
+    """
+    __slots__ = ('buckets', 'counts', 'count', 'sum', 'max')
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self.buckets = buckets
+        # the last count is for values above the last bucket
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if value > self.max:
+            self.max = value
+
+    def quantile(self, q: float) -> float:
+        """Get upper bound of the bucket with given quantile."""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            if total >= rank:
+                return min(bound, self.max)
+        return self.max
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else 0.0
+
+
+class Metrics:
+    """Registry of histograms and gauges of the crawl."""
+
+    def __init__(self):
+        self.histograms = OrderedDict()
+        self.gauges = OrderedDict()
+
+    def histogram(self, name: str,
+                  buckets: Tuple[float, ...] = SECONDS_BUCKETS,
+                  **labels) -> Histogram:
+        """Get histogram by name and labels, it is created on first use."""
+        key = (name, tuple(sorted(labels.items())))
+        histogram = self.histograms.get(key)
+        if histogram is None:
+            histogram = self.histograms[key] = Histogram(buckets)
+        return histogram
+
+    def observe(self, name: str, value: float,
+                buckets: Tuple[float, ...] = SECONDS_BUCKETS,
+                **labels) -> None:
+        self.histogram(name, buckets, **labels).observe(value)
+
+    def set_gauge(self, name: str, value: float, **labels) -> None:
+        self.gauges[(name, tuple(sorted(labels.items())))] = value
+
+    def to_prometheus(self) -> str:
+        """Get all metrics in prometheus text format."""
+        lines = []
+        for name, series in _group(self.gauges.items()):
+            lines.append('# TYPE {}{} gauge'.format(PREFIX, name))
+            for labels, value in series:
+                lines.append('{}{}{} {}'.format(PREFIX, name,
+                                                _labels(labels), value))
+        for name, series in _group(self.histograms.items()):
+            lines.append('# TYPE {}{} histogram'.format(PREFIX, name))
+            for labels, histogram in series:
+                total = 0
+                for bound, count in zip(histogram.buckets, histogram.counts):
+                    total += count
+                    lines.append('{}{}_bucket{} {}'.format(
+                        PREFIX, name,
+                        _labels(labels + (('le', repr(bound)),)), total
+                    ))
+                lines.append('{}{}_bucket{} {}'.format(
+                    PREFIX, name, _labels(labels + (('le', '+Inf'),)),
+                    histogram.count
+                ))
+                lines.append('{}{}_sum{} {}'.format(
+                    PREFIX, name, _labels(labels), histogram.sum
+                ))
+                lines.append('{}{}_count{} {}'.format(
+                    PREFIX, name, _labels(labels), histogram.count
+                ))
+        return '\n'.join(lines) + '\n'
+
+    def summary(self) -> List[str]:
+        """Get lines with short summary of every histogram."""
+        lines = []
+        for (name, labels), histogram in self.histograms.items():
+            lines.append(
+                '{}{}: count={} mean={:.4g} p50={:.4g} p95={:.4g} '
+                'max={:.4g}'.format(name, _labels(labels), histogram.count,
+                                    histogram.mean, histogram.quantile(0.5),
+                                    histogram.quantile(0.95), histogram.max)
+            )
+        return lines
+
+
+def _group(items: Iterable) -> Iterable[Tuple[str, List]]:
+    groups = OrderedDict()
+    for (name, labels), value in items:
+        groups.setdefault(name, []).append((labels, value))
+    return groups.items()
+
+
+def _labels(labels: Tuple[Tuple[str, str], ...]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(
+        '{}="{}"'.format(key, str(value).replace('"', '\\"'))
+        for key, value in labels
+    ) + '}'
+
+
+def get_metrics(crawler) -> Union[Metrics, None]:
+    """Get metrics of the crawler (None if metrics are disabled).
+
+    All middlewares, extensions and the spider of the crawler share one
+    registry.
+    """
+    if not crawler.settings.getbool('METRICS_ENABLED'):
+        return None
+    metrics = getattr(crawler, 'metrics', None)
+    if metrics is None:
+        metrics = crawler.metrics = Metrics()
+    return metrics
+
+
+class MetricsExporter:
+    """Extension, that samples crawl gauges and exports metrics.
+
+    Queue depth and number of requests in flight are sampled every
+    METRICS_SAMPLE_INTERVAL seconds. All metrics are written into
+    METRICS_EXPORT_FILE every METRICS_EXPORT_INTERVAL seconds and/or served
+    on METRICS_EXPORT_PORT in prometheus text format. Summary is logged
+    when spider is closed.
+    """
+    def __init__(self, crawler, metrics: Metrics, sample_interval: float,
+                 export_interval: float, export_file: Union[str, None],
+                 export_port: Union[int, None]):
+        self.crawler = crawler
+        self.metrics = metrics
+        self.sample_interval = sample_interval
+        self.export_interval = export_interval
+        self.export_file = export_file
+        self.export_port = export_port
+        self._sample_task = None
+        self._export_task = None
+        self._listening_port = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        metrics = get_metrics(crawler)
+        if metrics is None:
+            raise NotConfigured
+        settings = crawler.settings
+        exporter = cls(
+            crawler, metrics,
+            sample_interval=settings.getfloat('METRICS_SAMPLE_INTERVAL', 1),
+            export_interval=settings.getfloat('METRICS_EXPORT_INTERVAL', 15),
+            export_file=settings.get('METRICS_EXPORT_FILE'),
+            export_port=settings.getint('METRICS_EXPORT_PORT') or None
+        )
+        crawler.signals.connect(exporter.spider_opened,
+                                signal=signals.spider_opened)
+        crawler.signals.connect(exporter.spider_closed,
+                                signal=signals.spider_closed)
+        return exporter
+
+    def spider_opened(self, spider):
+        self._sample_task = LoopingCall(self.sample)
+        self._sample_task.start(self.sample_interval, now=False)
+        if self.export_file:
+            self._export_task = LoopingCall(self.export)
+            self._export_task.start(self.export_interval, now=False)
+        if self.export_port:
+            self._listening_port = reactor.listenTCP(
+                self.export_port, server.Site(MetricsResource(self.metrics)),
+                interface='127.0.0.1'
+            )
+            logger.info("Metrics are served on http://127.0.0.1:%d/",
+                        self.export_port)
+
+    def spider_closed(self, spider, reason):
+        for looping_call in (self._sample_task, self._export_task):
+            if looping_call is not None and looping_call.running:
+                looping_call.stop()
+        self.export()
+        if self._listening_port is not None:
+            self._listening_port.stopListening()
+        logger.info("Metrics summary:\n%s", '\n'.join(self.metrics.summary()))
+
+    def sample(self):
+        """Sample gauges of the engine."""
+        engine = self.crawler.engine
+        slot = getattr(engine, 'slot', None)
+        if slot is None:
+            return
+        queue_depth = len(slot.scheduler)
+        in_flight = len(engine.downloader.active)
+        self.metrics.set_gauge('queue_depth', queue_depth)
+        self.metrics.set_gauge('requests_in_flight', in_flight)
+        self.metrics.observe('queue_depth_samples', queue_depth,
+                             buckets=COUNT_BUCKETS)
+        self.metrics.observe('requests_in_flight_samples', in_flight,
+                             buckets=COUNT_BUCKETS)
+
+    def export(self):
+        """Write metrics into export file atomically."""
+        if not self.export_file:
+            return
+        temp_path = self.export_file + '.tmp'
+        with open(temp_path, 'w') as file:
+            file.write(self.metrics.to_prometheus())
+        os.replace(temp_path, self.export_file)
+
+
+class MetricsResource(resource.Resource):
+    """Page with current metrics for prometheus scraping."""
+    isLeaf = True
+
+    def __init__(self, metrics: Metrics):
+        super().__init__()
+        self.metrics = metrics
+
+    def render_GET(self, request):
+        request.setHeader('Content-Type', 'text/plain; version=0.0.4')
+        return self.metrics.to_prometheus().encode('utf-8')
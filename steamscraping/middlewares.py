@@ -5,116 +5,330 @@
 # See documentation in:
 # https://doc.scrapy.org/en/latest/topics/spider-middleware.html
 
+import logging
 import re
+from time import perf_counter
+from typing import Dict, Iterable, List, Tuple, Union
 
-from w3lib.url import url_query_cleaner
 from scrapy.dupefilters import RFPDupeFilter
-from scrapy.http import Request
-from scrapy import signals
+from scrapy.exceptions import IgnoreRequest, NotConfigured
+from scrapy.http import HtmlResponse, Request
 from scrapy.downloadermiddlewares.redirect import RedirectMiddleware
+from scrapy.utils.httpobj import urlparse_cached
+
+from steamscraping.items import item_settings
+from steamscraping.metrics import BYTES_BUCKETS, get_metrics
+from steamscraping.urls import canonical_url, search_page_from_url
+
+logger = logging.getLogger(__name__)
 
 
 class SteamscrapingSpiderMiddleware(object):
-    # Not all methods need to be defined. If a method is not defined,
-    # scrapy acts as if the spider middleware does not modify the
-    # passed objects.
+    """Spider middleware, that measures time of spider callbacks.
+
+    Callbacks are generators, so time is spent in them, while their output
+    is iterated. Only time of getting next result is measured, not time
+    of processing of results by the engine.
+    """
+    def __init__(self, metrics):
+        self.metrics = metrics
 
     @classmethod
     def from_crawler(cls, crawler):
-        # This method is used by Scrapy to create your spiders.
-        s = cls()
-        crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
-        return s
+        metrics = get_metrics(crawler)
+        if metrics is None:
+            raise NotConfigured
+        return cls(metrics)
 
-    def process_spider_input(self, response, spider):
-        # Called for each response that goes through the spider
-        # middleware and into the spider.
+    def process_spider_output(self, response, result, spider):
+        histogram = self._get_histogram(response, spider)
+        elapsed = 0.0
+        iterator = iter(result)
+        while True:
+            start = perf_counter()
+            try:
+                value = next(iterator)
+            except StopIteration:
+                elapsed += perf_counter() - start
+                break
+            elapsed += perf_counter() - start
+            yield value
+        histogram.observe(elapsed)
 
-        # Should return None or raise an exception.
-        return None
+    async def process_spider_output_async(self, response, result, spider):
+        # scrapy 2.7+ calls it for asynchronous callbacks
+        histogram = self._get_histogram(response, spider)
+        elapsed = 0.0
+        iterator = result.__aiter__()
+        while True:
+            start = perf_counter()
+            try:
+                value = await iterator.__anext__()
+            except StopAsyncIteration:
+                elapsed += perf_counter() - start
+                break
+            elapsed += perf_counter() - start
+            yield value
+        histogram.observe(elapsed)
 
-    def process_spider_output(self, response, result, spider):
-        # Called with the results returned from the Spider, after
-        # it has processed the response.
+    def _get_histogram(self, response, spider):
+        callback = response.request.callback
+        # callbacks of CrawlSpider rules are called through the spider
+        rule = response.meta.get('rule')
+        if rule is not None and hasattr(spider, '_rules'):
+            callback = spider._rules[rule].callback
+        return self.metrics.histogram(
+            'callback_seconds',
+            callback=getattr(callback, '__name__', 'parse')
+        )
 
-        # Must return an iterable of Request, dict or Item objects.
-        for i in result:
-            yield i
 
-    def process_spider_exception(self, response, exception, spider):
-        # Called when a spider or process_spider_input() method
-        # (from other spider middleware) raises an exception.
+class SteamscrapingDownloaderMiddleware(object):
+    """Downloader middleware, that measures downloads by hosts.
 
-        # Should return either None or an iterable of Response, dict
-        # or Item objects.
-        pass
+    Download latency (measured by downloader) and response sizes are
+    recorded, responses from http cache are only counted.
+    """
+    def __init__(self, metrics):
+        self.metrics = metrics
 
-    def process_start_requests(self, start_requests, spider):
-        # Called with the start requests of the spider, and works
-        # similarly to the process_spider_output() method, except
-        # that it doesn’t have a response associated.
+    @classmethod
+    def from_crawler(cls, crawler):
+        metrics = get_metrics(crawler)
+        if metrics is None:
+            raise NotConfigured
+        return cls(metrics)
 
-        # Must return only requests (not items).
-        for r in start_requests:
-            yield r
+    def process_response(self, request, response, spider):
+        host = urlparse_cached(request).hostname
+        if 'cached' in response.flags:
+            self.metrics.observe('cached_response_bytes', len(response.body),
+                                 BYTES_BUCKETS, host=host)
+            return response
+        latency = request.meta.get('download_latency')
+        if latency is not None:
+            self.metrics.observe('download_latency_seconds', latency,
+                                 host=host)
+        self.metrics.observe('response_bytes', len(response.body),
+                             BYTES_BUCKETS, host=host,
+                             status=response.status)
+        return response
 
-    def spider_opened(self, spider):
-        spider.logger.info('Spider opened: %s' % spider.name)
 
+class SteamDupeFilter(RFPDupeFilter):
+    """
+    Специальный класс, в котором учимся обнаруживать дупликаты страниц
+    вне зависимости от параметра snr в get-запросе
+    """
+    def request_fingerprint(self, request):
+        request = request.replace(url=canonical_url(request.url))
+        return super().request_fingerprint(request)
 
-class SteamscrapingDownloaderMiddleware(object):
-    # Not all methods need to be defined. If a method is not defined,
-    # scrapy acts as if the downloader middleware does not modify the
-    # passed objects.
+
+class SearchCutoffMiddleware(object):
+    """Drop scheduled search pages after the cutoff page of the spider.
+
+    Spider sets cutoff_page, when it finds search page with too old games.
+    Pages after it were possibly scheduled earlier, they are dropped here
+    before downloading.
+    """
+    def __init__(self, stats):
+        self.stats = stats
 
     @classmethod
     def from_crawler(cls, crawler):
-        # This method is used by Scrapy to create your spiders.
-        s = cls()
-        crawler.signals.connect(s.spider_opened, signal=signals.spider_opened)
-        return s
+        return cls(crawler.stats)
 
     def process_request(self, request, spider):
-        # Called for each request that goes through the downloader
-        # middleware.
-
-        # Must either:
-        # - return None: continue processing this request
-        # - or return a Response object
-        # - or return a Request object
-        # - or raise IgnoreRequest: process_exception() methods of
-        #   installed downloader middleware will be called
+        cutoff_page = getattr(spider, 'cutoff_page', None)
+        if cutoff_page is None:
+            return None
+        page = search_page_from_url(request.url)
+        if page is not None and page > cutoff_page:
+            self.stats.inc_value('pagination/dropped', spider=spider)
+            raise IgnoreRequest("Search page {} is after cutoff page {}"
+                                .format(page, cutoff_page))
         return None
 
+
+class TrimResponseMiddleware(object):
+    """Remove heavy regions, which are not parsed, from game pages.
+
+    Scripts, styles and div elements with one of attributes of regions
+    (e.g. 'id="app_reviews_hash"') are cut out of bodies of /app/ pages
+    before they get to the spider, so smaller bodies and documents are
+    held, while pages are parsed. Regions must not contain elements of
+    spider selectors. Body, which is still larger than max_size, is
+    truncated. Other pages (search, appdetails, age check) are not changed.
+
+    Bodies are cut by regular expressions, not by html parser, so it is
+    cheap comparing to parsing of the page.
+    """
+    SCRIPT_RE = re.compile(rb'<(script|style)\b[^>]*>.*?</\1\s*>',
+                           re.DOTALL | re.IGNORECASE)
+    DIV_TAG_RE = re.compile(rb'<(/?)div\b[^>]*>', re.IGNORECASE)
+
+    def __init__(self, regions: Iterable[str], max_size: int = 0,
+                 stats=None):
+        self.region_res = [
+            re.compile(rb'<div\b[^>]*' + re.escape(region.encode()),
+                       re.IGNORECASE)
+            for region in regions
+        ]
+        self.max_size = max_size
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('TRIM_RESPONSE_ENABLED'):
+            raise NotConfigured
+        return cls(settings.getlist('TRIM_RESPONSE_REGIONS'),
+                   max_size=settings.getint('TRIM_RESPONSE_MAX_SIZE'),
+                   stats=crawler.stats)
+
     def process_response(self, request, response, spider):
-        # Called with the response returned from the downloader.
+        if response.status != 200 or \
+                not isinstance(response, HtmlResponse) or \
+                not urlparse_cached(response).path.startswith('/app/'):
+            return response
 
-        # Must either;
-        # - return a Response object
-        # - return a Request object
-        # - or raise IgnoreRequest
-        return response
+        body = self.trim(response.body)
+        if self.max_size and len(body) > self.max_size:
+            logger.warning("Game page %s is truncated to %d bytes "
+                           "(%d bytes after trimming)", response.url,
+                           self.max_size, len(body))
+            body = body[:self.max_size]
+            self._inc_stats('trim/truncated')
+        self._inc_stats('trim/responses')
+        self._inc_stats('trim/bytes_removed', len(response.body) - len(body))
+        return response.replace(body=body)
 
-    def process_exception(self, request, exception, spider):
-        # Called when a download handler or a process_request()
-        # (from other downloader middleware) raises an exception.
+    def trim(self, body: bytes) -> bytes:
+        """Get body without scripts, styles and regions."""
+        body = self.SCRIPT_RE.sub(b'', body)
+        spans = []  # type: List[Tuple[int, int]]
+        for region_re in self.region_res:
+            match = region_re.search(body)
+            if match is None:
+                continue
+            end = self._element_end(body, match.start())
+            if end is not None:
+                spans.append((match.start(), end))
+        if not spans:
+            return body
 
-        # Must either:
-        # - return None: continue processing this exception
-        # - return a Response object: stops process_exception() chain
-        # - return a Request object: stops process_exception() chain
-        pass
+        parts = []
+        position = 0
+        for start, end in sorted(spans):
+            # regions inside of already removed ones are skipped
+            if start >= position:
+                parts.append(body[position:start])
+                position = end
+        parts.append(body[position:])
+        return b''.join(parts)
 
-    def spider_opened(self, spider):
-        spider.logger.info('Spider opened: %s' % spider.name)
+    def _element_end(self, body: bytes, start: int) -> Union[int, None]:
+        """Get end of div element, which starts at start position."""
+        depth = 0
+        for match in self.DIV_TAG_RE.finditer(body, start):
+            depth += -1 if match.group(1) else 1
+            if depth == 0:
+                return match.end()
+        return None
 
+    def _inc_stats(self, key: str, count: int = 1) -> None:
+        if self.stats is not None:
+            self.stats.inc_value(key, count)
 
-class SteamDupeFilter(RFPDupeFilter):
-    """
-    Специальный класс, в котором учимся обнаруживать дупликаты страниц
-    вне зависимости от параметра snr в get-запросе
+
+class AgeCheckMiddleware(object):
+    """Set age check cookies once per cookie jar and recover game pages
+    redirected to age check.
+
+    Age gate, mature content and language (of LANGUAGE setting) cookies
+    are added to the first request of every cookie jar and host,
+    CookiesMiddleware keeps them in the jar for next requests. If the store
+    still redirects a game page to /agecheck/app/ (cookies were lost or
+    expired), the game page is requested again with the cookies instead
+    of following the redirect, at most max_retries times.
     """
-    def request_fingerprint(self, request):
-        url = url_query_cleaner(request.url, ['snr'], remove=True)
-        request = request.replace(url=url)
-        return super().request_fingerprint(request)
+    AGECHECK_PATH = b'/agecheck/app/'
+
+    def __init__(self, cookies: Dict[str, str], max_retries: int = 2,
+                 stats=None):
+        self.cookies = cookies
+        self.max_retries = max_retries
+        self.stats = stats
+        # (cookie jar, host) with cookies
+        self._seeded = set()
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('AGECHECK_ENABLED') or \
+                not settings.getbool('COOKIES_ENABLED'):
+            raise NotConfigured
+        # language of the crawl can be overridden (-s LANGUAGE=...)
+        cookies = dict(settings.getdict('AGECHECK_COOKIES'),
+                       Steam_language=item_settings(settings)['LANGUAGE'])
+        return cls(cookies,
+                   max_retries=settings.getint('AGECHECK_MAX_RETRIES'),
+                   stats=crawler.stats)
+
+    def process_request(self, request, spider):
+        if request.meta.get('dont_merge_cookies'):
+            return None
+        key = (request.meta.get('cookiejar'),
+               urlparse_cached(request).hostname)
+        if key not in self._seeded:
+            self._seeded.add(key)
+            self._add_cookies(request)
+            self._inc_stats('agecheck/seeded')
+        return None
+
+    def process_response(self, request, response, spider):
+        retries = request.meta.get('agecheck_retries', 0)
+        if response.status not in (301, 302, 303, 307, 308) or \
+                self.AGECHECK_PATH not in response.headers.get('Location',
+                                                               b''):
+            if retries:
+                self._inc_stats('agecheck/recovered')
+            return response
+
+        self._inc_stats('agecheck/redirects')
+        if retries >= self.max_retries:
+            self._inc_stats('agecheck/gave_up')
+            raise IgnoreRequest("Game page {} is redirected to age check "
+                                "after {} retries".format(request.url,
+                                                          retries))
+        # cookies in the jar are lost, they are set again
+        request = request.replace(
+            dont_filter=True,
+            meta=dict(request.meta, agecheck_retries=retries + 1)
+        )
+        self._add_cookies(request, override=True)
+        return request
+
+    def _add_cookies(self, request, override=False):
+        """Add age check cookies to cookies of the request.
+
+        They are set for all paths, not only for the path of the request.
+
+        :param override: replace cookies of the request with the same names
+        """
+        cookies = request.cookies
+        if isinstance(cookies, dict):
+            cookies = [{'name': name, 'value': value}
+                       for name, value in cookies.items()]
+        names = {cookie['name'] for cookie in cookies}
+        request.cookies = [
+            cookie for cookie in cookies
+            if not override or cookie['name'] not in self.cookies
+        ] + [{'name': name, 'value': value, 'path': '/'}
+             for name, value in self.cookies.items()
+             if override or name not in names]
+
+    def _inc_stats(self, key: str, count: int = 1) -> None:
+        if self.stats is not None:
+            self.stats.inc_value(key, count)
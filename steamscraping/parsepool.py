@@ -0,0 +1,34 @@
+# -*- coding: utf-8 -*-
+"""Parsing of game pages in worker processes of ParsePoolPipeline."""
+
+from typing import Dict
+
+from scrapy.http import HtmlResponse
+
+from steamscraping.extractors import SelectorsExtractor
+from steamscraping.spiders.game import load_game
+
+# extractor of the worker process, selectors are compiled once
+_extractor = None
+# loader context with item settings of the crawl
+_context = None
+
+
+def init_worker(selectors: Dict[str, str], root_css: str,
+                item_context: Dict) -> None:
+    """Prepare worker process for parsing of games.
+
+    :param item_context: values of settings used by item processors in the
+                         crawler process (spider.item_context)
+    """
+    global _extractor, _context
+    _context = item_context
+    _extractor = SelectorsExtractor(selectors, root_css=root_css)
+
+
+def parse_game_page(url: str, body: bytes, encoding: str, game_id: int,
+                    game_values: Dict) -> Dict:
+    """Parse game page into values of Game fields."""
+    response = HtmlResponse(url=url, body=body, encoding=encoding)
+    return dict(load_game(_extractor, response, game_id, game_values,
+                          context=_context))
@@ -5,7 +5,492 @@
 # Don't forget to add your pipeline to the ITEM_PIPELINES setting
 # See: https://doc.scrapy.org/en/latest/topics/item-pipeline.html
 
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import Future, ProcessPoolExecutor
+from functools import partial
+from typing import List, Dict
+
+from scrapy import signals
+from scrapy.exceptions import DropItem, NotConfigured
+from scrapy.utils.project import data_path
+from twisted.internet import defer, reactor
+from twisted.internet.task import LoopingCall
+from twisted.internet.threads import deferToThread, deferToThreadPool
+from twisted.python.threadpool import ThreadPool
+
+from steamscraping import exporters
+from steamscraping.catalog import CatalogIndex
+from steamscraping.changes import (FieldHashStore, UnchangedGame,
+                                   changed_fields, field_hashes)
+from steamscraping.db import (build_db_url, create_db_engine, diff_to_row,
+                              game_to_row, upsert_games)
+from steamscraping.exporters import WRITERS, RotatingExporter
+from steamscraping.items import Game, GameDiff, RawGame
+from steamscraping.parsepool import init_worker, parse_game_page
+from steamscraping.signals import StoredGames, games_stored
+from steamscraping.urls import canonical_url
+
+logger = logging.getLogger(__name__)
+
+
+class DatabasePipeline(object):
+    """Pipeline for storing games into database.
+
+    Games are buffered and written by multi-row upserts, when buffer is
+    full or flush interval is passed. Writes are performed in thread pool,
+    so they don't block the reactor. If too many batches are waiting
+    for database, items are held until some batch is written, that pauses
+    the crawl instead of growing the buffer. Rows of the failed batch are
+    written again one by one, so only bad rows are lost. Ids of written
+    games are sent by games_stored signal.
+    """
+    def __init__(self, db_url: str, batch_size: int = 500,
+                 flush_interval: float = 10, pool_size: int = 4,
+                 max_pending_batches: int = 8, stats=None,
+                 signal_manager=None):
+        self.db_url = db_url
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        # sqlite allows only one writer at a time
+        self.pool_size = 1 if db_url.startswith('sqlite') else pool_size
+        self.max_pending_batches = max_pending_batches
+        self.stats = stats
+        self.signal_manager = signal_manager
+
+        self.engine = None
+        self.threadpool = None
+        self._flush_loop = None
+        self._buffer = []  # type: List[Dict]
+        self._pending = set()
+        self._waiting = []  # type: List[defer.Deferred]
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        return cls(
+            db_url=build_db_url(settings),
+            batch_size=settings.getint('DB_BATCH_SIZE', 500),
+            flush_interval=settings.getfloat('DB_FLUSH_INTERVAL', 10),
+            pool_size=settings.getint('DB_POOL_SIZE', 4),
+            max_pending_batches=settings.getint('DB_MAX_PENDING_BATCHES', 8),
+            stats=crawler.stats,
+            signal_manager=crawler.signals
+        )
+
+    def open_spider(self, spider):
+        self.threadpool = ThreadPool(minthreads=1, maxthreads=self.pool_size,
+                                     name='DatabasePipeline')
+        self.threadpool.start()
+        if self.flush_interval > 0:
+            self._flush_loop = LoopingCall(self.flush)
+            self._flush_loop.start(self.flush_interval, now=False)
+
+        d = self._run_in_thread(create_db_engine, self.db_url,
+                                self.pool_size)
+        d.addCallback(self._set_engine)
+        return d
+
+    @defer.inlineCallbacks
+    def close_spider(self, spider):
+        if self._flush_loop is not None and self._flush_loop.running:
+            self._flush_loop.stop()
+        self.flush()
+        yield defer.DeferredList(list(self._pending))
+        if self.engine is not None:
+            yield self._run_in_thread(self.engine.dispose)
+        self.threadpool.stop()
+
+    def process_item(self, item, spider):
+        self._buffer.append(diff_to_row(item) if isinstance(item, GameDiff)
+                            else game_to_row(item))
+        if len(self._buffer) >= self.batch_size:
+            self.flush()
+
+        # backpressure: item is released only when database catches up
+        if len(self._pending) >= self.max_pending_batches:
+            self._inc_stats('db/backpressure')
+            d = defer.Deferred()
+            self._waiting.append(d)
+            d.addCallback(lambda _: item)
+            return d
+        return item
+
+    def flush(self) -> defer.Deferred:
+        """Write buffered games into database.
+
+        :return: deferred, that fires when the batch is written
+        """
+        if not self._buffer:
+            return defer.succeed(None)
+        rows, self._buffer = self._buffer, []
+
+        d = self._run_in_thread(self._write_rows, rows)
+        self._pending.add(d)
+        d.addCallback(lambda _: rows)
+        d.addErrback(self._retry_rows, rows)
+        d.addCallbacks(self._on_written, self._on_failed,
+                       callbackArgs=(rows,), errbackArgs=(rows,))
+        d.addBoth(self._on_finished, d)
+        return d
+
+    def _write_rows(self, rows: List[Dict]) -> None:
+        with self.engine.begin() as connection:
+            upsert_games(connection, rows)
+
+    def _write_each_row(self, rows: List[Dict]) -> List[Dict]:
+        """Write rows in separate transactions.
+
+        :return: written rows (failed rows are logged)
+        """
+        written = []
+        for row in rows:
+            try:
+                self._write_rows([row])
+            except Exception as e:
+                logger.error("Failed to store game %s: %s", row['game_id'], e)
+            else:
+                written.append(row)
+        return written
+
+    def _retry_rows(self, failure, rows: List[Dict]) -> defer.Deferred:
+        logger.warning("Failed to store batch of %d games, they are stored "
+                       "one by one: %s", len(rows), failure.getErrorMessage())
+        self._inc_stats('db/failed_batches')
+        return self._run_in_thread(self._write_each_row, rows)
+
+    def _run_in_thread(self, func, *args) -> defer.Deferred:
+        return deferToThreadPool(reactor, self.threadpool, func, *args)
+
+    def _set_engine(self, engine) -> None:
+        self.engine = engine
+
+    def _on_written(self, written: List[Dict], rows: List[Dict]) -> None:
+        self._inc_stats('db/batches')
+        self._inc_stats('db/rows', len(written))
+        if len(written) < len(rows):
+            self._inc_stats('db/failed_rows', len(rows) - len(written))
+        if self.signal_manager is not None:
+            self.signal_manager.send_catch_log(
+                games_stored, game_ids=[row['game_id'] for row in written]
+            )
+
+    def _on_failed(self, failure, rows: List[Dict]) -> None:
+        logger.error("Failed to store %d games: %s", len(rows),
+                     failure.getErrorMessage())
+        self._inc_stats('db/failed_rows', len(rows))
+
+    def _on_finished(self, _, d: defer.Deferred) -> None:
+        self._pending.discard(d)
+        while self._waiting and \
+                len(self._pending) < self.max_pending_batches:
+            self._waiting.pop(0).callback(None)
+
+    def _inc_stats(self, key: str, count: int = 1) -> None:
+        if self.stats is not None:
+            self.stats.inc_value(key, count)
+
+
+class ChangesPipeline(object):
+    """Pipeline for dropping games, which didn't change since the last
+    crawl.
+
+    Hashes of every field of the game (system requirements as normalized
+    record) are compared with hashes stored by the last crawl. Unchanged
+    games are dropped, new games are passed as they are. Changed games
+    are passed whole in drop mode and as GameDiff with changed fields
+    only in diff mode.
+
+    Hashes are saved, when the game is stored (see StoredGames), so the
+    game is passed again by the next crawl, if the next pipelines fail to
+    store it. Without stored_games hashes are saved at once.
+    """
+    MODES = ('drop', 'diff')
+
+    def __init__(self, store: FieldHashStore, mode: str = 'drop',
+                 stats=None, stored_games: StoredGames = None):
+        self.store = store
+        self.mode = mode
+        self.stats = stats
+        self.stored_games = stored_games
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('CHANGES_ENABLED'):
+            raise NotConfigured
+        mode = settings.get('CHANGES_MODE', 'drop')
+        if mode not in cls.MODES:
+            raise NotConfigured('Unknown changes mode: {}'.format(mode))
+        if mode == 'diff' and settings.getbool('EXPORT_ENABLED'):
+            logger.warning("Changed games are not exported in diff mode, "
+                           "only new games are")
+        store = FieldHashStore(data_path(settings['CHANGES_PATH']))
+        pipeline = cls(store, mode=mode, stats=crawler.stats,
+                       stored_games=StoredGames(crawler, store.set))
+        crawler.signals.connect(pipeline.spider_closed,
+                                signal=signals.spider_closed)
+        return pipeline
+
+    def close_spider(self, spider):
+        # the last games are stored by other pipelines after that
+        if self.stored_games is None:
+            self.store.close()
+
+    def spider_closed(self, spider):
+        self.store.close()
+
+    def process_item(self, item, spider):
+        if not isinstance(item, Game) or item.get('game_id') is None:
+            return item
+        game_id = item['game_id']
+        hashes = field_hashes(item)
+        old_hashes = self.store.get(game_id)
+        if old_hashes == hashes:
+            self._inc_stats('changes/unchanged')
+            raise UnchangedGame('Game {} is not changed'.format(game_id))
+
+        if self.stored_games is None:
+            self.store.set(game_id, hashes)
+        else:
+            self.stored_games.add(game_id, hashes)
+        if old_hashes is None:
+            self._inc_stats('changes/new')
+            return item
+        changed = changed_fields(old_hashes, hashes)
+        self._inc_stats('changes/changed')
+        for field in changed:
+            self._inc_stats('changes/field/{}'.format(field))
+        if self.mode == 'drop':
+            return item
+        return GameDiff(game_id=game_id,
+                        changed={field: item.get(field) for field in changed})
+
+    def _inc_stats(self, key: str, count: int = 1) -> None:
+        if self.stats is not None:
+            self.stats.inc_value(key, count)
+
+
+class ParsePoolPipeline(object):
+    """Pipeline for parsing game pages in process pool.
+
+    Spider yields downloaded pages as RawGame items, when PARSE_POOL_ENABLED
+    is set, so html parsing and field processing don't take the reactor
+    thread. Only finished games come back from worker processes. If
+    max_pending pages are already being parsed, next items wait for free
+    worker, that pauses the crawl instead of growing the pool queue.
+    """
+    def __init__(self, workers: int, max_pending: int, stats=None):
+        self.workers = workers
+        self.max_pending = max_pending
+        self.stats = stats
+
+        self.executor = None
+        self._parsing = set()
+        self._waiting = []  # type: List[defer.Deferred]
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('PARSE_POOL_ENABLED'):
+            raise NotConfigured
+        workers = settings.getint('PARSE_POOL_WORKERS') or os.cpu_count()
+        return cls(
+            workers=workers,
+            max_pending=settings.getint('PARSE_POOL_MAX_PENDING') or
+            workers * 4,
+            stats=crawler.stats
+        )
+
+    def open_spider(self, spider):
+        # forking of the process with reactor and threads is not safe
+        self.executor = ProcessPoolExecutor(
+            self.workers, mp_context=multiprocessing.get_context('spawn'),
+            initializer=init_worker,
+            initargs=(spider.selectors, spider.game_root_css,
+                      spider.item_context)
+        )
+
+    @defer.inlineCallbacks
+    def close_spider(self, spider):
+        yield defer.DeferredList(list(self._parsing))
+        if self.executor is not None:
+            yield deferToThread(self.executor.shutdown, True)
 
-class SteamscrapingPipeline(object):
     def process_item(self, item, spider):
+        if not isinstance(item, RawGame):
+            return item
+
+        if len(self._parsing) >= self.max_pending:
+            self._inc_stats('parsepool/backpressure')
+            d = defer.Deferred()
+            self._waiting.append(d)
+        else:
+            d = defer.succeed(None)
+        d.addCallback(self._parse, item, spider)
+        return d
+
+    def _parse(self, _, item: RawGame, spider) -> defer.Deferred:
+        d = self._run_in_pool(parse_game_page, item['url'], item['body'],
+                              item['encoding'], item['game_id'],
+                              item['game_values'])
+        self._parsing.add(d)
+        d.addBoth(self._on_finished, d)
+        d.addCallbacks(self._on_parsed, self._on_failed,
+                       callbackArgs=(item, spider),
+                       errbackArgs=(item, spider))
+        return d
+
+    def _run_in_pool(self, func, *args) -> defer.Deferred:
+        return _deferred_from_future(self.executor.submit(func, *args))
+
+    def _on_parsed(self, values: Dict, item: RawGame, spider) -> Game:
+        self._inc_stats('parsepool/parsed')
+        return spider._save_game_state(Game(values),
+                                       canonical_url(item['url']))
+
+    def _on_failed(self, failure, item: RawGame, spider) -> None:
+        self._inc_stats('parsepool/failed')
+        spider._shard_done(item['game_id'], failed=True)
+        raise DropItem("Failed to parse {}: {}".format(
+            item['url'], failure.getErrorMessage()
+        ))
+
+    def _on_finished(self, result, d: defer.Deferred):
+        self._parsing.discard(d)
+        while self._waiting and len(self._parsing) < self.max_pending:
+            self._waiting.pop(0).callback(None)
+        return result
+
+    def _inc_stats(self, key: str, count: int = 1) -> None:
+        if self.stats is not None:
+            self.stats.inc_value(key, count)
+
+
+class ExportPipeline(object):
+    """Pipeline for streaming export of games into files.
+
+    Every game is written into a file of each of EXPORT_FORMATS at once
+    (parquet files by record batches), files are rotated by size and
+    time, so memory does not grow with the length of the crawl.
+    """
+    def __init__(self, exporters: Dict[str, RotatingExporter], stats=None):
+        self.exporters = exporters
+        self.stats = stats
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('EXPORT_ENABLED'):
+            raise NotConfigured
+        compressions = {
+            'jsonl': settings.get('EXPORT_JSONL_COMPRESSION'),
+            'parquet': settings.get('EXPORT_PARQUET_COMPRESSION'),
+        }
+        options = {
+            'jsonl': {'level': settings.getint('EXPORT_JSONL_LEVEL', 6)},
+            'parquet': {'batch_size': settings.getint(
+                'EXPORT_PARQUET_BATCH_SIZE', 5000
+            )},
+        }
+        result = {}
+        for export_format in settings.getlist('EXPORT_FORMATS'):
+            if export_format not in WRITERS:
+                raise NotConfigured(
+                    'Unknown export format: {}'.format(export_format)
+                )
+            if export_format == 'parquet' and exporters.pyarrow is None:
+                raise NotConfigured('pyarrow is required for parquet export')
+            writer_class = WRITERS[export_format]
+            compression = compressions[export_format]
+            result[export_format] = RotatingExporter(
+                settings.get('EXPORT_DIR'),
+                partial(writer_class, compression=compression,
+                        **options[export_format]),
+                writer_class.suffix(compression),
+                rotate_size=settings.getint('EXPORT_ROTATE_SIZE'),
+                rotate_interval=settings.getfloat('EXPORT_ROTATE_INTERVAL')
+            )
+        return cls(result, stats=crawler.stats)
+
+    def close_spider(self, spider):
+        for export_format, exporter in self.exporters.items():
+            exporter.close()
+            if self.stats is not None:
+                prefix = 'export/{}/'.format(export_format)
+                self.stats.set_value(prefix + 'files', len(exporter.files))
+                self.stats.set_value(prefix + 'bytes', exporter.bytes)
+
+    def process_item(self, item, spider):
+        if not isinstance(item, Game):
+            return item
+        row = game_to_row(item)
+        now = time.time()
+        for exporter in self.exporters.values():
+            exporter.write(row, now)
+        if self.stats is not None:
+            self.stats.inc_value('export/items')
+        return item
+
+
+class CatalogPipeline(object):
+    """Pipeline for adding games into local catalog index.
+
+    The index is loaded from CATALOG_PATH, when the spider is opened,
+    and saved, when it is closed, so it is updated by every crawl.
+    Diffs of ChangesPipeline update only changed fields.
+    """
+    def __init__(self, path: str, stats=None):
+        self.path = path
+        self.stats = stats
+        self.catalog = None
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('CATALOG_ENABLED'):
+            raise NotConfigured
+        return cls(data_path(settings['CATALOG_PATH']), stats=crawler.stats)
+
+    def open_spider(self, spider):
+        if os.path.exists(self.path):
+            self.catalog = CatalogIndex.load(self.path)
+        else:
+            self.catalog = CatalogIndex()
+
+    def close_spider(self, spider):
+        start = time.perf_counter()
+        self.catalog.save(self.path)
+        logger.info("Catalog of %d games is saved in %.1f sec",
+                    len(self.catalog), time.perf_counter() - start)
+        if self.stats is not None:
+            self.stats.set_value('catalog/games', len(self.catalog))
+
+    def process_item(self, item, spider):
+        if isinstance(item, GameDiff):
+            self.catalog.add(item['game_id'], item['changed'], partial=True)
+        elif isinstance(item, Game) and item.get('game_id') is not None:
+            self.catalog.add(item['game_id'], item)
+        else:
+            return item
+        if self.stats is not None:
+            self.stats.inc_value('catalog/items')
         return item
+
+
+def _deferred_from_future(future: Future) -> defer.Deferred:
+    """Get deferred, which fires in reactor thread with result of future."""
+    d = defer.Deferred()
+
+    def fire():
+        try:
+            result = future.result()
+        except Exception:
+            d.errback()
+        else:
+            d.callback(result)
+
+    future.add_done_callback(lambda _: reactor.callFromThread(fire))
+    return d
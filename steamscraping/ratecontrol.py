@@ -0,0 +1,208 @@
+# -*- coding: utf-8 -*-
+"""Adaptive rate control of requests to the store."""
+
+import logging
+import random
+import time
+from email.utils import parsedate_to_datetime
+from typing import Dict, Union
+
+from scrapy.exceptions import NotConfigured
+from scrapy.utils.httpobj import urlparse_cached
+
+from steamscraping.metrics import get_metrics
+
+logger = logging.getLogger(__name__)
+
+
+class HostRate:
+    """Rate and concurrency of one host, adjusted by AIMD.
+
+    Every successful response adds about `increase` requests per second
+    to the rate during a second and one request to the concurrency during
+    a round trip. Throttled response multiplies both by `decrease`, but
+    not more often than once per cooldown, because responses to requests
+    in flight are usually throttled too. It also pauses the host.
+    """
+    def __init__(self, controller: 'RateController'):
+        self.controller = controller
+        self.rate = float(controller.start_rate)
+        self.concurrency = float(controller.start_concurrency)
+        self.paused_until = 0.0
+        self.last_decrease = float('-inf')
+
+    @property
+    def delay(self) -> float:
+        """Seconds between requests to the host."""
+        return 1 / self.rate
+
+    def on_success(self) -> None:
+        controller = self.controller
+        self.rate = min(controller.max_rate,
+                        self.rate + controller.increase / self.rate)
+        self.concurrency = min(controller.max_concurrency,
+                               self.concurrency + 1 / self.concurrency)
+
+    def on_throttled(self, now: float, pause: float) -> None:
+        """Decrease rate and don't send requests during pause seconds."""
+        controller = self.controller
+        self.paused_until = max(self.paused_until, now + pause)
+        cooldown = max(controller.cooldown, self.delay)
+        if now - self.last_decrease < cooldown:
+            return
+        self.last_decrease = now
+        self.rate = max(controller.min_rate, self.rate * controller.decrease)
+        self.concurrency = max(1.0, self.concurrency * controller.decrease)
+
+
+class RateController:
+    """Rates of all hosts with common parameters."""
+
+    def __init__(self, start_rate: float = 4, min_rate: float = 0.2,
+                 max_rate: float = 50, increase: float = 0.5, decrease: float = 0.5,
+                 start_concurrency: int = 4, max_concurrency: int = 16,
+                 cooldown: float = 1.0):
+        self.start_rate = start_rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.start_concurrency = start_concurrency
+        self.max_concurrency = max_concurrency
+        self.cooldown = cooldown
+        self.hosts = {}  # type: Dict[str, HostRate]
+
+    def get(self, host: str) -> HostRate:
+        host_rate = self.hosts.get(host)
+        if host_rate is None:
+            host_rate = self.hosts[host] = HostRate(self)
+        return host_rate
+
+
+def parse_retry_after(value: Union[bytes, None],
+                      now: float) -> Union[float, None]:
+    """Get seconds from Retry-After header (seconds or http date)."""
+    if not value:
+        return None
+    value = value.decode('latin-1').strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - now)
+    except (TypeError, ValueError, IndexError):
+        return None
+
+
+class AdaptiveRateMiddleware(object):
+    """Downloader middleware, that adapts request rate to the store.
+
+    Rate and concurrency of every host are applied to its downloader
+    slot: requests are sent with delay 1 / rate, so they wait in the slot
+    queue, not in the middleware chain. Rate and concurrency grow while
+    responses are successful and are halved on 429 responses (AIMD).
+
+    Throttled requests are scheduled again and the host is paused for
+    Retry-After of the response or exponential backoff. They are not
+    passed to RetryMiddleware and are not counted as failures (until
+    RATE_CONTROL_MAX_RETRIES is reached).
+
+    It should be placed after HttpCacheMiddleware (priority > 900),
+    so cached responses don't change the rate.
+    """
+    THROTTLED_CODES = (429,)
+
+    def __init__(self, crawler, controller: RateController,
+                 backoff: float, max_backoff: float, max_retries: int,
+                 clock=time.time):
+        self.crawler = crawler
+        self.stats = crawler.stats
+        self.metrics = get_metrics(crawler)
+        self.controller = controller
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.max_retries = max_retries
+        self.clock = clock
+
+    @classmethod
+    def from_crawler(cls, crawler):
+        settings = crawler.settings
+        if not settings.getbool('RATE_CONTROL_ENABLED'):
+            raise NotConfigured
+        controller = RateController(
+            start_rate=settings.getfloat('RATE_CONTROL_START_RATE', 4),
+            min_rate=settings.getfloat('RATE_CONTROL_MIN_RATE', 0.2),
+            max_rate=settings.getfloat('RATE_CONTROL_MAX_RATE', 50),
+            increase=settings.getfloat('RATE_CONTROL_INCREASE', 0.5),
+            decrease=settings.getfloat('RATE_CONTROL_DECREASE', 0.5),
+            start_concurrency=settings.getint(
+                'RATE_CONTROL_START_CONCURRENCY', 4
+            ),
+            max_concurrency=settings.getint('RATE_CONTROL_MAX_CONCURRENCY',
+                                            16),
+            cooldown=settings.getfloat('RATE_CONTROL_COOLDOWN', 1.0)
+        )
+        return cls(crawler, controller,
+                   backoff=settings.getfloat('RATE_CONTROL_BACKOFF', 5),
+                   max_backoff=settings.getfloat('RATE_CONTROL_MAX_BACKOFF',
+                                                 300),
+                   max_retries=settings.getint('RATE_CONTROL_MAX_RETRIES',
+                                               10))
+
+    def process_request(self, request, spider):
+        host_rate = self.controller.get(urlparse_cached(request).hostname)
+        if host_rate.paused_until > self.clock():
+            self.stats.inc_value('ratecontrol/delayed', spider=spider)
+        self._update_slot(request, spider, host_rate)
+        return None
+
+    def process_response(self, request, response, spider):
+        now = self.clock()
+        host_rate = self.controller.get(urlparse_cached(request).hostname)
+
+        if response.status not in self.THROTTLED_CODES:
+            host_rate.on_success()
+            self._update_slot(request, spider, host_rate)
+            return response
+
+        retries = request.meta.get('throttle_retries', 0) + 1
+        retry_after = parse_retry_after(response.headers.get('Retry-After'),
+                                        now)
+        pause = retry_after or 0
+        if retries <= self.max_retries:
+            backoff = min(self.max_backoff,
+                          self.backoff * 2 ** (retries - 1))
+            pause = max(pause, backoff * random.uniform(0.5, 1.0))
+        host_rate.on_throttled(now, pause)
+        self._update_slot(request, spider, host_rate)
+        self.stats.inc_value('ratecontrol/throttled', spider=spider)
+
+        if retries > self.max_retries:
+            logger.warning("Gave up on throttled %s after %d retries",
+                           request.url, retries - 1)
+            self.stats.inc_value('ratecontrol/gave_up', spider=spider)
+            return response
+
+        logger.debug("Throttled %s, host is paused for %.1f sec "
+                     "(rate %.2f/sec)", request.url, pause, host_rate.rate)
+        retry = request.replace(dont_filter=True)
+        retry.meta['throttle_retries'] = retries
+        return retry
+
+    def _update_slot(self, request, spider, host_rate):
+        host = urlparse_cached(request).hostname
+        concurrency = int(host_rate.concurrency)
+        downloader = getattr(self.crawler.engine, 'downloader', None)
+        if downloader is not None:
+            _, slot = downloader._get_slot(request, spider)
+            slot.concurrency = concurrency
+            slot.delay = host_rate.delay
+            # downloader sends next request after delay since lastseen
+            slot.lastseen = max(slot.lastseen, host_rate.paused_until)
+        self.stats.set_value('ratecontrol/rate', round(host_rate.rate, 2),
+                             spider=spider)
+        self.stats.set_value('ratecontrol/concurrency', concurrency,
+                             spider=spider)
+        if self.metrics is not None:
+            self.metrics.set_gauge('rate_limit', host_rate.rate, host=host)
+            self.metrics.set_gauge('concurrency_limit', concurrency,
+                                   host=host)
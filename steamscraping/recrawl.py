@@ -0,0 +1,212 @@
+# -*- coding: utf-8 -*-
+"""Queue of tracked games for re-crawling of prices and reviews."""
+
+import os
+import sqlite3
+from datetime import datetime
+from typing import List, Tuple, Union
+
+# fields of the game, which changes are tracked
+TRACKED_FIELDS = ('price', 'num_reviews')
+
+
+class RecrawlQueue:
+    """Priority queue of tracked games in sqlite database.
+
+    Every game has volatility, the moving average of changes of tracked
+    fields between fetches (from 0 for stable games to 1 for games changed
+    on every fetch). The game is due again after the interval, which is
+    min_interval for volatility 1 and grows geometrically up to
+    max_interval for volatility 0. Due games are taken in order of
+    staleness relative to their interval (time since the fetch divided by
+    the interval), so when there are more due games, than can be fetched,
+    volatile games are not left behind stable games, which were fetched
+    long ago. Due time is kept in indexed column, so only due games are
+    read to get the next batch.
+
+    Canonical url of the game page is kept, so the game is refetched
+    without redirect from /app/<id>/.
+
+    Values of tracked fields are appended to history, when the game is
+    added and when they change. Games released more than track_interval
+    ago are removed by prune (their history is kept).
+    """
+    COMMIT_EVERY = 1000
+    # weight of the last fetch in volatility
+    VOLATILITY_RATE = 0.3
+    # volatility of the game, which was fetched only once
+    INITIAL_VOLATILITY = 0.5
+
+    def __init__(self, path: str, min_interval: float, max_interval: float,
+                 track_interval: float = 0):
+        self.path = path
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.track_interval = track_interval
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.connection = sqlite3.connect(path)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(
+            'CREATE TABLE IF NOT EXISTS recrawl_games ('
+            'game_id INTEGER PRIMARY KEY, '
+            'released_at REAL, '
+            'fetched_at REAL NOT NULL, '
+            'due_at REAL NOT NULL, '
+            'interval REAL NOT NULL, '
+            'volatility REAL NOT NULL, '
+            'price INTEGER, '
+            'num_reviews INTEGER, '
+            'url TEXT);'
+            'CREATE INDEX IF NOT EXISTS recrawl_games_due '
+            'ON recrawl_games (due_at);'
+            'CREATE TABLE IF NOT EXISTS recrawl_history ('
+            'game_id INTEGER NOT NULL, '
+            'fetched_at REAL NOT NULL, '
+            'price INTEGER, '
+            'num_reviews INTEGER, '
+            'PRIMARY KEY (game_id, fetched_at));'
+        )
+        columns = {row[1] for row in self.connection.execute(
+            'PRAGMA table_info(recrawl_games)'
+        )}
+        if 'url' not in columns:
+            # queue of the previous version
+            self.connection.execute(
+                'ALTER TABLE recrawl_games ADD COLUMN url TEXT'
+            )
+        self.connection.commit()
+        self._uncommitted = 0
+
+    def interval(self, volatility: float) -> float:
+        """Get interval between fetches of the game with given volatility."""
+        return self.min_interval * (
+            self.max_interval / self.min_interval
+        ) ** (1 - volatility)
+
+    def update(self, game_id: int, price, num_reviews, release_date,
+               now: float, url: str = None) -> Tuple[str, ...]:
+        """Save fetched values of the game and schedule the next fetch.
+
+        :param game_id: id of the game
+        :param price: price of the game
+        :param num_reviews: num of reviews of the game
+        :param release_date: release date (it is kept from previous
+                             fetches, if it is not a datetime)
+        :param now: time of fetching (timestamp)
+        :param url: canonical url of the game page (it is kept from
+                    previous fetches, if it is not given)
+
+        :return: names of changed fields (empty for new games)
+        """
+        row = self.connection.execute(
+            'SELECT volatility, price, num_reviews FROM recrawl_games '
+            'WHERE game_id = ?', (game_id,)
+        ).fetchone()
+        if row is None:
+            changed = ()
+            volatility = self.INITIAL_VOLATILITY
+        else:
+            changed = tuple(field for field, old, new in zip(
+                TRACKED_FIELDS, row[1:], (price, num_reviews)
+            ) if old != new)
+            volatility = (row[0] * (1 - self.VOLATILITY_RATE) +
+                          self.VOLATILITY_RATE * bool(changed))
+        released_at = (release_date.timestamp()
+                       if isinstance(release_date, datetime) else None)
+        interval = self.interval(volatility)
+        self.connection.execute(
+            'INSERT INTO recrawl_games (game_id, released_at, fetched_at, '
+            'due_at, interval, volatility, price, num_reviews, url) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?) '
+            'ON CONFLICT (game_id) DO UPDATE SET '
+            'released_at = COALESCE(excluded.released_at, released_at), '
+            'fetched_at = excluded.fetched_at, due_at = excluded.due_at, '
+            'interval = excluded.interval, '
+            'volatility = excluded.volatility, price = excluded.price, '
+            'num_reviews = excluded.num_reviews, '
+            'url = COALESCE(excluded.url, url)',
+            (game_id, released_at, now, now + interval, interval,
+             volatility, price, num_reviews, url)
+        )
+        if row is None or changed:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO recrawl_history '
+                '(game_id, fetched_at, price, num_reviews) '
+                'VALUES (?, ?, ?, ?)', (game_id, now, price, num_reviews)
+            )
+        self._written()
+        return changed
+
+    def history(self, game_id: int) -> List[Tuple[float, int, int]]:
+        """Get (fetched_at, price, num_reviews) of the game by time."""
+        self.commit()
+        return self.connection.execute(
+            'SELECT fetched_at, price, num_reviews FROM recrawl_history '
+            'WHERE game_id = ? ORDER BY fetched_at', (game_id,)
+        ).fetchall()
+
+    def postpone(self, game_id: int, now: float) -> None:
+        """Schedule the next fetch of the game, which failed to fetch."""
+        self.connection.execute(
+            'UPDATE recrawl_games SET due_at = ? + interval '
+            'WHERE game_id = ?', (now, game_id)
+        )
+        self._written()
+
+    def due(self, now: float, limit: int) -> List[int]:
+        """Get up to limit ids of due games, the most stale first."""
+        return [game_id for game_id, _ in self.due_games(now, limit)]
+
+    def due_games(self, now: float,
+                  limit: int) -> List[Tuple[int, Union[str, None]]]:
+        """Get up to limit (game_id, url) of due games, the most stale
+        first (url is None for games tracked without it)."""
+        self.commit()
+        return self.connection.execute(
+            'SELECT game_id, url FROM recrawl_games WHERE due_at <= ? '
+            'ORDER BY (? - fetched_at) / interval DESC LIMIT ?',
+            (now, now, limit)
+        ).fetchall()
+
+    def count_due(self, now: float) -> int:
+        self.commit()
+        return self.connection.execute(
+            'SELECT COUNT(*) FROM recrawl_games WHERE due_at <= ?', (now,)
+        ).fetchone()[0]
+
+    def prune(self, now: float) -> int:
+        """Stop tracking games released more than track interval ago.
+
+        :return: number of removed games
+        """
+        if not self.track_interval:
+            return 0
+        cursor = self.connection.execute(
+            'DELETE FROM recrawl_games WHERE released_at < ?',
+            (now - self.track_interval,)
+        )
+        self.commit()
+        return cursor.rowcount
+
+    def __len__(self) -> int:
+        self.commit()
+        return self.connection.execute(
+            'SELECT COUNT(*) FROM recrawl_games'
+        ).fetchone()[0]
+
+    def _written(self) -> None:
+        self._uncommitted += 1
+        if self._uncommitted >= self.COMMIT_EVERY:
+            self.commit()
+
+    def commit(self) -> None:
+        self.connection.commit()
+        self._uncommitted = 0
+
+    def close(self) -> None:
+        self.commit()
+        self.connection.close()
@@ -1,11 +1,4 @@
 # -*- coding: utf-8 -*-
-import os
-
-import yaml
-
-from app_config import AppConfig, APP_DIR
-
-app_config = AppConfig()
 
 # Scrapy settings for steamscraping project
 #
@@ -53,31 +46,44 @@ ROBOTSTXT_OBEY = True
 
 # Enable or disable spider middlewares
 # See https://doc.scrapy.org/en/latest/topics/spider-middleware.html
-#SPIDER_MIDDLEWARES = {
-#    'steamscraping.middlewares.SteamscrapingSpiderMiddleware': 543,
-#}
+SPIDER_MIDDLEWARES = {
+    'steamscraping.middlewares.SteamscrapingSpiderMiddleware': 543,
+}
 
 # Enable or disable downloader middlewares
 # See https://doc.scrapy.org/en/latest/topics/downloader-middleware.html
-#DOWNLOADER_MIDDLEWARES = {
-#    'steamscraping.middlewares.SteamscrapingDownloaderMiddleware': 543,
-#}
+DOWNLOADER_MIDDLEWARES = {
+    'steamscraping.middlewares.SteamscrapingDownloaderMiddleware': 543,
+    'steamscraping.middlewares.SearchCutoffMiddleware': 50,
+    # before CookiesMiddleware (requests) and RedirectMiddleware (responses)
+    'steamscraping.middlewares.AgeCheckMiddleware': 650,
+    # after HttpCompressionMiddleware and before metrics of response sizes
+    'steamscraping.middlewares.TrimResponseMiddleware': 540,
+    # after HttpCacheMiddleware, so cached responses are not rate limited
+    'steamscraping.ratecontrol.AdaptiveRateMiddleware': 950,
+}
 
 # Enable or disable extensions
 # See https://doc.scrapy.org/en/latest/topics/extensions.html
-#EXTENSIONS = {
+EXTENSIONS = {
 #    'scrapy.extensions.telnet.TelnetConsole': None,
-#}
+    'steamscraping.metrics.MetricsExporter': 500,
+}
 
 # Configure item pipelines
 # See https://doc.scrapy.org/en/latest/topics/item-pipeline.html
-#ITEM_PIPELINES = {
-#    'steamscraping.pipelines.SteamscrapingPipeline': 300,
-#}
+ITEM_PIPELINES = {
+    'steamscraping.pipelines.ParsePoolPipeline': 100,
+    'steamscraping.pipelines.ChangesPipeline': 200,
+    'steamscraping.pipelines.DatabasePipeline': 300,
+    'steamscraping.pipelines.ExportPipeline': 400,
+    'steamscraping.pipelines.CatalogPipeline': 500,
+}
 
 # Enable and configure the AutoThrottle extension (disabled by default)
 # See https://doc.scrapy.org/en/latest/topics/autothrottle.html
-AUTOTHROTTLE_ENABLED = True
+# (disabled, AdaptiveRateMiddleware controls the rate instead)
+AUTOTHROTTLE_ENABLED = False
 # The initial download delay
 #AUTOTHROTTLE_START_DELAY = 5
 # The maximum download delay to be set in case of high latencies
@@ -88,31 +94,216 @@ AUTOTHROTTLE_TARGET_CONCURRENCY = 4.0
 # Enable showing throttling stats for every response received:
 #AUTOTHROTTLE_DEBUG = False
 
+# Adaptive rate control: rate (requests/sec) and concurrency of every host are
+# applied to its downloader slot, they grow while responses are successful and
+# are multiplied by RATE_CONTROL_DECREASE on 429 (at most once per cooldown
+# sec). Throttled requests are retried, the host is paused for Retry-After or
+# exponential backoff (sec), they are not counted as failures.
+RATE_CONTROL_ENABLED = True
+RATE_CONTROL_START_RATE = 4
+RATE_CONTROL_MIN_RATE = 0.2
+RATE_CONTROL_MAX_RATE = 50
+RATE_CONTROL_INCREASE = 0.5
+RATE_CONTROL_DECREASE = 0.5
+RATE_CONTROL_START_CONCURRENCY = 4
+RATE_CONTROL_MAX_CONCURRENCY = 16
+RATE_CONTROL_COOLDOWN = 1.0
+RATE_CONTROL_BACKOFF = 5
+RATE_CONTROL_MAX_BACKOFF = 300
+RATE_CONTROL_MAX_RETRIES = 10
+
 # Enable and configure HTTP caching (disabled by default)
 # See https://doc.scrapy.org/en/latest/topics/downloader-middleware.html#httpcache-middleware-settings
-#HTTPCACHE_ENABLED = True
+HTTPCACHE_ENABLED = True
 #HTTPCACHE_EXPIRATION_SECS = 0
-#HTTPCACHE_DIR = 'httpcache'
-#HTTPCACHE_IGNORE_HTTP_CODES = []
-#HTTPCACHE_STORAGE = 'scrapy.extensions.httpcache.FilesystemCacheStorage'
+HTTPCACHE_DIR = 'httpcache'
+HTTPCACHE_IGNORE_HTTP_CODES = [429, 500, 502, 503, 504]
+HTTPCACHE_STORAGE = 'steamscraping.httpcache.CompressedCacheStorage'
+# stale responses are revalidated with If-None-Match/If-Modified-Since
+HTTPCACHE_POLICY = 'steamscraping.httpcache.RevalidatingPolicy'
+HTTPCACHE_ALWAYS_STORE = True
+# remove entries unused for a week and keep cache under 1 GB
+HTTPCACHE_MAX_AGE = 7 * 24 * 60 * 60
+HTTPCACHE_MAX_SIZE = 1024 * 1024 * 1024
+HTTPCACHE_GZIP_LEVEL = 6
 
 # ------------ App Parameters ------------ #
 
-# For filtering snr get-parameter
+# For filtering snr get-parameter, games are kept by app id in a bitmap
 
-DUPEFILTER_CLASS = 'steamscraping.middlewares.SteamDupeFilter'
+DUPEFILTER_CLASS = 'steamscraping.dupefilters.AppIdDupeFilter'
+# keep fingerprints of other requests in bloom filter for given number
+# of requests (0 for exact set)
+DUPEFILTER_BLOOM_CAPACITY = 0
+DUPEFILTER_BLOOM_ERROR_RATE = 0.001
 
 
 # Crawl settings
 
 # supported languages: english, russian (otherwise, you will get an error)
+# These settings are used by item processors of the crawl, they are
+# passed in loader context (see steamscraping.items.item_settings).
 LANGUAGE = 'english'
 DAYS_EARLIER = 20
 REVIEWS_TO_PASS = 500
 
+# Age gate, mature content and language (Steam_language from LANGUAGE of the
+# crawl) cookies are set once per cookie jar. Game pages redirected to age
+# check anyway are requested again with the cookies at most
+# AGECHECK_MAX_RETRIES times.
+AGECHECK_ENABLED = True
+AGECHECK_COOKIES = {
+    'mature_content': '1',
+    'lastagecheckage': '1-0-2000',
+    'birthtime': '943999201',
+}
+AGECHECK_MAX_RETRIES = 2
+
+# html: parse whole game page
+# appdetails: get game from compact json api, game page is requested only
+#             for fields from APPDETAILS_HTML_FIELDS (if there are any)
+GAME_EXTRACTION_MODE = 'html'
+APPDETAILS_HTML_FIELDS = ['num_reviews', 'tags']
+
+# Games, which release date or num of reviews in search rows don't pass
+# DAYS_EARLIER and REVIEWS_TO_PASS, are not requested
+SEARCH_PREFILTER_ENABLED = True
+
+# Schedule all relevant search pages from the first one. Number of pages
+# is estimated by release dates and multiplied by margin, more pages are
+# scheduled if the last one is still relevant.
+SEARCH_FANOUT_ENABLED = True
+SEARCH_FANOUT_MARGIN = 1.5
+
+# html: follow html search pages (25 games per page)
+# json: request json search results (results_html fragment with
+#       SEARCH_RESULTS_COUNT games per request) instead of html pages
+SEARCH_MODE = 'html'
+SEARCH_RESULTS_COUNT = 100
+
+# Incremental crawling: games fetched during refresh interval (sec) are
+# skipped, the interval is doubled every time game is fetched unchanged
+# (up to max interval). Use spider argument -a full=1 to fetch all games.
+CRAWL_STATE_ENABLED = True
+CRAWL_STATE_PATH = 'crawlstate.db'
+CRAWL_STATE_REFRESH_INTERVAL = 20 * 60 * 60
+CRAWL_STATE_MAX_INTERVAL = 7 * 24 * 60 * 60
+
+# Tracking of price and num of reviews: scraped games released during
+# RECRAWL_TRACK_DAYS days are kept in the queue, `scrapy crawl recrawl`
+# refetches at most RECRAWL_BATCH_SIZE due games, most overdue first, and
+# stops scheduling them after RECRAWL_TIME_BUDGET sec. Games are due after
+# RECRAWL_MIN_INTERVAL (for games, which change on every fetch) up to
+# RECRAWL_MAX_INTERVAL (for stable ones) sec.
+RECRAWL_ENABLED = True
+RECRAWL_QUEUE_PATH = 'recrawl.db'
+RECRAWL_TRACK_DAYS = 90
+RECRAWL_MIN_INTERVAL = 6 * 60 * 60
+RECRAWL_MAX_INTERVAL = 7 * 24 * 60 * 60
+RECRAWL_BATCH_SIZE = 1000
+RECRAWL_TIME_BUDGET = 30 * 60
+
+# Sharded crawling by several workers (processes or hosts) with shared queue
+# of games: run SHARD_COUNT workers with SHARD_INDEX from 0 to
+# SHARD_COUNT - 1 and the same SHARD_CRAWL_ID (today by default). Worker 0
+# discovers games on search pages (SHARD_DISCOVERY=1/0 to change it) and
+# starts the crawl from scratch, so start it before other workers. Every
+# worker claims SHARD_BATCH_SIZE games of its shard (app_id mod SHARD_COUNT)
+# at a time and steals games of other shards, when its shard is empty
+# (idle worker checks the queue every SHARD_POLL_INTERVAL sec).
+# Games claimed more than SHARD_CLAIM_TIMEOUT sec ago are claimed again.
+SHARDING_ENABLED = False
+SHARD_COUNT = 1
+SHARD_INDEX = 0
+SHARD_CRAWL_ID = None
+SHARD_QUEUE_CLASS = 'steamscraping.sharding.SqliteShardQueue'
+SHARD_QUEUE_PATH = 'shards.db'
+SHARD_BATCH_SIZE = 100
+SHARD_POLL_INTERVAL = 1.0
+SHARD_CLAIM_TIMEOUT = 10 * 60
+
+# Metrics: download latency and response sizes by hosts, time of callbacks
+# and item processors, queue depth and requests in flight. They are written
+# in prometheus text format into file every export interval (sec) and/or
+# served on local port, summary is logged at the end of the crawl.
+METRICS_ENABLED = True
+METRICS_SAMPLE_INTERVAL = 1
+METRICS_EXPORT_INTERVAL = 15
+METRICS_EXPORT_FILE = None
+METRICS_EXPORT_PORT = None
+
 # DB settings
 
-DB_HOST = app_config.db_host
-DB_PORT = app_config.db_port
-DB_USER = app_config.db_user
-DB_PASSWORD = app_config.db_password
+# Not set settings are read from app.yaml (run/setup.py or a copy of
+# app.yaml.example, it is not committed), when database pipeline is opened,
+# so other commands don't need the config file.
+DB_HOST = None
+DB_PORT = None
+DB_USER = None
+DB_PASSWORD = None
+DB_DRIVER = 'postgresql'
+DB_NAME = 'steamscraping'
+# full sqlalchemy url, overrides settings above (e.g. sqlite:///games.db)
+DB_URL = None
+
+# games are written by batches of this size or after flush interval (sec)
+DB_BATCH_SIZE = 500
+DB_FLUSH_INTERVAL = 10
+# number of writer threads and pooled connections
+DB_POOL_SIZE = 4
+# crawl is paused, when so many batches are waiting for database
+DB_MAX_PENDING_BATCHES = 8
+
+# Parsing of game pages in PARSE_POOL_WORKERS processes (number of cores
+# by default), at most PARSE_POOL_MAX_PENDING pages (4 per worker by
+# default) are parsed at once, next pages wait for free worker
+PARSE_POOL_ENABLED = False
+PARSE_POOL_WORKERS = 0
+PARSE_POOL_MAX_PENDING = 0
+
+# Scripts, styles and div elements with these attributes (screenshots,
+# reviews, header and footer) are removed from game pages, before they are
+# parsed. Pages larger than TRIM_RESPONSE_MAX_SIZE bytes after that are
+# truncated. Regions must not contain elements of spider selectors.
+TRIM_RESPONSE_ENABLED = True
+TRIM_RESPONSE_REGIONS = [
+    'id="global_header"',
+    'class="highlight_ctn"',
+    'id="app_reviews_hash"',
+    'id="footer"',
+]
+TRIM_RESPONSE_MAX_SIZE = 2 * 1024 * 1024
+
+# Streaming export of games into EXPORT_DIR as compressed json lines
+# (gzip, bz2, xz or None) and/or parquet (needs pyarrow), one row per game
+# with a column per system requirement. Parquet is written by record
+# batches, tags and specs are dictionary encoded. Files are rotated, when
+# they have EXPORT_ROTATE_SIZE bytes or are open EXPORT_ROTATE_INTERVAL
+# sec, unfinished files have .part suffix.
+EXPORT_ENABLED = False
+EXPORT_FORMATS = ['jsonl']
+EXPORT_DIR = 'export'
+EXPORT_JSONL_COMPRESSION = 'gzip'
+EXPORT_JSONL_LEVEL = 6
+EXPORT_PARQUET_COMPRESSION = 'zstd'
+EXPORT_PARQUET_BATCH_SIZE = 5000
+EXPORT_ROTATE_SIZE = 128 * 1024 * 1024
+EXPORT_ROTATE_INTERVAL = 60 * 60
+
+# Change detection: hashes of every field of games are kept in
+# CHANGES_PATH, games, which are the same, as in the last crawl, are
+# dropped before database and export (logged at debug level).
+# drop: changed games are passed whole
+# diff: changed games are passed with changed fields only, database
+#       updates only their columns, export skips them
+CHANGES_ENABLED = False
+CHANGES_MODE = 'drop'
+CHANGES_PATH = 'changes.db'
+LOG_FORMATTER = 'steamscraping.logformatter.SteamLogFormatter'
+
+# Local catalog index of games in CATALOG_PATH: bitmaps of tags and specs
+# and sorted arrays of price, release date and num of reviews for fast
+# queries (steamscraping.catalog.CatalogIndex.load(path).query(...)).
+# It is updated by every crawl.
+CATALOG_ENABLED = False
+CATALOG_PATH = 'catalog.idx'
@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+"""Shared queue of games for crawling by several workers.
+
+One worker discovers games on search pages and puts their app ids into
+the queue, all workers claim games of their shard (app_id mod number of
+shards) and steal games of other shards, when their own shard is empty.
+The queue suppresses duplicate games of all workers and keeps stats of
+every worker for aggregation.
+"""
+
+import os
+import sqlite3
+import time
+from typing import Dict, Iterable, List, Tuple
+
+from scrapy.utils.project import data_path
+
+
+class ShardQueue:
+    """Interface of the shared queue backend.
+
+    Games of one crawl have the same crawl id, so the queue can be reused
+    by the next crawls. Discovering worker starts the crawl again, so
+    the next run with the same crawl id doesn't find it finished.
+    """
+    def __init__(self, crawl_id: str, num_shards: int,
+                 claim_timeout: float):
+        self.crawl_id = crawl_id
+        self.num_shards = num_shards
+        self.claim_timeout = claim_timeout
+
+    @classmethod
+    def from_settings(cls, settings, crawl_id: str) -> 'ShardQueue':
+        raise NotImplementedError
+
+    def put(self, games: Iterable[Tuple[int, str]]) -> None:
+        """Add (app_id, url) of games, which are not in the queue yet."""
+        raise NotImplementedError
+
+    def claim(self, worker: str, shard: int, limit: int,
+              now: float) -> List[Tuple[int, str]]:
+        """Take up to limit games of the shard (or of other shards).
+
+        Games, which were claimed more than claim_timeout sec ago and are
+        not done, are claimed again (their worker is considered dead).
+        """
+        raise NotImplementedError
+
+    def done(self, app_id: int, failed: bool = False) -> None:
+        raise NotImplementedError
+
+    def start_discovery(self) -> None:
+        """Forget games and stats of the previous run of the crawl."""
+        raise NotImplementedError
+
+    def finish_discovery(self) -> None:
+        """Mark, that all games of the crawl are put into the queue."""
+        raise NotImplementedError
+
+    def is_finished(self, now: float) -> bool:
+        """Check if discovery is finished and there are no games to claim."""
+        raise NotImplementedError
+
+    def save_stats(self, worker: str, stats: Dict) -> None:
+        raise NotImplementedError
+
+    def stats(self) -> Dict[str, float]:
+        """Get sum of numeric stats of all workers."""
+        raise NotImplementedError
+
+    def flush(self) -> None:
+        """Make buffered changes visible to other workers."""
+
+    def close(self) -> None:
+        self.flush()
+
+
+class SqliteShardQueue(ShardQueue):
+    """Queue in sqlite database, which is shared by workers on one host
+    (or on shared file system with proper locking).
+
+    Put and done games are buffered and written in one short transaction
+    every WRITE_EVERY operations and on flush, so workers don't hold the
+    database lock. Claiming is a single write transaction, so games are
+    not claimed twice.
+    """
+    WRITE_EVERY = 100
+    PENDING, CLAIMED, DONE, FAILED = range(4)
+
+    def __init__(self, path: str, crawl_id: str, num_shards: int = 1,
+                 claim_timeout: float = 600):
+        super().__init__(crawl_id, num_shards, claim_timeout)
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+        self.connection = sqlite3.connect(path, timeout=60)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.executescript(
+            'CREATE TABLE IF NOT EXISTS shard_games ('
+            'crawl_id TEXT NOT NULL, '
+            'app_id INTEGER NOT NULL, '
+            'url TEXT NOT NULL, '
+            'shard INTEGER NOT NULL, '
+            'state INTEGER NOT NULL DEFAULT 0, '
+            'worker TEXT, '
+            'claimed_at REAL, '
+            'PRIMARY KEY (crawl_id, app_id));'
+            'CREATE INDEX IF NOT EXISTS shard_games_state '
+            'ON shard_games (crawl_id, state, shard);'
+            'CREATE TABLE IF NOT EXISTS shard_crawls ('
+            'crawl_id TEXT PRIMARY KEY, '
+            'discovery_finished INTEGER NOT NULL DEFAULT 0);'
+            'CREATE TABLE IF NOT EXISTS shard_stats ('
+            'crawl_id TEXT NOT NULL, '
+            'worker TEXT NOT NULL, '
+            'name TEXT NOT NULL, '
+            'value REAL NOT NULL, '
+            'PRIMARY KEY (crawl_id, worker, name));'
+        )
+        self.connection.commit()
+        self._put = []
+        self._done = []
+
+    @classmethod
+    def from_settings(cls, settings, crawl_id):
+        return cls(data_path(settings['SHARD_QUEUE_PATH']), crawl_id,
+                   num_shards=settings.getint('SHARD_COUNT', 1),
+                   claim_timeout=settings.getfloat('SHARD_CLAIM_TIMEOUT',
+                                                   600))
+
+    def put(self, games):
+        self._put.extend((self.crawl_id, app_id, url,
+                          app_id % self.num_shards) for app_id, url in games)
+        self._buffered()
+
+    def claim(self, worker, shard, limit, now):
+        self.flush()
+        connection = self.connection
+        # write lock is taken at once, so other workers wait for it
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            rows = connection.execute(
+                'SELECT app_id, url FROM shard_games '
+                'WHERE crawl_id = ? AND state = ? AND shard = ? LIMIT ?',
+                (self.crawl_id, self.PENDING, shard, limit)
+            ).fetchall()
+            if len(rows) < limit:
+                rows += connection.execute(
+                    'SELECT app_id, url FROM shard_games '
+                    'WHERE crawl_id = ? AND (state = ? AND shard != ? OR '
+                    'state = ? AND claimed_at < ?) LIMIT ?',
+                    (self.crawl_id, self.PENDING, shard, self.CLAIMED,
+                     now - self.claim_timeout, limit - len(rows))
+                ).fetchall()
+            connection.executemany(
+                'UPDATE shard_games SET state = ?, worker = ?, claimed_at = ? '
+                'WHERE crawl_id = ? AND app_id = ?',
+                [(self.CLAIMED, worker, now, self.crawl_id, app_id)
+                 for app_id, _ in rows]
+            )
+            connection.commit()
+        except BaseException:
+            connection.rollback()
+            raise
+        return rows
+
+    def done(self, app_id, failed=False):
+        self._done.append((self.FAILED if failed else self.DONE,
+                           self.crawl_id, app_id))
+        self._buffered()
+
+    def start_discovery(self):
+        self._put = []
+        self._done = []
+        with self.connection:
+            for table in ('shard_games', 'shard_stats'):
+                self.connection.execute(
+                    'DELETE FROM {} WHERE crawl_id = ?'.format(table),
+                    (self.crawl_id,)
+                )
+            self.connection.execute(
+                'INSERT OR REPLACE INTO shard_crawls '
+                '(crawl_id, discovery_finished) VALUES (?, 0)',
+                (self.crawl_id,)
+            )
+
+    def finish_discovery(self):
+        self.flush()
+        with self.connection:
+            self.connection.execute(
+                'INSERT OR REPLACE INTO shard_crawls '
+                '(crawl_id, discovery_finished) VALUES (?, 1)',
+                (self.crawl_id,)
+            )
+
+    def is_finished(self, now):
+        self.flush()
+        row = self.connection.execute(
+            'SELECT discovery_finished FROM shard_crawls WHERE crawl_id = ?',
+            (self.crawl_id,)
+        ).fetchone()
+        if not row or not row[0]:
+            return False
+        row = self.connection.execute(
+            'SELECT 1 FROM shard_games WHERE crawl_id = ? AND '
+            '(state = ? OR state = ? AND claimed_at < ?) LIMIT 1',
+            (self.crawl_id, self.PENDING, self.CLAIMED,
+             now - self.claim_timeout)
+        ).fetchone()
+        return row is None
+
+    def save_stats(self, worker, stats):
+        with self.connection:
+            self.connection.executemany(
+                'INSERT OR REPLACE INTO shard_stats (crawl_id, worker, name, '
+                'value) VALUES (?, ?, ?, ?)',
+                [(self.crawl_id, worker, name, value)
+                 for name, value in stats.items()
+                 if isinstance(value, (int, float)) and
+                 not isinstance(value, bool)]
+            )
+
+    def stats(self):
+        self.flush()
+        return dict(self.connection.execute(
+            'SELECT name, SUM(value) FROM shard_stats WHERE crawl_id = ? '
+            'GROUP BY name ORDER BY name', (self.crawl_id,)
+        ))
+
+    def worker_stats(self) -> Dict[str, Dict[str, float]]:
+        """Get numeric stats of every worker."""
+        self.flush()
+        stats = {}
+        for worker, name, value in self.connection.execute(
+                'SELECT worker, name, value FROM shard_stats '
+                'WHERE crawl_id = ? ORDER BY worker, name', (self.crawl_id,)):
+            stats.setdefault(worker, {})[name] = value
+        return stats
+
+    def count(self) -> Dict[int, int]:
+        """Get number of games in every state."""
+        return dict(self.connection.execute(
+            'SELECT state, COUNT(*) FROM shard_games WHERE crawl_id = ? '
+            'GROUP BY state', (self.crawl_id,)
+        ))
+
+    def flush(self):
+        if not self._put and not self._done:
+            return
+        with self.connection:
+            self.connection.executemany(
+                'INSERT OR IGNORE INTO shard_games '
+                '(crawl_id, app_id, url, shard) VALUES (?, ?, ?, ?)',
+                self._put
+            )
+            self.connection.executemany(
+                'UPDATE shard_games SET state = ? '
+                'WHERE crawl_id = ? AND app_id = ?', self._done
+            )
+        self._put = []
+        self._done = []
+
+    def close(self):
+        self.flush()
+        self.connection.close()
+
+    def _buffered(self):
+        if len(self._put) + len(self._done) >= self.WRITE_EVERY:
+            self.flush()
+
+
+def default_crawl_id() -> str:
+    """Crawl id of workers, which are started on the same day."""
+    return time.strftime('%Y-%m-%d')
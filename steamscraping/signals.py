@@ -0,0 +1,73 @@
+# -*- coding: utf-8 -*-
+"""Signals of the project and saving of state of stored games."""
+
+from typing import Callable, Dict, Iterable
+
+from scrapy import signals
+from scrapy.utils.conf import build_component_list
+
+from steamscraping.changes import UnchangedGame
+
+# sent by DatabasePipeline, when games are written into database
+# args: game_ids (ids of written games)
+games_stored = object()
+
+DATABASE_PIPELINE = 'steamscraping.pipelines.DatabasePipeline'
+
+
+def database_enabled(settings) -> bool:
+    """Check if games are stored by DatabasePipeline."""
+    return any(
+        (pipeline if isinstance(pipeline, str) else '{}.{}'.format(
+            pipeline.__module__, pipeline.__qualname__
+        )) == DATABASE_PIPELINE
+        for pipeline in build_component_list(
+            settings.getwithbase('ITEM_PIPELINES')
+        )
+    )
+
+
+class StoredGames:
+    """State of games (hashes, crawl state), which is saved only when
+    games are stored.
+
+    Games are stored, when DatabasePipeline writes them or, if it is not
+    enabled, when they pass all pipelines. Games dropped as unchanged
+    were stored by the previous crawl. State of games, which failed or
+    were dropped by other reasons, is not saved, so they are not skipped
+    by the next crawls.
+    """
+    def __init__(self, crawler, save: Callable[[int, object], None]):
+        """
+        :param save: function of game id and its state
+        """
+        self.save = save
+        self.pending = {}  # type: Dict[int, object]
+        if database_enabled(crawler.settings):
+            crawler.signals.connect(self.games_stored, signal=games_stored)
+        else:
+            crawler.signals.connect(self.item_scraped,
+                                    signal=signals.item_scraped)
+        crawler.signals.connect(self.item_dropped,
+                                signal=signals.item_dropped)
+
+    def add(self, game_id: int, state) -> None:
+        """Save state of the game, when it is stored."""
+        self.pending[game_id] = state
+
+    def games_stored(self, game_ids: Iterable[int]) -> None:
+        for game_id in game_ids:
+            self._save(game_id)
+
+    def item_scraped(self, item) -> None:
+        self._save(item.get('game_id'))
+
+    def item_dropped(self, item, exception) -> None:
+        if isinstance(exception, UnchangedGame):
+            self._save(item.get('game_id'))
+        else:
+            self.pending.pop(item.get('game_id'), None)
+
+    def _save(self, game_id) -> None:
+        if game_id in self.pending:
+            self.save(game_id, self.pending.pop(game_id))
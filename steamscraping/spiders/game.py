@@ -1,19 +1,110 @@
+import json
+import logging
+import math
+import os
 import re
+import time
 from datetime import datetime
+from urllib.parse import urlparse
 
+from scrapy import Request, Selector, signals
+from scrapy.exceptions import DontCloseSpider
+from scrapy.http import HtmlResponse
 from scrapy.spiders import CrawlSpider, Rule
 from scrapy.linkextractors import LinkExtractor
 from scrapy.loader import ItemLoader
-from scrapy.loader.processors import TakeFirst
+from itemloaders.processors import TakeFirst
+from scrapy.utils.misc import load_object
+from scrapy.utils.project import data_path
+from twisted.internet import reactor
+from w3lib.url import add_or_replace_parameter
 
-from steamscraping.items import Game, StrToDate
-import steamscraping.settings as settings
+from steamscraping.crawlstate import CrawlState, game_content_hash
+from steamscraping.extractors import SelectorsExtractor
+from steamscraping.items import (DEFAULT_LANGUAGE, Game, GameNumReviews,
+                                 GameReleaseDate, RawGame, StrToDate,
+                                 get_date_parser, item_settings)
+from steamscraping.metrics import get_metrics
+from steamscraping.recrawl import RecrawlQueue
+from steamscraping.sharding import default_crawl_id
+from steamscraping.signals import StoredGames
+from steamscraping.urls import (SEARCH_RESULTS_PATH, app_id_from_url,
+                                canonical_url, search_page_from_url)
+
+logger = logging.getLogger(__name__)
+
+# percents and number of reviews in review summary tooltip of search row,
+# thousands are separated by comma, dot or (no-break) space by language
+PERCENT_RE = re.compile(r'\d+\s*%')
+NUMBER_RE = re.compile(r'\d+(?:[\s.,\u00a0]\d{3})*')
+
+
+def num_reviews_from_tooltip(tooltip):
+    """Get number of reviews from review summary tooltip of search row.
+
+    :param tooltip: e.g. "92% of the 1,234 user reviews ..." (english) or
+                    "92 % des 1 234 évaluations ..." (french)
+
+    :return: number of reviews or None
+    """
+    match = NUMBER_RE.search(PERCENT_RE.sub('', tooltip))
+    return int(re.sub(r'\D', '', match.group())) if match else None
 
 
 class GameItemLoader(ItemLoader):
-    """Custom item loader with overrided default output_processor."""
+    """Custom item loader with overrided default output_processor.
+
+    If metrics are given in loader context, time of input and output
+    processors of every field is measured.
+    """
     default_output_processor = TakeFirst()
 
+    def add_value(self, field_name, value, *processors, **kw):
+        metrics = self.context.get('metrics')
+        if metrics is None or field_name is None:
+            return super().add_value(field_name, value, *processors, **kw)
+        start = time.perf_counter()
+        super().add_value(field_name, value, *processors, **kw)
+        metrics.observe('item_field_seconds', time.perf_counter() - start,
+                        field=field_name, stage='input')
+
+    def get_output_value(self, field_name):
+        metrics = self.context.get('metrics')
+        if metrics is None:
+            return super().get_output_value(field_name)
+        start = time.perf_counter()
+        value = super().get_output_value(field_name)
+        metrics.observe('item_field_seconds', time.perf_counter() - start,
+                        field=field_name, stage='output')
+        return value
+
+
+def load_game(extractor, response, game_id, game_values=None, fields=None,
+              metrics=None, context=None, stats=None):
+    """Extract the game from its page.
+
+    :param extractor: SelectorsExtractor with selectors of game fields
+    :param game_values: values of fields collected from appdetails, they
+                        are not extracted from the page
+    :param fields: fields to extract (all fields of extractor by default)
+    :param context: values of item settings for processors (item_settings)
+    :param stats: stats of the crawler for processors
+
+    :return: loaded game
+    """
+    game_values = game_values or {}
+    loader = GameItemLoader(item=Game(), response=response, metrics=metrics,
+                            stats=stats, **(context or {}))
+    loader.add_value('game_id', game_id)
+    for field, values in game_values.items():
+        loader.add_value(field, values)
+
+    fields = [field for field in (fields or extractor.xpaths)
+              if field not in game_values]
+    for field, values in extractor.extract(response, fields).items():
+        loader.add_value(field, values)
+    return loader.load_item()
+
 
 # TODO: see below
 # 1) make pipelines
@@ -24,9 +115,88 @@ class GameItemLoader(ItemLoader):
 class GameParser(CrawlSpider):
     """Spider class for parsing new games."""
     name = 'games'
-    start_urls = ["https://store.steampowered.com/search/"
-                  "?sort_by=Released_DESC&category1=998"]
+    # spider argument (-a store_url=http://127.0.0.1:8000) to crawl
+    # other store, e.g. local mock store for load testing
+    store_url = 'https://store.steampowered.com'
+    search_path = '/search/?sort_by=Released_DESC&category1=998'
+    start_urls = [store_url + search_path]
     allowed_domains = ['steampowered.com']
+    appdetails_url = ('{store_url}/api/appdetails/?appids={app_id}&l={lang}'
+                      '&filters=basic,categories,price_overview,release_date')
+
+    # html: follow html search pages
+    # json: request search results from json endpoint, many games at once
+    search_mode = 'html'
+    search_results_url = ('{store_url}/search/results/?sort_by=Released_DESC'
+                          '&category1=998&infinite=1&start=0&count={count}')
+    search_results_count = 100
+    # links to games in results_html fragment
+    results_link_extractor = LinkExtractor(allow='/app/.+')
+
+    # html: parse the whole game page
+    # appdetails: get fields from json api, game page is requested
+    #             only for fields from appdetails_html_fields
+    extraction_mode = 'html'
+    appdetails_html_fields = ('num_reviews', 'tags')
+
+    # state of previous crawls (None if incremental crawling is disabled),
+    # fetching of the game is saved, when the game is stored
+    crawl_state = None
+    stored_games = None
+    # tracked games for re-crawling (None if tracking is disabled)
+    recrawl_queue = None
+    # metrics of the crawl (None if metrics are disabled)
+    metrics = None
+    # shared queue of games (None if sharding is disabled), games of
+    # shard_index shard are claimed from it in batches
+    shard_queue = None
+    shard_index = 0
+    shard_batch_size = 100
+    # worker discovers games on search pages (only one worker does it)
+    discovers = True
+    discovery_finished = False
+    # game pages are parsed by ParsePoolPipeline in other processes
+    parse_pool = False
+
+    # claimed games, which are not done yet
+    shard_claimed = 0
+    # idle worker checks the queue every poll interval (sec), instead of
+    # waiting for the next idle signal
+    shard_poll_interval = 1.0
+    _shard_poll = None
+    # spider argument (-a full=1) to request all games ignoring crawl state
+    full = False
+    # settings used by item processors (LANGUAGE, DAYS_EARLIER,
+    # REVIEWS_TO_PASS), they are passed in loader context
+    item_context = {'LANGUAGE': DEFAULT_LANGUAGE}
+    # processor for release dates on search pages and its context with
+    # stats of the crawler (they are not in item_context, which is sent
+    # to processes of parse pool)
+    parse_release_date = StrToDate()
+    date_context = item_context
+
+    # first search page with only too old games (None until it is found)
+    cutoff_page = None
+
+    # games, which release date or num of reviews in search rows don't
+    # pass filters of Game, are not requested
+    prefilter = True
+    # search rows of the last search page (it is checked link by link)
+    _prefilter_response = None
+    _prefilter_rows = None
+
+    # schedule all relevant search pages from the first one, instead of
+    # following pagination links page by page
+    fanout = True
+    # pages scheduled = estimated number of relevant pages * fanout margin
+    fanout_margin = 1.5
+    # total number of search pages and the last scheduled one
+    page_count = None
+    scheduled_pages = 1
+    # search pages are requested before games (priority 0), so discovery
+    # isn't queued behind game pages, earlier pages go first
+    search_priority = 1000000
+
     selectors = {'release_date': 'div.date ::text',
                  'title': '.apphub_AppName ::text',
                  'description': '#game_area_description',
@@ -37,6 +207,8 @@ class GameParser(CrawlSpider):
                  'system_requirements':
                      '.game_area_sys_req[data-os="win"] ::text'
                  }
+    # all selectors are inside of this element on game page
+    game_root_css = '.game_page_background'
 
     rules = (
         Rule(
@@ -44,7 +216,7 @@ class GameParser(CrawlSpider):
                 allow='/app/.+',
                 restrict_css='#search_result_container'
             ),
-            process_request='add_cookies',
+            process_request='process_game_request',
             callback='parse_game'
         ),
         Rule(
@@ -52,62 +224,591 @@ class GameParser(CrawlSpider):
                 allow='page=(\d+)',
                 restrict_css='.search_pagination_right'
             ),
-            process_request='add_cookies',
+            process_links='filter_page_links',
             callback='parse_page'
         )
     )
 
-    @staticmethod
-    def add_cookies(request):
-        """Add cookies.
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if 'store_url' in kwargs:
+            self.store_url = self.store_url.rstrip('/')
+            if 'start_urls' not in kwargs:
+                self.start_urls = [self.store_url + self.search_path]
+            if 'allowed_domains' not in kwargs:
+                self.allowed_domains = [urlparse(self.store_url).hostname]
+        # selectors are compiled once, not on every game page
+        self.extractor = SelectorsExtractor(self.selectors,
+                                            root_css=self.game_root_css)
 
-         We can do it to set correct language, avoiding age checking,
-         mature content checking
-         """
-        request.cookies.update({'Steam_language': settings.LANGUAGE,
-                                'mature_content': '1',
-                                'lastagecheckage': '1-0-2000',
-                                'birthtime': 943999201})
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        spider.extraction_mode = crawler.settings.get(
+            'GAME_EXTRACTION_MODE', cls.extraction_mode
+        )
+        spider.appdetails_html_fields = tuple(crawler.settings.getlist(
+            'APPDETAILS_HTML_FIELDS', cls.appdetails_html_fields
+        ))
 
-        return request
+        spider.fanout = crawler.settings.getbool('SEARCH_FANOUT_ENABLED',
+                                                 cls.fanout)
+        spider.fanout_margin = crawler.settings.getfloat(
+            'SEARCH_FANOUT_MARGIN', cls.fanout_margin
+        )
+        spider.search_mode = crawler.settings.get('SEARCH_MODE',
+                                                  cls.search_mode)
+        spider.search_results_count = crawler.settings.getint(
+            'SEARCH_RESULTS_COUNT', cls.search_results_count
+        )
+        spider.prefilter = crawler.settings.getbool('SEARCH_PREFILTER_ENABLED',
+                                                    cls.prefilter)
+
+        spider.item_context = item_settings(crawler.settings)
+        # unsupported language fails the crawl at start
+        get_date_parser(spider.item_context['LANGUAGE'])
+        spider.date_context = dict(spider.item_context, stats=crawler.stats)
+
+        spider.metrics = get_metrics(crawler)
+        spider.parse_pool = crawler.settings.getbool('PARSE_POOL_ENABLED')
+        spider.full = spider.full in (True, '1', 'true', 'yes')
+        if crawler.settings.getbool('CRAWL_STATE_ENABLED'):
+            spider.crawl_state = CrawlState(
+                data_path(crawler.settings['CRAWL_STATE_PATH']),
+                refresh_interval=crawler.settings.getfloat(
+                    'CRAWL_STATE_REFRESH_INTERVAL'
+                ),
+                max_interval=crawler.settings.getfloat(
+                    'CRAWL_STATE_MAX_INTERVAL'
+                )
+            )
+            spider.stored_games = StoredGames(crawler,
+                                              spider._save_crawl_state)
+        if crawler.settings.getbool('RECRAWL_ENABLED'):
+            spider.recrawl_queue = RecrawlQueue(
+                data_path(crawler.settings['RECRAWL_QUEUE_PATH']),
+                min_interval=crawler.settings.getfloat(
+                    'RECRAWL_MIN_INTERVAL'
+                ),
+                max_interval=crawler.settings.getfloat(
+                    'RECRAWL_MAX_INTERVAL'
+                ),
+                track_interval=crawler.settings.getfloat(
+                    'RECRAWL_TRACK_DAYS'
+                ) * 24 * 60 * 60
+            )
+        if crawler.settings.getbool('SHARDING_ENABLED'):
+            queue_class = load_object(crawler.settings['SHARD_QUEUE_CLASS'])
+            spider.shard_queue = queue_class.from_settings(
+                crawler.settings,
+                crawler.settings.get('SHARD_CRAWL_ID') or default_crawl_id()
+            )
+            spider.shard_index = crawler.settings.getint('SHARD_INDEX')
+            spider.shard_batch_size = crawler.settings.getint(
+                'SHARD_BATCH_SIZE', cls.shard_batch_size
+            )
+            spider.shard_poll_interval = crawler.settings.getfloat(
+                'SHARD_POLL_INTERVAL', cls.shard_poll_interval
+            )
+            discovery = crawler.settings.get('SHARD_DISCOVERY')
+            spider.discovers = (spider.shard_index == 0 if discovery is None
+                                else crawler.settings.getbool(
+                                    'SHARD_DISCOVERY'))
+            if spider.discovers:
+                spider.shard_queue.start_discovery()
+            crawler.signals.connect(spider.spider_idle,
+                                    signal=signals.spider_idle)
+        return spider
+
+    def parse(self, response):
+        """Parse search page with parse_start_url and follow rules.
+
+        It is the same, as CrawlSpider.parse of scrapy 1.x, newer versions
+        don't allow to call it from callbacks.
+        """
+        return self._parse_response(response, self.parse_start_url,
+                                    cb_kwargs={}, follow=True)
+
+    def start_requests(self):
+        if not self.discovers:
+            # games are claimed from the shared queue, when spider is idle
+            return
+        if self.search_mode != 'json':
+            yield from super().start_requests()
+            return
+        url = self.search_results_url.format(store_url=self.store_url,
+                                             count=self.search_results_count)
+        yield Request(url, callback=self.parse_search_results)
+
+    def closed(self, reason):
+        if self.crawl_state is not None:
+            self.crawl_state.close()
+        if self.recrawl_queue is not None:
+            self.recrawl_queue.close()
+        if self._shard_poll is not None and self._shard_poll.active():
+            self._shard_poll.cancel()
+        if self.shard_queue is not None:
+            self.shard_queue.save_stats(self.shard_worker,
+                                        self.crawler.stats.get_stats())
+            self.shard_queue.close()
+
+    @property
+    def shard_worker(self):
+        return '{}-{}'.format(self.shard_index, os.getpid())
+
+    def spider_idle(self, spider):
+        """Claim next games from the shared queue.
+
+        Spider is not closed, until all games of the crawl are done
+        by some worker.
+        """
+        now = time.time()
+        if self.discovers and not self.discovery_finished:
+            # all search pages are parsed, when discovering worker is idle
+            self.shard_queue.finish_discovery()
+            self.discovery_finished = True
+        # games of the lost requests (e.g. filtered) are not waited
+        self.shard_claimed = 0
+        if self._claim_games(now):
+            raise DontCloseSpider
+        if not self.shard_queue.is_finished(now):
+            if self._shard_poll is None or not self._shard_poll.active():
+                self._shard_poll = reactor.callLater(
+                    self.shard_poll_interval, self._poll_games
+                )
+            raise DontCloseSpider
+
+    def _poll_games(self):
+        if not self.shard_claimed:
+            self._claim_games(time.time())
+
+    def _claim_games(self, now):
+        """Claim next batch of games and schedule requests to them.
+
+        :return: number of claimed games
+        """
+        queue = self.shard_queue
+        games = queue.claim(self.shard_worker, self.shard_index,
+                            self.shard_batch_size, now)
+        self.crawler.stats.inc_value('sharding/claimed', len(games))
+        for app_id, url in games:
+            request = self.process_game_request(Request(
+                url, callback=self.parse_game, errback=self.game_failed,
+                meta={'shard_claimed': True}
+            ))
+            if request is None:
+                queue.done(app_id)
+            else:
+                self.shard_claimed += 1
+                self.crawler.engine.crawl(request)
+        return len(games)
+
+    def process_game_request(self, request, response=None):
+        """Prepare request to the game according to extraction mode."""
+        app_id = app_id_from_url(request.url)
+        if response is not None and not self._passes_prefilter(app_id,
+                                                               response):
+            return None
+        if self.shard_queue is not None and app_id is not None and \
+                not request.meta.get('shard_claimed'):
+            # game is checked and fetched by the worker, which claims it
+            # (the same worker usually, so it has crawl state of the game)
+            self.shard_queue.put([(app_id, canonical_url(request.url))])
+            self.crawler.stats.inc_value('sharding/discovered')
+            return None
+        if self._is_game_fresh(app_id):
+            self.crawler.stats.inc_value('crawlstate/skipped')
+            return None
+
+        if self.extraction_mode != 'appdetails' or app_id is None:
+            return request
+
+        url = self.appdetails_url.format(store_url=self.store_url,
+                                         app_id=app_id,
+                                         lang=self.item_context['LANGUAGE'])
+        return request.replace(
+            url=url,
+            callback=self.parse_appdetails,
+            meta=dict(request.meta, game_url=request.url, game_id=app_id)
+        )
+
+    def filter_page_links(self, links):
+        """Remove links to search pages after the cutoff page."""
+        if self.fanout:
+            # pages are scheduled by parse_start_url
+            return []
+        if self.cutoff_page is None:
+            return links
+        return [link for link in links
+                if (search_page_from_url(link.url) or 0) < self.cutoff_page]
 
     def parse_page(self, response):
         """Method for parsing page with games.
 
         We should stop parsing if we face too old game (depends on settings)
         """
+        if self._is_page_relevant(response):
+            return self.parse(response)
+
+    def parse_search_results(self, response):
+        """Method for parsing json search results.
+
+        Only results_html fragment is parsed. Games and next pages are
+        scheduled in the same way, as from html search pages.
+        """
+        data = json.loads(response.text)
+        results = HtmlResponse(url=response.url, request=response.request,
+                               body=data.get('results_html') or '',
+                               encoding='utf-8')
+        page = search_page_from_url(response.url) or 1
+        if page == 1 and data.get('total_count'):
+            self.page_count = math.ceil(int(data['total_count']) /
+                                        self.search_results_count)
+        if not self._is_page_relevant(results):
+            return
+
+        yield from self._schedule_pages(results, page,
+                                        callback=self.parse_search_results)
+        for link in self.results_link_extractor.extract_links(results):
+            request = self.process_game_request(
+                Request(link.url, callback=self.parse_game), results
+            )
+            if request is not None:
+                yield request
+
+    def _is_page_relevant(self, response):
+        """Check if there are games released in relevant time on the page.
+
+        We should stop parsing if we face too old game (depends on settings),
+        so cutoff page is set, if all games on the page are too old.
+        """
         # look at games release dates on the page
         # if there is at least one game, that released in relevant time
         # process the page
+        days_earlier = self.item_context.get('DAYS_EARLIER')
+        if days_earlier is None:
+            return True
         release_dates_str = response.css('div.search_released::text').extract()
+        has_dates = False
         for release_date_str in release_dates_str:
-            release_date = StrToDate()(release_date_str)
+            release_date = self.parse_release_date(release_date_str,
+                                                   self.date_context)
             if isinstance(release_date, datetime):
+                has_dates = True
                 days_difference = (datetime.now() - release_date).days
-                if days_difference <= settings.DAYS_EARLIER:
-                    return self.parse(response)
-        pass
+                if days_difference <= days_earlier:
+                    return True
+
+        # games are sorted by release date, so all next pages are too old
+        page = search_page_from_url(response.url)
+        if has_dates and page is not None:
+            self._set_cutoff_page(page)
+        return False
+
+    def _passes_prefilter(self, app_id, response):
+        """Check if the game from search page can pass filters of Game.
+
+        Release date and num of reviews of the search row go through the
+        same filters, as fields of the game page. Games without a row or
+        without these values are not filtered.
+        """
+        if not self.prefilter or app_id is None:
+            return True
+        if self._prefilter_response is not response:
+            self._prefilter_response = response
+            self._prefilter_rows = self._get_search_rows(response)
+        row = self._prefilter_rows.get(app_id)
+        if row is None:
+            return True
+
+        release_date, num_reviews = row
+        stats = self.crawler.stats
+        if isinstance(release_date, datetime) and \
+                GameReleaseDate.filter_by_date(
+                    release_date, self.item_context) is None:
+            stats.inc_value('prefilter/too_old')
+            return False
+        if num_reviews is not None and \
+                GameNumReviews.filter_by_num_review(
+                    num_reviews, self.item_context) is None:
+            stats.inc_value('prefilter/few_reviews')
+            return False
+        stats.inc_value('prefilter/passed')
+        return True
+
+    def _get_search_rows(self, response):
+        """Get release date and num of reviews of games on search page.
+
+        :return: map of app id to (release date, num of reviews)
+        """
+        rows = {}
+        for row in response.css('a.search_result_row'):
+            app_id = row.attrib.get('data-ds-appid', '')
+            # bundles have several app ids
+            if not app_id.isdigit():
+                continue
+            release_date = self.parse_release_date(
+                row.css('.search_released::text').get(default='').strip(),
+                self.date_context
+            )
+            tooltip = row.css(
+                '.search_review_summary::attr(data-tooltip-html)'
+            ).get(default='')
+            rows[int(app_id)] = (release_date,
+                                 num_reviews_from_tooltip(tooltip))
+        return rows
+
+    def _set_cutoff_page(self, page):
+        if self.cutoff_page is None or page < self.cutoff_page:
+            logger.info("Search pages after %d are too old", page)
+            self.cutoff_page = page
+
+    def parse_start_url(self, response):
+        """Schedule next search pages at once.
+
+        It is called by parse for the first search page and for every
+        relevant page from parse_page. Number of relevant pages is estimated
+        by release dates on the page, next pages are scheduled only
+        if the last scheduled page is still relevant.
+        """
+        if not self.fanout:
+            return []
+        page = search_page_from_url(response.url) or 1
+        if page == 1:
+            self.page_count = self._get_page_count(response)
+        return self._schedule_pages(response, page, callback=self.parse_page)
+
+    def _schedule_pages(self, response, page, callback):
+        """Schedule search pages after the given page.
+
+        With fan-out pages are scheduled up to estimated last relevant page,
+        otherwise only the next page is scheduled.
+        """
+        if page < self.scheduled_pages:
+            return []
+
+        last_page = page + 1
+        if self.fanout:
+            last_page = max(self._estimate_last_page(response, page),
+                            last_page)
+        if self.page_count is not None:
+            last_page = min(last_page, self.page_count)
+        if self.cutoff_page is not None:
+            last_page = min(last_page, self.cutoff_page)
+
+        first_page = self.scheduled_pages + 1
+        self.scheduled_pages = max(self.scheduled_pages, last_page)
+        return [
+            Request(
+                self._search_page_url(response.url, next_page),
+                callback=callback,
+                priority=self.search_priority - next_page
+            )
+            for next_page in range(first_page, last_page + 1)
+        ]
+
+    def _search_page_url(self, url, page):
+        """Get url of the search page with given number."""
+        url = canonical_url(url)
+        if SEARCH_RESULTS_PATH in url:
+            start = (page - 1) * self.search_results_count
+            return add_or_replace_parameter(url, 'start', str(start))
+        return add_or_replace_parameter(url, 'page', str(page))
+
+    @staticmethod
+    def _get_page_count(response):
+        """Get total number of search pages."""
+        per_page = len(response.css('#search_result_container '
+                                    'a[href*="/app/"]'))
+        total_text = ' '.join(
+            response.css('.search_pagination_left ::text').extract()
+        )
+        total_match = re.search(r'of\s+([\d,]+)', total_text)
+        if per_page and total_match:
+            total_count = int(total_match.group(1).replace(',', ''))
+            return math.ceil(total_count / per_page)
+
+        pages = [search_page_from_url(url) for url in response.css(
+            '.search_pagination_right a::attr(href)'
+        ).extract()]
+        pages = [page for page in pages if page is not None]
+        return max(pages) if pages else None
+
+    def _estimate_last_page(self, response, page):
+        """Estimate the last relevant page by release dates on the page."""
+        days_earlier = self.item_context.get('DAYS_EARLIER')
+        release_dates = [
+            self.parse_release_date(release_date_str, self.date_context)
+            for release_date_str in
+            response.css('div.search_released::text').extract()
+        ]
+        release_dates = [release_date for release_date in release_dates
+                         if isinstance(release_date, datetime)]
+        if days_earlier is None or not release_dates:
+            return page
+
+        oldest = min(release_dates)
+        days_left = days_earlier - (datetime.now() - oldest).days
+        if days_left <= 0:
+            return page
+        games_per_day = (len(release_dates) /
+                         ((max(release_dates) - oldest).days + 1))
+        pages_left = (days_left * games_per_day * self.fanout_margin /
+                      len(release_dates))
+        return page + math.ceil(pages_left)
 
     def parse_game(self, response):
         """Method for parsing game."""
-        # if there is age checking form, than our cookies broke
+        # redirect to age check is followed, only if AgeCheckMiddleware
+        # is disabled
         if '/agecheck/app' in response.url:
-            # TODO: add logging
-            print("--------COOKIES BROKEN--------")
+            logger.warning("Game page %s is redirected to age check",
+                           response.meta.get('redirect_urls',
+                                             [response.url])[0])
+            self.crawler.stats.inc_value('agecheck/failed')
+            self._shard_done(self._find_id_by_url(response.url), failed=True)
 
         # if other case, process the page
         else:
-            loader = GameItemLoader(item=Game(), response=response)
-
             game_id = self._find_id_by_url(response.url)
-            loader.add_value('game_id', game_id)
+            # values collected from appdetails for this game
+            game_values = response.meta.get('game_values', {})
+            if self.parse_pool:
+                yield RawGame(url=response.url, body=response.body,
+                              encoding=response.encoding, game_id=game_id,
+                              game_values=game_values)
+                return
+
+            game = load_game(self.extractor, response, game_id, game_values,
+                             fields=self.selectors, metrics=self.metrics,
+                             context=self.item_context,
+                             stats=self.crawler.stats)
+            yield self._save_game_state(game, canonical_url(response.url))
+
+    def parse_appdetails(self, response):
+        """Method for parsing game from appdetails json.
+
+        Game page is requested after that, if there are fields to collect,
+        that json doesn't contain.
+        """
+        game_id = response.meta['game_id']
+        details = json.loads(response.text).get(str(game_id)) or {}
+        if not details.get('success'):
+            logger.warning("No appdetails for game %s", game_id)
+            self.crawler.stats.inc_value('appdetails/failed')
+            self._shard_done(game_id, failed=True)
+            return None
+
+        game_values = self._get_appdetails_values(details['data'])
+        if self.appdetails_html_fields:
+            return Request(
+                response.meta['game_url'],
+                callback=self.parse_game,
+                # errback of rules needs rule in meta, failed game page
+                # is handled by the spider itself
+                errback=self.game_failed,
+                meta=dict(game_values=game_values, game_id=game_id,
+                          shard_claimed=response.meta.get('shard_claimed'))
+            )
+
+        loader = GameItemLoader(item=Game(), response=response,
+                                metrics=self.metrics, stats=self.crawler.stats,
+                                **self.item_context)
+        loader.add_value('game_id', game_id)
+        for field, values in game_values.items():
+            loader.add_value(field, values)
+        return self._save_game_state(loader.load_item(),
+                                     canonical_url(response.meta['game_url']))
+
+    @staticmethod
+    def _get_appdetails_values(data):
+        """Get raw values of game fields from appdetails data.
+
+        Values are in the same form, as selectors extract from game page,
+        so they pass through the same processors.
+        """
+        values = {
+            'title': [data.get('name')],
+            'release_date': [data.get('release_date', {}).get('date')],
+            'description': [
+                '<div id="game_area_description">{}</div>'.format(
+                    data.get('about_the_game', '')
+                )
+            ],
+            'specs': [category['description']
+                      for category in data.get('categories', [])],
+        }
+        if 'price_overview' in data:
+            values['price'] = [str(data['price_overview']['final'])]
+
+        requirements = data.get('pc_requirements')
+        if isinstance(requirements, dict):
+            html = (requirements.get('minimum', '') +
+                    requirements.get('recommended', ''))
+            values['system_requirements'] = Selector(text=html).css(
+                '::text'
+            ).extract()
+
+        return values
+
+    def _is_game_fresh(self, game_id):
+        """Check if the game was crawled recently and can be skipped."""
+        if self.crawl_state is None or self.full or game_id is None:
+            return False
+        return self.crawl_state.is_fresh(game_id, time.time())
+
+    def _save_game_state(self, game, url=None):
+        """Save fetching of the game into crawl state and recrawl queue.
+
+        Crawl state is updated, when the game is stored by pipelines.
+
+        :param url: canonical url of the game page (to refetch the game)
+        """
+        if self.crawl_state is not None and game.get('game_id') is not None:
+            self.stored_games.add(game['game_id'],
+                                  (game_content_hash(game), time.time()))
+        if self.recrawl_queue is not None and \
+                game.get('game_id') is not None:
+            changed = self.recrawl_queue.update(
+                game['game_id'], game.get('price'), game.get('num_reviews'),
+                game.get('release_date'), time.time(), url
+            )
+            self.crawler.stats.inc_value('recrawl/tracked')
+            for field in changed:
+                self.crawler.stats.inc_value(
+                    'recrawl/changed/{}'.format(field)
+                )
+        self._shard_done(game.get('game_id'))
+        return game
+
+    def _save_crawl_state(self, game_id, state):
+        """Save fetching of the stored game into crawl state."""
+        content_hash, fetched_at = state
+        changed = self.crawl_state.update(game_id, content_hash, fetched_at)
+        self.crawler.stats.inc_value(
+            'crawlstate/changed' if changed else 'crawlstate/unchanged'
+        )
 
-            for field, selector in self.selectors:
-                loader.add_css(field, selector)
+    def game_failed(self, failure):
+        """Errback of claimed games, game is not claimed again."""
+        request = failure.request
+        self._shard_done(request.meta.get('game_id') or
+                         app_id_from_url(request.url), failed=True)
 
-            yield loader.load_item()
+    def _shard_done(self, game_id, failed=False):
+        """Mark claimed game as done in the shared queue."""
+        if self.shard_queue is not None and game_id is not None:
+            self.shard_queue.done(game_id, failed)
+            self.crawler.stats.inc_value(
+                'sharding/failed' if failed else 'sharding/done'
+            )
+            # next batch is claimed before the current one is done,
+            # so the worker doesn't wait for the slowest requests
+            self.shard_claimed -= 1
+            if self.shard_claimed == self.shard_batch_size // 2:
+                self._claim_games(time.time())
 
     @staticmethod
-    def _find_id_by_url(response):
+    def _find_id_by_url(url):
         """Finding id of game in game url."""
-        return int(re.search(r'.+/(\d+)/.+', response.url).group(0))
+        return app_id_from_url(url)
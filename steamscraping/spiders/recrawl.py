@@ -0,0 +1,80 @@
+import time
+
+from scrapy import Request
+from scrapy.exceptions import NotConfigured
+
+from steamscraping.spiders.game import GameParser
+from steamscraping.urls import app_id_from_url
+
+
+class RecrawlParser(GameParser):
+    """Spider for refetching of tracked games from recrawl queue.
+
+    Games, that are due, are requested in order of priority of the queue
+    by their canonical urls (games tracked without url are requested by
+    /app/<id>/, which is redirected) and parsed by parse_game, so the
+    queue is updated with their new prices and num of reviews. Requests
+    are scheduled lazily (as the downloader takes them), no requests are
+    scheduled after the time budget, so the most overdue games are
+    refetched first and the rest are left for the next run.
+    """
+    name = 'recrawl'
+    rules = ()
+    custom_settings = {
+        'RECRAWL_ENABLED': True,
+        # all games of the queue are discovered already
+        'SHARDING_ENABLED': False,
+    }
+    game_url = '{store_url}/app/{app_id}/'
+
+    # games are requested, even if they are fresh in crawl state
+    full = True
+    batch_size = 1000
+    time_budget = 30 * 60
+
+    @classmethod
+    def from_crawler(cls, crawler, *args, **kwargs):
+        if not crawler.settings.getbool('RECRAWL_ENABLED'):
+            raise NotConfigured("Recrawl spider needs RECRAWL_ENABLED")
+        spider = super().from_crawler(crawler, *args, **kwargs)
+        spider.batch_size = crawler.settings.getint('RECRAWL_BATCH_SIZE',
+                                                    cls.batch_size)
+        spider.time_budget = crawler.settings.getfloat('RECRAWL_TIME_BUDGET',
+                                                       cls.time_budget)
+        # filters of new games (DAYS_EARLIER, REVIEWS_TO_PASS) are not
+        # applied, tracked games get older, but they are still updated
+        spider.item_context = {'LANGUAGE': spider.item_context['LANGUAGE']}
+        return spider
+
+    def start_requests(self):
+        queue = self.recrawl_queue
+        stats = self.crawler.stats
+        now = time.time()
+        deadline = now + self.time_budget
+        stats.set_value('recrawl/pruned', queue.prune(now))
+        games = queue.due_games(now, self.batch_size)
+        stats.set_value('recrawl/due', queue.count_due(now))
+        for index, (game_id, url) in enumerate(games):
+            if self.time_budget and time.time() >= deadline:
+                stats.set_value('recrawl/deferred', len(games) - index)
+                return
+            request = self.process_game_request(Request(
+                url or self.game_url.format(store_url=self.store_url,
+                                            app_id=game_id),
+                callback=self.parse_game, errback=self.game_failed,
+                # order of the queue is kept by the scheduler
+                priority=-index
+            ))
+            if request is not None:
+                stats.inc_value('recrawl/scheduled')
+                yield request
+
+    def game_failed(self, failure):
+        """Errback of refetched games, game is due again after interval."""
+        super().game_failed(failure)
+        request = failure.request
+        game_id = (request.meta.get('game_id') or
+                   app_id_from_url(request.url))
+        if game_id is not None:
+            self.recrawl_queue.postpone(game_id, time.time())
+            self.crawler.stats.inc_value('recrawl/failed')
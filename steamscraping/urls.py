@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""Helpers for working with steam store urls."""
+
+import re
+from typing import Union
+
+from w3lib.url import url_query_cleaner, url_query_parameter
+
+APP_ID_RE = re.compile(r'/app/(\d+)')
+SEARCH_PAGE_RE = re.compile(r'/search/.*[?&]page=(\d+)')
+SEARCH_RESULTS_PATH = '/search/results/'
+
+
+def canonical_url(url: str) -> str:
+    """Remove parameters, which don't change the page (snr)."""
+    return url_query_cleaner(url, ['snr'], remove=True)
+
+
+def app_id_from_url(url: str) -> Union[int, None]:
+    """Get id of the game from its store url.
+
+    :param url: url like https://store.steampowered.com/app/620/Portal_2/
+
+    :return: id of the game if url points to the game, otherwise None
+    """
+    match = APP_ID_RE.search(url)
+    if match is None:
+        return None
+    return int(match.group(1))
+
+
+def search_page_from_url(url: str) -> Union[int, None]:
+    """Get number of search page from its url.
+
+    Pages of json search results are numbered by start and count
+    parameters: start=200&count=100 is the third page.
+
+    :param url: url like https://store.steampowered.com/search/?page=2
+
+    :return: number of the page if url points to search page with
+             page parameter, otherwise None
+    """
+    match = SEARCH_PAGE_RE.search(url)
+    if match is not None:
+        return int(match.group(1))
+    if SEARCH_RESULTS_PATH in url:
+        start = url_query_parameter(url, 'start', '')
+        count = url_query_parameter(url, 'count', '')
+        if start.isdigit() and count.isdigit() and int(count):
+            return int(start) // int(count) + 1
+    return None
@@ -1,28 +1,133 @@
+import json
 import os
 
-from scrapy.http import TextResponse, Request
+from scrapy.http import TextResponse, HtmlResponse, Request
 
-from steamscraping.settings import APP_DIR
+from app_config import APP_DIR
 
 
-def fake_response_from_file(file_name, url=None):
+def fake_response_from_file(file_name, url=None, meta=None,
+                            response_class=TextResponse):
     """Create a Scrapy fake HTTP response from a HTML file.
 
     :param file_name: The relative filename from the responses directory,
                       but absolute paths are also accepted.
     :param url: The URL of the response.
+    :param meta: meta of the request for the response.
+    :param response_class: class of the response.
 
     :returns: A scrapy HTTP response which can be used for unittesting.
     """
     if not url:
         url = 'https://store.steampowered.com'
 
-    request = Request(url=url)
+    request = Request(url=url, meta=meta)
     file_path = os.path.join(APP_DIR, 'tests', 'responses', file_name)
     file_content = open(file_path, 'r').read()
 
-    response = TextResponse(url=url, request=request, body=file_content,
-                            encoding='utf-8')
+    response = response_class(url=url, request=request, body=file_content,
+                              encoding='utf-8')
     return response
 
 
+SEARCH_URL = ('https://store.steampowered.com/search/'
+              '?sort_by=Released_DESC&category1=998')
+
+SEARCH_RESULTS_URL = ('https://store.steampowered.com/search/results/'
+                      '?sort_by=Released_DESC&category1=998&infinite=1'
+                      '&start=0&count=100')
+
+SEARCH_ROW = '''
+<a href="https://store.steampowered.com/app/{app_id}/Game_{app_id}/?snr=1_7_7_230_150_{page}"
+   data-ds-appid="{app_id}" class="search_result_row ds_collapse_flag">
+    <div class="col search_capsule"></div>
+    <div class="responsive_search_name_combined">
+        <div class="col search_name ellipsis">
+            <span class="title">Game {app_id}</span>
+        </div>
+        <div class="col search_released responsive_secondrow">{release_date}</div>
+        <div class="col search_reviewscore responsive_secondrow">
+            <span class="search_review_summary positive"
+                  data-tooltip-html="Very Positive&lt;br&gt;92% of the {num_reviews:,} user reviews for this game are positive.">
+            </span>
+        </div>
+    </div>
+</a>
+'''
+
+
+def fake_search_page(page, release_dates, page_count, num_reviews=None,
+                     per_page=25):
+    """Create a Scrapy fake HTTP response with page of search results.
+
+    :param page: number of the page
+    :param release_dates: release dates of games on the page
+    :param page_count: total number of pages
+    :param num_reviews: num of reviews of games on the page
+    :param per_page: number of games on full page
+
+    :returns: A scrapy HTTP response which can be used for unittesting.
+    """
+    rows = _search_rows(page, release_dates, num_reviews)
+    # steam shows links to neighbour pages, to the last page and to the next
+    links = sorted({1, page - 2, page - 1, page + 1, page + 2, page_count})
+    pagination = ''.join(
+        '<a href="{}&page={}">{}</a> '.format(SEARCH_URL, link, link)
+        for link in links if 1 <= link <= page_count and link != page
+    )
+    if page < page_count:
+        pagination += '<a href="{}&page={}">&gt;</a>'.format(SEARCH_URL,
+                                                              page + 1)
+    total_count = page_count * per_page
+    body = '''
+    <html><body>
+    <div id="search_result_container">
+        <div id="search_resultsRows">{rows}</div>
+        <div class="search_pagination">
+            <div class="search_pagination_left">
+                showing {first} - {last} of {total_count}
+            </div>
+            <div class="search_pagination_right">{pagination}</div>
+        </div>
+    </div>
+    </body></html>
+    '''.format(rows=rows, pagination=pagination, total_count=total_count,
+               first=(page - 1) * per_page + 1,
+               last=min(page * per_page, total_count))
+
+    url = SEARCH_URL if page == 1 else '{}&page={}'.format(SEARCH_URL, page)
+    return HtmlResponse(url=url, request=Request(url=url), body=body,
+                        encoding='utf-8')
+
+
+def fake_search_results(page, release_dates, total_count, per_page=100):
+    """Create a Scrapy fake HTTP response with json search results.
+
+    :param page: number of the page (start = (page - 1) * per_page)
+    :param release_dates: release dates of games on the page
+    :param total_count: total number of games
+    :param per_page: number of games in one response
+
+    :returns: A scrapy HTTP response which can be used for unittesting.
+    """
+    start = (page - 1) * per_page
+    body = json.dumps({
+        'success': 1,
+        'results_html': _search_rows(page, release_dates),
+        'total_count': total_count,
+        'start': start,
+    })
+    url = SEARCH_RESULTS_URL.replace('start=0', 'start={}'.format(start))
+    return TextResponse(url=url, request=Request(url=url), body=body,
+                        encoding='utf-8')
+
+
+def _search_rows(page, release_dates, num_reviews=None):
+    if num_reviews is None:
+        num_reviews = [1000] * len(release_dates)
+    return ''.join(
+        SEARCH_ROW.format(app_id=page * 1000 + i, page=page,
+                          release_date=release_date, num_reviews=reviews)
+        for i, (release_date, reviews) in enumerate(zip(release_dates,
+                                                         num_reviews))
+    )
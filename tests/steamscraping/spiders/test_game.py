@@ -1,22 +1,36 @@
+from collections import deque
+from datetime import datetime, timedelta
 from unittest.mock import patch, MagicMock
 
 import pytest
 import freezegun
+from scrapy import Request
+from scrapy.exceptions import IgnoreRequest
+from scrapy.utils.test import get_crawler
+from twisted.python.failure import Failure
 
-from steamscraping.spiders.game import GameParser, GameItemLoader
+from steamscraping.spiders.game import (GameParser, GameItemLoader,
+                                        num_reviews_from_tooltip)
 from steamscraping.items import Game
-from tests.conftest import fake_response_from_file
-from steamscraping import settings
+from steamscraping.middlewares import SearchCutoffMiddleware
+from steamscraping.urls import app_id_from_url, search_page_from_url
+from tests.conftest import (fake_response_from_file, fake_search_page,
+                            fake_search_results, SEARCH_URL,
+                            SEARCH_RESULTS_URL)
+
+# item settings of crawls in tests
+ITEM_SETTINGS = {'DAYS_EARLIER': 20, 'REVIEWS_TO_PASS': 500}
+
+
+def create_spider(**settings_dict):
+    """Create spider of the crawler with item settings of tests."""
+    crawler = get_crawler(GameParser, dict(ITEM_SETTINGS, **settings_dict))
+    return crawler._create_spider()
 
 
 class TestParsePage:
     """Test class for testing parsing page."""
-    spider = GameParser()
-
-    @staticmethod
-    def setup_class():
-        """Set up class before using it."""
-        settings.DAYS_EARLIER = 1
+    spider = create_spider(DAYS_EARLIER=1)
 
     @freezegun.freeze_time('2019-08-18')
     @pytest.mark.parametrize('test_input, expected',
@@ -33,12 +47,7 @@ class TestParsePage:
 
 class TestParseGame:
     """Test class for testing parsing game."""
-    spider = GameParser()
-
-    @staticmethod
-    def setup_class():
-        """Set up class before using it."""
-        settings.DAYS_EARLIER = 1
+    spider = create_spider(DAYS_EARLIER=1)
 
     @pytest.mark.parametrize('test_input, expected',
                              [('title_1.html', 'Portal 2'),
@@ -52,3 +61,380 @@ class TestParseGame:
         loader.add_css('title', GameParser.selectors['title'])
         result = loader.load_item()
         assert result['title'] == expected
+
+
+class TestParseAppdetails:
+    """Test class for testing parsing game from appdetails json."""
+    game_url = 'https://store.steampowered.com/app/620/Portal_2/'
+
+    @staticmethod
+    def create_spider(**settings_dict):
+        crawler = get_crawler(GameParser, settings_dict)
+        return crawler._create_spider()
+
+    def parse_html_game(self):
+        spider = self.create_spider(GAME_EXTRACTION_MODE='html')
+        response = fake_response_from_file('app_620.html', self.game_url)
+        return next(spider.parse_game(response))
+
+    def test_request(self):
+        """Test, that game request is replaced by appdetails request."""
+        spider = self.create_spider(GAME_EXTRACTION_MODE='appdetails')
+        request = spider.process_game_request(Request(self.game_url))
+        assert '/api/appdetails/?appids=620' in request.url
+        assert request.callback == spider.parse_appdetails
+        assert request.meta['game_url'] == self.game_url
+
+    def test_same_item(self):
+        """Test, that both modes give the same game."""
+        spider = self.create_spider(GAME_EXTRACTION_MODE='appdetails')
+        request = spider.process_game_request(Request(self.game_url))
+        response = fake_response_from_file('appdetails_620.json',
+                                           request.url, request.meta)
+        html_request = spider.parse_appdetails(response)
+        assert html_request.url == self.game_url
+
+        response = fake_response_from_file('app_620.html', self.game_url,
+                                           html_request.meta)
+        game = next(spider.parse_game(response))
+        expected = self.parse_html_game()
+
+        assert game['title'] == 'Portal 2'
+        assert game['tags'] == ['Puzzle', 'Co-op', 'First-Person', 'Sci-fi']
+        assert game['system_requirements'].min_os == 'Windows 7 / Vista / XP'
+        assert dict(game) == dict(expected)
+
+    def test_game_failed(self):
+        """Test, that failed game page of appdetails request is handled by
+        the spider."""
+        spider = self.create_spider(GAME_EXTRACTION_MODE='appdetails')
+        request = spider.process_game_request(Request(
+            self.game_url, errback=spider._errback, meta={'rule': 0}
+        ))
+        response = fake_response_from_file('appdetails_620.json',
+                                           request.url, request.meta)
+        html_request = spider.parse_appdetails(response)
+        assert html_request.errback == spider.game_failed
+        assert html_request.meta['game_id'] == 620
+
+        failure = Failure(ConnectionRefusedError())
+        failure.request = html_request
+        assert html_request.errback(failure) is None
+
+    def test_store_url(self):
+        """Test crawling of other store, e.g. local mock store."""
+        spider = get_crawler(GameParser, {
+            'GAME_EXTRACTION_MODE': 'appdetails'
+        })._create_spider(store_url='http://127.0.0.1:8000/')
+        assert spider.start_urls == ['http://127.0.0.1:8000/search/'
+                                     '?sort_by=Released_DESC&category1=998']
+        assert spider.allowed_domains == ['127.0.0.1']
+        request = spider.process_game_request(
+            Request('http://127.0.0.1:8000/app/620/Portal_2/')
+        )
+        assert request.url.startswith('http://127.0.0.1:8000/api/appdetails/')
+
+    def test_without_html(self):
+        """Test, that game page is not requested without html fields."""
+        spider = self.create_spider(GAME_EXTRACTION_MODE='appdetails',
+                                    APPDETAILS_HTML_FIELDS=[])
+        request = spider.process_game_request(Request(self.game_url))
+        response = fake_response_from_file('appdetails_620.json',
+                                           request.url, request.meta)
+        game = spider.parse_appdetails(response)
+        expected = self.parse_html_game()
+
+        assert 'tags' not in game
+        for field in ('game_id', 'title', 'price', 'specs', 'description'):
+            assert game[field] == expected[field]
+
+
+def crawl_parse(self, response):
+    """Parse search page like CrawlSpider.parse does it."""
+    return (list(self.parse_start_url(response)) +
+            list(self._requests_to_follow(response)))
+
+
+class SearchCrawl:
+    """Crawl of search pages in order of scheduling."""
+    page_count = 40
+    per_page = 25
+
+    def release_dates(self, page):
+        """Ten games are released every day, the newest are on first page."""
+        first = (page - 1) * self.per_page
+        return [
+            (datetime(2019, 8, 18) - timedelta(days=i // 10))
+            .strftime('%d %b, %Y')
+            for i in range(first, first + self.per_page)
+        ]
+
+    def crawl(self, spider):
+        """Crawl search pages.
+
+        :return: numbers of downloaded pages and numbers of pages,
+                 that were scheduled from each page
+        """
+        middleware = SearchCutoffMiddleware(spider.crawler.stats)
+        queue = deque([Request(SEARCH_URL)])
+        seen = {SEARCH_URL, SEARCH_URL + '&page=1'}
+        downloaded = []
+        scheduled = {}
+        while queue:
+            request = queue.popleft()
+            try:
+                middleware.process_request(request, spider)
+            except IgnoreRequest:
+                continue
+            page = search_page_from_url(request.url) or 1
+            downloaded.append(page)
+            response = fake_search_page(page, self.release_dates(page),
+                                        self.page_count)
+            if page == 1:
+                results = spider.parse(response)
+            else:
+                results = spider.parse_page(response) or []
+            for request in results:
+                # game requests, which are dropped by process_request, are
+                # None (they are ignored by the engine)
+                if request is None or search_page_from_url(request.url) is None:
+                    continue
+                if request.url not in seen:
+                    seen.add(request.url)
+                    queue.append(request)
+                    scheduled.setdefault(page, []).append(
+                        search_page_from_url(request.url)
+                    )
+        return downloaded, scheduled
+
+
+class TestPaginationCutoff(SearchCrawl):
+    """Test class for testing stopping pagination after too old pages."""
+
+    @freezegun.freeze_time('2019-08-18')
+    @patch('steamscraping.spiders.game.GameParser.parse', crawl_parse)
+    def test_cutoff(self):
+        """Test, that pages after the first too old page are not requested."""
+        spider = create_spider(SEARCH_FANOUT_ENABLED=False)
+        downloaded, _ = self.crawl(spider)
+
+        # games of 21 days (including today) fill 9 pages,
+        # 10th page is the first too old
+        assert spider.cutoff_page == 10
+        assert sorted(downloaded) == list(range(1, 11)) + [self.page_count]
+        assert spider.crawler.stats.get_value('pagination/dropped') == 1
+
+    @freezegun.freeze_time('2019-08-18')
+    @patch('steamscraping.spiders.game.GameParser.parse', crawl_parse)
+    @patch('steamscraping.spiders.game.GameParser._set_cutoff_page',
+           MagicMock())
+    def test_without_cutoff(self):
+        """Test, that pages linked from relevant pages are requested."""
+        spider = create_spider(SEARCH_FANOUT_ENABLED=False)
+        downloaded, _ = self.crawl(spider)
+        assert sorted(downloaded) == list(range(1, 12)) + [self.page_count]
+
+
+class TestSearchFanout(SearchCrawl):
+    """Test class for testing scheduling of search pages at once."""
+
+    @freezegun.freeze_time('2019-08-18')
+    @patch('steamscraping.spiders.game.GameParser.parse', crawl_parse)
+    def test_fanout(self):
+        """Test, that relevant pages are scheduled from the first page."""
+        spider = create_spider()
+        downloaded, scheduled = self.crawl(spider)
+
+        assert spider.page_count == self.page_count
+        assert downloaded == list(range(1, 11))
+        assert scheduled == {1: list(range(2, 11))}
+
+    @freezegun.freeze_time('2019-08-18')
+    @patch('steamscraping.spiders.game.GameParser.parse', crawl_parse)
+    def test_priority(self):
+        """Test, that search pages are requested before games."""
+        spider = create_spider(SEARCH_PREFILTER_ENABLED=False)
+        requests = [request for request in spider.parse(
+            fake_search_page(1, ['18 Aug, 2019'] * 25, self.page_count)
+        ) if request is not None]
+        pages = [request.priority for request in requests
+                 if search_page_from_url(request.url)]
+        games = [request.priority for request in requests
+                 if app_id_from_url(request.url)]
+        assert pages and games
+        assert min(pages) > max(games)
+        # earlier pages go first
+        assert pages == sorted(pages, reverse=True)
+
+    @freezegun.freeze_time('2019-08-18')
+    @patch('steamscraping.spiders.game.GameParser.parse', crawl_parse)
+    def test_extend(self):
+        """Test, that pages are scheduled while the last page is relevant."""
+        spider = create_spider(SEARCH_FANOUT_MARGIN=0.5)
+        downloaded, scheduled = self.crawl(spider)
+
+        assert downloaded == list(range(1, 11))
+        assert scheduled[1] == [2, 3, 4]
+        assert spider.scheduled_pages == 10
+
+
+class TestSearchResults(SearchCrawl):
+    """Test class for testing discovery of games by json search results."""
+    page_count = 10
+    per_page = 100
+
+    @staticmethod
+    def create_spider(**settings_dict):
+        settings_dict.setdefault('SEARCH_MODE', 'json')
+        return create_spider(**settings_dict)
+
+    def crawl_results(self, spider):
+        """Crawl json search results.
+
+        :return: numbers of downloaded pages and number of game requests
+        """
+        middleware = SearchCutoffMiddleware(spider.crawler.stats)
+        queue = deque(spider.start_requests())
+        downloaded = []
+        games = 0
+        while queue:
+            request = queue.popleft()
+            try:
+                middleware.process_request(request, spider)
+            except IgnoreRequest:
+                continue
+            page = search_page_from_url(request.url)
+            downloaded.append(page)
+            response = fake_search_results(page, self.release_dates(page),
+                                           self.page_count * self.per_page)
+            for request in spider.parse_search_results(response):
+                if request.callback == spider.parse_search_results:
+                    queue.append(request)
+                else:
+                    games += 1
+        return downloaded, games
+
+    def test_start_requests(self):
+        """Test, that search starts from json results."""
+        spider = self.create_spider()
+        request, = spider.start_requests()
+        assert request.url == SEARCH_RESULTS_URL
+        assert search_page_from_url(request.url) == 1
+
+    @freezegun.freeze_time('2019-08-18')
+    def test_parse(self):
+        """Test parsing of saved search results."""
+        spider = self.create_spider(SEARCH_PREFILTER_ENABLED=False)
+        response = fake_response_from_file('search_results_0.json',
+                                           SEARCH_RESULTS_URL)
+        requests = list(spider.parse_search_results(response))
+
+        pages = [request for request in requests
+                 if request.callback == spider.parse_search_results]
+        games = [request for request in requests
+                 if request.callback == spider.parse_game]
+        assert spider.page_count == 5
+        assert [search_page_from_url(request.url) for request in pages] == [2]
+        assert 'start=100&count=100' in pages[0].url
+        assert len(games) == 5
+        assert app_id_from_url(games[0].url) == 1100000
+
+    @freezegun.freeze_time('2019-08-18')
+    def test_crawl(self):
+        """Test, that cutoff and fan-out work like for html pages."""
+        spider = self.create_spider()
+        downloaded, games = self.crawl_results(spider)
+
+        assert downloaded == [1, 2, 3, 4]
+        assert spider.cutoff_page == 4
+        # games of 21 days, older games of the 3rd page are not requested
+        assert games == 210
+
+    @freezegun.freeze_time('2019-08-18')
+    def test_crawl_without_fanout(self):
+        """Test, that results are requested one by one without fan-out."""
+        spider = self.create_spider(SEARCH_FANOUT_ENABLED=False)
+        downloaded, games = self.crawl_results(spider)
+
+        assert downloaded == [1, 2, 3, 4]
+        assert spider.cutoff_page == 4
+        # games of 21 days, older games of the 3rd page are not requested
+        assert games == 210
+
+
+class TestSearchPrefilter:
+    """Test class for testing filtering of games by search rows."""
+
+    def test_date_stats(self):
+        """Test, that unparsed dates are counted by their own crawler."""
+        first, second = create_spider(), create_spider()
+        response = fake_search_page(1, ['Coming soon', '18 Aug, 2019'], 1)
+        first._get_search_rows(response)
+        assert first.crawler.stats.get_value('release_date/unparsed') == 1
+        assert second.crawler.stats.get_value('release_date/unparsed') is None
+
+    @pytest.mark.parametrize('tooltip, expected', [
+        ('Very Positive<br>92% of the 1,234 user reviews for this game '
+         'are positive.', 1234),
+        ('Очень положительные<br>92% из 1 234 обзоров пользователей '
+         'положительные.', 1234),
+        ('Sehr positiv<br>92 % der 1.234.567 Nutzerreviews sind positiv.',
+         1234567),
+        ('Très positives<br>92 % des 1\u00a0234 évaluations sont '
+         'positives.', 1234),
+        ('Positive<br>80% of the 15 user reviews are positive.', 15),
+        ('No user reviews', None),
+    ])
+    def test_num_reviews(self, tooltip, expected):
+        """Test number of reviews with thousands separators of languages."""
+        assert num_reviews_from_tooltip(tooltip) == expected
+
+    @freezegun.freeze_time('2019-08-18')
+    @pytest.mark.parametrize('reviews_to_pass, expected', [
+        (500, [1100040]),
+        (200, [1100010, 1100020, 1100040]),
+    ])
+    def test_results(self, reviews_to_pass, expected):
+        """Test filtering of json search results."""
+        spider = create_spider(SEARCH_MODE='json',
+                               REVIEWS_TO_PASS=reviews_to_pass)
+        response = fake_response_from_file('search_results_0.json',
+                                           SEARCH_RESULTS_URL)
+        games = [app_id_from_url(request.url)
+                 for request in spider.parse_search_results(response)
+                 if request.callback == spider.parse_game]
+        assert games == expected
+        stats = spider.crawler.stats
+        assert stats.get_value('prefilter/passed') == len(expected)
+        # 3 Jul is too old, "Coming soon" is not filtered by date
+        assert stats.get_value('prefilter/too_old') == 1
+        assert stats.get_value('prefilter/few_reviews') == \
+            4 - len(expected)
+
+    @freezegun.freeze_time('2019-08-18')
+    @patch('steamscraping.spiders.game.GameParser.parse', crawl_parse)
+    def test_page(self):
+        """Test filtering of links of html search page."""
+        spider = create_spider()
+        response = fake_search_page(1, ['18 Aug, 2019'] * 2 +
+                                    ['1 Jul, 2019'], 1,
+                                    num_reviews=[499, 500, 1000])
+        requests = [request for request in spider.parse(response)
+                    if request is not None and
+                    app_id_from_url(request.url) is not None]
+        assert [app_id_from_url(request.url) for request in requests] == \
+            [1001]
+        assert spider.crawler.stats.get_value('prefilter/too_old') == 1
+        assert spider.crawler.stats.get_value('prefilter/few_reviews') == 1
+
+    @freezegun.freeze_time('2019-08-18')
+    @patch('steamscraping.spiders.game.GameParser.parse', crawl_parse)
+    def test_disabled(self):
+        """Test, that all games are requested without prefilter."""
+        spider = create_spider(SEARCH_PREFILTER_ENABLED=False)
+        response = fake_search_page(1, ['18 Aug, 2019', '1 Jul, 2019'], 1,
+                                    num_reviews=[10, 10])
+        requests = [request for request in spider.parse(response)
+                    if request is not None and
+                    app_id_from_url(request.url) is not None]
+        assert len(requests) == 2
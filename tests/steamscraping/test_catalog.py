@@ -0,0 +1,112 @@
+from datetime import datetime, date
+
+import pytest
+from scrapy.exceptions import NotConfigured
+from scrapy.utils.test import get_crawler
+
+from steamscraping.catalog import CatalogIndex
+from steamscraping.items import Game, GameDiff
+from steamscraping.pipelines import CatalogPipeline
+
+
+@pytest.fixture
+def catalog():
+    catalog = CatalogIndex()
+    catalog.add(10, {'price': 999, 'release_date': datetime(2020, 5, 1),
+                     'num_reviews': 1000, 'tags': ['Roguelike', 'Indie'],
+                     'specs': ['Single-player', 'Full controller support']})
+    catalog.add(20, {'price': 1999, 'release_date': datetime(2021, 1, 10),
+                     'num_reviews': 50, 'tags': ['Roguelike', 'Action'],
+                     'specs': ['Single-player']})
+    catalog.add(30, {'price': 0, 'release_date': 'Coming soon',
+                     'tags': ['Indie'],
+                     'specs': ['Full controller support']})
+    catalog.add(40, {'price': 499, 'release_date': datetime(2019, 3, 3),
+                     'num_reviews': 5000, 'tags': ['Action'],
+                     'specs': ['Single-player', 'Full controller support']})
+    return catalog
+
+
+class TestCatalogIndex:
+    """Test class for testing queries of the catalog index."""
+
+    def test_terms(self, catalog):
+        assert catalog.query(tags=['Roguelike']) == [10, 20]
+        assert catalog.query(tags=['roguelike'],
+                             specs=['full controller support']) == [10]
+        assert catalog.query(tags=['Roguelike', 'Unknown']) == []
+        assert catalog.query() == [10, 20, 30, 40]
+
+    def test_ranges(self, catalog):
+        assert catalog.query(price=(None, 999)) == [10, 30, 40]
+        assert catalog.query(price=(500, 999)) == [10]
+        assert catalog.query(release_date=(date(2020, 1, 1), None)) == [10, 20]
+        # games without the value don't match any range
+        assert catalog.query(num_reviews=(0, None)) == [10, 20, 40]
+        assert catalog.query(specs=['Single-player'], price=(None, 999),
+                             num_reviews=(100, None)) == [10, 40]
+
+    def test_order(self, catalog):
+        assert catalog.query(order_by='price') == [30, 40, 10, 20]
+        assert catalog.query(order_by='-num_reviews', limit=3) == [40, 10, 20]
+        assert catalog.query(tags=['Indie'], order_by='-release_date') == \
+            [10, 30]
+        assert catalog.count(tags=['Action']) == 2
+
+    def test_update(self, catalog):
+        catalog.query(price=(None, 999))
+        catalog.add(20, {'price': 799, 'tags': ['Action']}, partial=True)
+        assert catalog.query(price=(None, 999)) == [10, 20, 30, 40]
+        assert catalog.query(tags=['Roguelike']) == [10]
+        # not partial update removes missing fields
+        catalog.add(40, {'price': 499})
+        assert catalog.query(specs=['Single-player']) == [10, 20]
+        assert catalog.query(num_reviews=(0, None)) == [10, 20]
+        assert len(catalog) == 4
+        assert catalog.term_counts('tags') == {'Roguelike': 1, 'Indie': 2,
+                                               'Action': 1}
+
+    def test_save(self, catalog, tmp_path):
+        path = str(tmp_path / 'catalog' / 'catalog.idx')
+        catalog.save(path)
+        loaded = CatalogIndex.load(path)
+        assert len(loaded) == 4
+        assert loaded.query(tags=['roguelike'], price=(None, 999)) == [10]
+        assert loaded.query(order_by='-price') == [20, 10, 40, 30]
+        loaded.add(50, {'price': 100, 'tags': ['Indie']})
+        assert loaded.query(tags=['Indie'], price=(None, 100)) == [30, 50]
+
+        (tmp_path / 'other').write_bytes(b'other file')
+        with pytest.raises(ValueError):
+            CatalogIndex.load(str(tmp_path / 'other'))
+
+
+class TestCatalogPipeline:
+    """Test class for testing updates of the catalog by crawls."""
+
+    def test_pipeline(self, tmp_path):
+        path = str(tmp_path / 'catalog.idx')
+        crawler = get_crawler(settings_dict={'CATALOG_ENABLED': True,
+                                             'CATALOG_PATH': path})
+        pipeline = CatalogPipeline.from_crawler(crawler)
+        pipeline.open_spider(None)
+        game = Game(game_id=620, title='Portal 2', price=999,
+                    tags=['Puzzle'])
+        assert pipeline.process_item(game, None) is game
+        pipeline.process_item(GameDiff(game_id=620, changed={'price': 499}),
+                              None)
+        other = {'other': 1}
+        assert pipeline.process_item(other, None) is other
+        pipeline.close_spider(None)
+        assert crawler.stats.get_value('catalog/games') == 1
+
+        pipeline = CatalogPipeline.from_crawler(crawler)
+        pipeline.open_spider(None)
+        assert pipeline.catalog.query(tags=['Puzzle'],
+                                      price=(None, 499)) == [620]
+
+    def test_not_configured(self):
+        with pytest.raises(NotConfigured):
+            CatalogPipeline.from_crawler(get_crawler(settings_dict={
+                'CATALOG_ENABLED': False
+            }))
@@ -0,0 +1,171 @@
+import logging
+from datetime import datetime
+
+import pytest
+from scrapy import signals
+from scrapy.exceptions import DropItem, NotConfigured
+from scrapy.utils.test import get_crawler
+
+from steamscraping.changes import (FIELDS, FieldHashStore, UnchangedGame,
+                                   changed_fields, field_hashes)
+from steamscraping.items import Game, GameDiff, GameRequirements
+from steamscraping.logformatter import SteamLogFormatter
+from steamscraping.pipelines import ChangesPipeline, DatabasePipeline
+from steamscraping.signals import games_stored
+
+
+def make_game(**fields):
+    return Game(dict({
+        'game_id': 620, 'title': 'Portal 2', 'price': 999,
+        'num_reviews': 1000, 'release_date': datetime(2011, 4, 18),
+        'tags': ['Puzzle', 'Co-op'],
+        'system_requirements': GameRequirements(min_os='Windows 7',
+                                                min_ram='2 GB RAM'),
+    }, **fields))
+
+
+class TestFieldHashes:
+    """Test class for testing hashes of game fields."""
+
+    def test_stable(self):
+        """Test, that hashes don't depend on order and formatting."""
+        game = make_game()
+        same = make_game(system_requirements=GameRequirements(
+            min_ram='2  GB RAM ', min_os='Windows 7', rec_os=' '
+        ))
+        assert field_hashes(game) == field_hashes(Game(reversed(
+            list(same.items())
+        )))
+
+    def test_changed_fields(self):
+        old = field_hashes(make_game())
+        new = field_hashes(make_game(price=499, system_requirements=(
+            GameRequirements(min_os='Windows 10', min_ram='2 GB RAM')
+        )))
+        assert changed_fields(old, new) == ['price', 'system_requirements']
+        assert changed_fields(old, old) == []
+        assert changed_fields(None, new) == list(FIELDS)
+        # field is removed
+        game = make_game()
+        del game['num_reviews']
+        assert changed_fields(old, field_hashes(game)) == ['num_reviews']
+
+
+class TestFieldHashStore:
+    """Test class for testing store of field hashes."""
+
+    def test_persistence(self, tmp_path):
+        path = str(tmp_path / 'changes.db')
+        store = FieldHashStore(path)
+        assert store.get(620) is None
+        store.set(620, b'hashes')
+        assert store.get(620) == b'hashes'
+        store.close()
+
+        store = FieldHashStore(path)
+        assert store.get(620) == b'hashes'
+        store.close()
+
+
+class TestChangesPipeline:
+    """Test class for testing dropping of unchanged games."""
+
+    @staticmethod
+    def create_pipeline(tmp_path, mode, **settings):
+        crawler = get_crawler(settings_dict=dict({
+            'CHANGES_ENABLED': True,
+            'CHANGES_MODE': mode,
+            'CHANGES_PATH': str(tmp_path / 'changes.db'),
+        }, **settings))
+        return ChangesPipeline.from_crawler(crawler), crawler
+
+    @staticmethod
+    def process_stored(pipeline, crawler, item):
+        """Process the item, which passes all pipelines."""
+        result = pipeline.process_item(item, None)
+        crawler.signals.send_catch_log(signals.item_scraped, item=result,
+                                       response=None, spider=None)
+        return result
+
+    @staticmethod
+    def close(pipeline, crawler):
+        pipeline.close_spider(None)
+        crawler.signals.send_catch_log(signals.spider_closed, spider=None)
+
+    def test_drop(self, tmp_path):
+        """Test, that only new and changed games are passed."""
+        pipeline, crawler = self.create_pipeline(tmp_path, 'drop')
+        game = make_game()
+        assert self.process_stored(pipeline, crawler, game) is game
+        with pytest.raises(UnchangedGame):
+            pipeline.process_item(make_game(), None)
+        changed = make_game(price=499)
+        assert self.process_stored(pipeline, crawler, changed) is changed
+        other = {'other': 1}
+        assert pipeline.process_item(other, None) is other
+        self.close(pipeline, crawler)
+
+        # hashes are kept for the next crawl
+        pipeline, _ = self.create_pipeline(tmp_path, 'drop')
+        with pytest.raises(UnchangedGame):
+            pipeline.process_item(make_game(price=499), None)
+        pipeline.close_spider(None)
+        stats = crawler.stats
+
+        assert stats.get_value('changes/new') == 1
+        assert stats.get_value('changes/unchanged') == 1
+        assert stats.get_value('changes/changed') == 1
+        assert stats.get_value('changes/field/price') == 1
+
+    def test_not_stored(self, tmp_path):
+        """Test, that hashes are not saved, if the game is not stored."""
+        pipeline, crawler = self.create_pipeline(tmp_path, 'drop')
+        game = make_game()
+        pipeline.process_item(game, None)
+        crawler.signals.send_catch_log(signals.item_dropped, item=game,
+                                       response=None, spider=None,
+                                       exception=DropItem('failed'))
+        assert pipeline.process_item(game, None) is game
+        self.close(pipeline, crawler)
+
+    def test_database(self, tmp_path):
+        """Test, that hashes are saved, when games are in database."""
+        pipeline, crawler = self.create_pipeline(tmp_path, 'drop', **{
+            'ITEM_PIPELINES': {DatabasePipeline: 300}
+        })
+        self.process_stored(pipeline, crawler, make_game())
+        # game is not written yet
+        assert pipeline.process_item(make_game(), None)
+        crawler.signals.send_catch_log(games_stored, game_ids=[620])
+        with pytest.raises(UnchangedGame):
+            pipeline.process_item(make_game(), None)
+        self.close(pipeline, crawler)
+
+    def test_diff(self, tmp_path):
+        """Test, that only changed fields of the game are passed."""
+        pipeline, crawler = self.create_pipeline(tmp_path, 'diff')
+        self.process_stored(pipeline, crawler, make_game())
+        game = make_game(num_reviews=1200, tags=['Puzzle'])
+        del game['price']
+        diff = pipeline.process_item(game, None)
+        assert isinstance(diff, GameDiff)
+        assert diff['game_id'] == 620
+        assert diff['changed'] == {'num_reviews': 1200, 'price': None,
+                                   'tags': ['Puzzle']}
+        self.close(pipeline, crawler)
+
+    def test_not_configured(self, tmp_path):
+        with pytest.raises(NotConfigured):
+            ChangesPipeline.from_crawler(get_crawler(settings_dict={
+                'CHANGES_ENABLED': False
+            }))
+        with pytest.raises(NotConfigured):
+            self.create_pipeline(tmp_path, 'full')
+
+    def test_log_level(self):
+        """Test, that unchanged games are not logged as warnings."""
+        formatter = SteamLogFormatter()
+        assert formatter.dropped(make_game(), UnchangedGame('unchanged'),
+                                 None, None)['level'] == logging.DEBUG
+        assert formatter.dropped(make_game(), Exception('failed'),
+                                 None, None)['level'] == logging.WARNING
@@ -0,0 +1,114 @@
+import pytest
+from scrapy import Request, signals
+from scrapy.exceptions import DropItem
+from scrapy.utils.test import get_crawler
+
+from steamscraping.changes import UnchangedGame
+from steamscraping.crawlstate import CrawlState, game_content_hash
+from steamscraping.items import Game
+from steamscraping.spiders.game import GameParser
+
+HOUR = 60 * 60
+
+
+class TestCrawlState:
+    """Test class for testing state of crawled games."""
+
+    @pytest.fixture
+    def state(self, tmp_path):
+        state = CrawlState(str(tmp_path / 'state.db'),
+                           refresh_interval=HOUR, max_interval=4 * HOUR)
+        yield state
+        state.close()
+
+    def test_unknown_game(self, state):
+        """Test, that unknown game is not fresh."""
+        assert not state.is_fresh(1, now=0)
+        assert state.update(1, 'hash', now=0)
+        assert state.is_fresh(1, now=HOUR - 1)
+        assert not state.is_fresh(1, now=HOUR)
+
+    def test_backoff(self, state):
+        """Test, that unchanged game is requested more rarely."""
+        state.update(1, 'hash', now=0)
+        assert not state.update(1, 'hash', now=HOUR)
+        assert state.is_fresh(1, now=3 * HOUR - 1)
+        state.update(1, 'hash', now=3 * HOUR)
+        state.update(1, 'hash', now=7 * HOUR)
+        # interval doesn't grow more than max interval
+        assert not state.is_fresh(1, now=11 * HOUR)
+
+        # changed game is requested as a new one
+        assert state.update(1, 'new hash', now=11 * HOUR)
+        assert not state.is_fresh(1, now=12 * HOUR)
+
+    def test_persistence(self, tmp_path):
+        """Test, that state is kept between crawls."""
+        path = str(tmp_path / 'state.db')
+        state = CrawlState(path, refresh_interval=HOUR, max_interval=HOUR)
+        state.update(1, 'hash', now=0)
+        state.close()
+
+        state = CrawlState(path, refresh_interval=HOUR, max_interval=HOUR)
+        assert state.get(1).content_hash == 'hash'
+        state.close()
+
+    def test_content_hash(self):
+        """Test, that hash doesn't depend on fields order."""
+        first = Game(game_id=1, title='Portal 2', tags=['Puzzle'])
+        second = Game(tags=['Puzzle'], title='Portal 2', game_id=1)
+        assert game_content_hash(first) == game_content_hash(second)
+        second['price'] = 999
+        assert game_content_hash(first) != game_content_hash(second)
+
+
+class TestIncrementalCrawl:
+    """Test class for testing skipping of fresh games by spider."""
+    game_url = 'https://store.steampowered.com/app/620/Portal_2/'
+
+    @staticmethod
+    def create_spider(tmp_path, **kwargs):
+        crawler = get_crawler(GameParser, {
+            'CRAWL_STATE_ENABLED': True,
+            'CRAWL_STATE_PATH': str(tmp_path / 'state.db'),
+            'CRAWL_STATE_REFRESH_INTERVAL': HOUR,
+            'CRAWL_STATE_MAX_INTERVAL': HOUR,
+        })
+        return crawler._create_spider(**kwargs)
+
+    @staticmethod
+    def scrape_game(spider, signal=signals.item_scraped, **kwargs):
+        """Save state of the game, which passed pipelines with signal."""
+        game = spider._save_game_state(Game(game_id=620, title='Portal 2'))
+        spider.crawler.signals.send_catch_log(signal, item=game,
+                                              response=None, spider=spider,
+                                              **kwargs)
+
+    def test_skip_fresh_game(self, tmp_path):
+        """Test, that fresh game is not requested again."""
+        spider = self.create_spider(tmp_path)
+        assert spider.process_game_request(Request(self.game_url))
+        self.scrape_game(spider)
+        assert spider.process_game_request(Request(self.game_url)) is None
+        assert spider.crawler.stats.get_value('crawlstate/skipped') == 1
+        assert spider.crawler.stats.get_value('crawlstate/changed') == 1
+        spider.closed('finished')
+
+    def test_not_stored(self, tmp_path):
+        """Test, that game dropped by pipelines is requested again."""
+        spider = self.create_spider(tmp_path)
+        self.scrape_game(spider, signals.item_dropped,
+                         exception=DropItem('failed'))
+        assert spider.process_game_request(Request(self.game_url))
+        # unchanged games were stored by the previous crawl
+        self.scrape_game(spider, signals.item_dropped,
+                         exception=UnchangedGame('unchanged'))
+        assert spider.process_game_request(Request(self.game_url)) is None
+        spider.closed('finished')
+
+    def test_full_crawl(self, tmp_path):
+        """Test, that all games are requested in full crawl."""
+        spider = self.create_spider(tmp_path, full='1')
+        self.scrape_game(spider)
+        assert spider.process_game_request(Request(self.game_url))
+        spider.closed('finished')
@@ -0,0 +1,47 @@
+from datetime import datetime
+from unittest.mock import MagicMock
+
+import pytest
+
+from steamscraping.dates import ReleaseDateParser, ENGLISH_MONTHS
+
+
+class TestReleaseDateParser:
+    """Test class for testing parsing release dates."""
+
+    @pytest.mark.parametrize('test_input, expected',
+                             [('18 Aug, 2019', datetime(2019, 8, 18)),
+                              ('1 May, 2019', datetime(2019, 5, 1)),
+                              ('Aug 18, 2019', datetime(2019, 8, 18)),
+                              ('Aug 2019', datetime(2019, 8, 1)),
+                              ('August 2019', datetime(2019, 8, 1)),
+                              ('August, 2019', datetime(2019, 8, 1)),
+                              ('2019', datetime(2019, 1, 1)),
+                              (' 18 Aug, 2019 ', datetime(2019, 8, 18)),
+                              ('Coming soon', 'Coming soon'),
+                              ('Q3 2019', 'Q3 2019'),
+                              ('31 Feb, 2019', '31 Feb, 2019'),
+                              ('18 Abc, 2019', '18 Abc, 2019')])
+    def test_parse(self, test_input, expected):
+        """Test parsing of supported formats."""
+        parser = ReleaseDateParser(ENGLISH_MONTHS)
+        assert parser(test_input) == expected
+
+    def test_stats(self):
+        """Test, that every unparsed date is counted in stats."""
+        parser = ReleaseDateParser(ENGLISH_MONTHS)
+        stats = MagicMock()
+        parser('Coming soon', stats)
+        parser('Coming soon', stats)
+        parser('18 Aug, 2019', stats)
+        parser('Coming soon')
+        stats.inc_value.assert_called_with('release_date/unparsed')
+        assert stats.inc_value.call_count == 2
+
+    def test_cache(self):
+        """Test, that repeated dates are taken from cache."""
+        parser = ReleaseDateParser(ENGLISH_MONTHS, cache_size=2)
+        for _ in range(3):
+            parser('18 Aug, 2019')
+        assert parser.cache_info().hits == 2
+        assert parser.cache_info().misses == 1
@@ -0,0 +1,111 @@
+import hashlib
+
+import pytest
+from scrapy import Request
+from scrapy.downloadermiddlewares.redirect import RedirectMiddleware
+from scrapy.http import HtmlResponse
+from scrapy.utils.test import get_crawler
+
+from steamscraping.dupefilters import (AppIdBitmap, AppIdDupeFilter,
+                                       BloomFilter)
+from steamscraping.spiders.game import GameParser
+
+STORE_URL = 'https://store.steampowered.com'
+
+
+def create_dupefilter(**settings):
+    crawler = get_crawler(GameParser, settings)
+    return AppIdDupeFilter.from_crawler(crawler)
+
+
+class TestAppIdBitmap:
+    """Test class for testing bitmap of app ids."""
+
+    def test_add(self):
+        bitmap = AppIdBitmap()
+        assert bitmap.add(620)
+        assert not bitmap.add(620)
+        assert bitmap.add(7)
+        assert 620 in bitmap and 7 in bitmap
+        assert 621 not in bitmap and 10 ** 6 not in bitmap
+        assert len(bitmap) == 2
+        assert len(AppIdBitmap(bytes(bitmap.bits))) == 2
+
+
+class TestBloomFilter:
+    """Test class for testing bloom filter."""
+
+    def test_add(self):
+        bloom = BloomFilter.for_capacity(1000, 0.01)
+        fingerprints = [hashlib.sha1(str(i).encode()).digest()
+                        for i in range(1000)]
+        added = sum(bloom.add(fingerprint) for fingerprint in fingerprints)
+        assert added > 980
+        assert not any(bloom.add(fingerprint)
+                       for fingerprint in fingerprints)
+        copy = BloomFilter.from_bytes(bloom.to_bytes())
+        assert not copy.add(fingerprints[0])
+        assert len(copy) == len(bloom)
+
+
+class TestAppIdDupeFilter:
+    """Test class for testing dupe filter by app ids."""
+
+    @pytest.mark.parametrize('bloom_capacity', [0, 1000])
+    def test_request_seen(self, bloom_capacity):
+        """Test, that games are the same by app id and other requests by
+        fingerprint without snr."""
+        dupefilter = create_dupefilter(
+            DUPEFILTER_BLOOM_CAPACITY=bloom_capacity
+        )
+        seen = [dupefilter.request_seen(Request(url)) for url in (
+            STORE_URL + '/app/620/Portal_2/?snr=1_7_7_230_150_1',
+            STORE_URL + '/app/620/',
+            STORE_URL + '/app/620/Portal_2/?l=russian',
+            STORE_URL + '/agecheck/app/620/',
+            STORE_URL + '/search/?page=2&snr=1_7_7_230_150_1',
+            STORE_URL + '/search/?page=2',
+            STORE_URL + '/search/?page=3',
+        )]
+        assert seen == [False, True, True, False, False, True, False]
+        assert len(dupefilter.app_ids) == 1
+
+    def test_post(self):
+        """Test, that only GET requests of games are kept by app id."""
+        dupefilter = create_dupefilter()
+        url = STORE_URL + '/app/620/'
+        assert not dupefilter.request_seen(Request(url))
+        assert not dupefilter.request_seen(Request(url, method='POST'))
+
+    def test_redirect(self):
+        """Test, that redirect of the game page is not a duplicate."""
+        crawler = get_crawler(GameParser)
+        dupefilter = AppIdDupeFilter.from_crawler(crawler)
+        redirect_middleware = RedirectMiddleware.from_crawler(crawler)
+        request = Request(STORE_URL + '/app/620/')
+        assert not dupefilter.request_seen(request)
+        response = HtmlResponse(request.url, status=301, headers={
+            'Location': STORE_URL + '/app/620/Portal_2/'
+        })
+        redirected = redirect_middleware.process_response(
+            request, response, crawler._create_spider()
+        )
+        assert redirected.url == STORE_URL + '/app/620/Portal_2/'
+        assert not dupefilter.request_seen(redirected)
+        assert dupefilter.request_seen(redirected.copy())
+        assert dupefilter.request_seen(Request(STORE_URL + '/app/620/'))
+
+    @pytest.mark.parametrize('bloom_capacity', [0, 1000])
+    def test_jobdir(self, tmp_path, bloom_capacity):
+        """Test persistence of seen requests in JOBDIR."""
+        settings = {'JOBDIR': str(tmp_path),
+                    'DUPEFILTER_BLOOM_CAPACITY': bloom_capacity}
+        dupefilter = create_dupefilter(**settings)
+        dupefilter.request_seen(Request(STORE_URL + '/app/620/'))
+        dupefilter.request_seen(Request(STORE_URL + '/search/?page=2'))
+        dupefilter.close('finished')
+
+        dupefilter = create_dupefilter(**settings)
+        assert dupefilter.request_seen(Request(STORE_URL + '/app/620/'))
+        assert dupefilter.request_seen(Request(STORE_URL + '/search/?page=2'))
+        assert not dupefilter.request_seen(Request(STORE_URL + '/app/10/'))
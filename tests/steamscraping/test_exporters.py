@@ -0,0 +1,153 @@
+import gzip
+import json
+import os
+from datetime import datetime
+
+import pytest
+from scrapy.exceptions import NotConfigured
+from scrapy.utils.test import get_crawler
+
+from steamscraping.db import game_to_row
+from steamscraping.exporters import (PART_SUFFIX, JsonLinesWriter,
+                                     ParquetWriter, RotatingExporter)
+from steamscraping.items import Game, GameRequirements
+from steamscraping.pipelines import ExportPipeline
+
+
+def make_row(game_id):
+    return game_to_row(Game(
+        game_id=game_id, title='Game {}'.format(game_id), price=999,
+        release_date=datetime(2019, 7, 1), tags=['Action', 'Indie'],
+        specs=['Single-player'],
+        system_requirements=GameRequirements(min_os='Windows 7',
+                                             rec_ram='8 GB RAM')
+    ))
+
+
+def read_lines(path):
+    with gzip.open(path, 'rt', encoding='utf-8') as file:
+        return [json.loads(line) for line in file]
+
+
+class TestJsonLinesWriter:
+    """Test class for testing export of games into json lines."""
+
+    def test_write(self, tmp_path):
+        """Test, that requirements are flattened into columns."""
+        path = str(tmp_path / 'games.jsonl.gz')
+        writer = JsonLinesWriter(path)
+        writer.write(make_row(10))
+        assert not os.path.exists(path)
+        assert os.path.exists(path + PART_SUFFIX)
+        writer.close()
+
+        row, = read_lines(path)
+        assert row['game_id'] == 10
+        assert row['release_date'] == '2019-07-01T00:00:00'
+        assert row['tags'] == ['Action', 'Indie']
+        assert row['min_os'] == 'Windows 7'
+        assert row['rec_ram'] == '8 GB RAM'
+        assert row['rec_os'] is None
+        assert not os.path.exists(path + PART_SUFFIX)
+
+    def test_suffix(self):
+        assert JsonLinesWriter.suffix('gzip') == '.jsonl.gz'
+        assert JsonLinesWriter.suffix(None) == '.jsonl'
+        assert ParquetWriter.suffix('zstd') == '.parquet'
+
+
+class TestParquetWriter:
+    """Test class for testing export of games into parquet."""
+
+    def test_write(self, tmp_path):
+        """Test writing of games by record batches."""
+        parquet = pytest.importorskip('pyarrow.parquet')
+        path = str(tmp_path / 'games.parquet')
+        writer = ParquetWriter(path, batch_size=2)
+        for game_id in range(5):
+            writer.write(make_row(game_id))
+        writer.close()
+
+        parquet_file = parquet.ParquetFile(path)
+        assert parquet_file.metadata.num_row_groups == 3
+        table = parquet_file.read()
+        assert table.column('game_id').to_pylist() == [0, 1, 2, 3, 4]
+        assert table.column('tags').to_pylist()[0] == ['Action', 'Indie']
+        row_group = parquet_file.metadata.row_group(0)
+        tags, = [column for column in map(row_group.column,
+                                          range(row_group.num_columns))
+                 if column.path_in_schema.startswith('tags.')]
+        assert 'RLE_DICTIONARY' in tags.encodings
+        assert table.column('min_os').to_pylist()[0] == 'Windows 7'
+        assert table.column('release_date').to_pylist()[0] == \
+            datetime(2019, 7, 1)
+
+
+class TestRotatingExporter:
+    """Test class for testing rotation of exported files."""
+
+    @staticmethod
+    def create(tmp_path, **kwargs):
+        return RotatingExporter(str(tmp_path), JsonLinesWriter,
+                                JsonLinesWriter.suffix('gzip'), **kwargs)
+
+    def test_rotate_size(self, tmp_path):
+        """Test, that file is completed, when it is large enough."""
+        exporter = self.create(tmp_path, rotate_size=1)
+        for game_id in range(3):
+            exporter.write(make_row(game_id), now=0)
+        exporter.close()
+        assert len(exporter.files) == 3
+        assert exporter.rows == 3
+        assert [read_lines(path)[0]['game_id']
+                for path in exporter.files] == [0, 1, 2]
+        assert exporter.files[0].endswith('-0001.jsonl.gz')
+
+    def test_rotate_interval(self, tmp_path):
+        """Test, that file is completed, when it is open long enough."""
+        exporter = self.create(tmp_path, rotate_interval=60)
+        exporter.write(make_row(1), now=0)
+        exporter.write(make_row(2), now=30)
+        assert exporter.files == []
+        exporter.write(make_row(3), now=60)
+        exporter.write(make_row(4), now=70)
+        exporter.close()
+        assert [len(read_lines(path)) for path in exporter.files] == [3, 1]
+        assert exporter.bytes == sum(map(os.path.getsize, exporter.files))
+
+
+class TestExportPipeline:
+    """Test class for testing export pipeline."""
+
+    def test_not_configured(self):
+        crawler = get_crawler(settings_dict={'EXPORT_ENABLED': False})
+        with pytest.raises(NotConfigured):
+            ExportPipeline.from_crawler(crawler)
+
+        crawler = get_crawler(settings_dict={'EXPORT_ENABLED': True,
+                                             'EXPORT_FORMATS': ['csv']})
+        with pytest.raises(NotConfigured):
+            ExportPipeline.from_crawler(crawler)
+
+    def test_export(self, tmp_path):
+        """Test, that games are exported and other items are passed."""
+        crawler = get_crawler(settings_dict={
+            'EXPORT_ENABLED': True,
+            'EXPORT_FORMATS': ['jsonl'],
+            'EXPORT_DIR': str(tmp_path),
+            'EXPORT_JSONL_COMPRESSION': 'gzip',
+            'EXPORT_ROTATE_SIZE': 0,
+            'EXPORT_ROTATE_INTERVAL': 0,
+        })
+        pipeline = ExportPipeline.from_crawler(crawler)
+        game = Game(game_id=10, tags=['Action'])
+        assert pipeline.process_item(game, None) is game
+        assert pipeline.process_item({'other': 1}, None) == {'other': 1}
+        pipeline.close_spider(None)
+
+        path, = pipeline.exporters['jsonl'].files
+        assert [row['game_id'] for row in read_lines(path)] == [10]
+        assert crawler.stats.get_value('export/items') == 1
+        assert crawler.stats.get_value('export/jsonl/files') == 1
+        assert crawler.stats.get_value('export/jsonl/bytes') == \
+            os.path.getsize(path)
@@ -0,0 +1,44 @@
+import pytest
+from scrapy.http import HtmlResponse
+
+from steamscraping.extractors import SelectorsExtractor
+from steamscraping.items import Game
+from steamscraping.spiders.game import GameParser, GameItemLoader
+from tests.conftest import fake_response_from_file
+
+GAME_URL = 'https://store.steampowered.com/app/620/Portal_2/'
+
+
+class TestSelectorsExtractor:
+    """Test class for testing extraction by precompiled selectors."""
+    extractor = SelectorsExtractor(GameParser.selectors,
+                                   root_css=GameParser.game_root_css)
+
+    @pytest.mark.parametrize('field', sorted(GameParser.selectors))
+    def test_same_values(self, field):
+        """Test, that values are the same, as add_css gets."""
+        response = fake_response_from_file('app_620.html', url=GAME_URL)
+        loader = GameItemLoader(item=Game(), response=response)
+        expected = loader.get_css(GameParser.selectors[field])
+        assert self.extractor.extract(response, [field])[field] == expected
+
+    def test_same_item(self):
+        """Test, that loaded item is the same, as with add_css."""
+        response = fake_response_from_file('app_620.html', url=GAME_URL)
+        loader = GameItemLoader(item=Game(), response=response)
+        for field, values in self.extractor.extract(response).items():
+            loader.add_value(field, values)
+        expected_loader = GameItemLoader(item=Game(), response=response)
+        for field, selector in GameParser.selectors.items():
+            expected_loader.add_css(field, selector)
+        assert dict(loader.load_item()) == dict(expected_loader.load_item())
+
+    def test_without_root(self):
+        """Test page without root element, whole document is searched."""
+        response = HtmlResponse(
+            url=GAME_URL, encoding='utf-8',
+            body=b'<div class="apphub_AppName">Portal 2</div>'
+        )
+        assert self.extractor.extract(response, ['title']) == {
+            'title': ['Portal 2']
+        }
@@ -0,0 +1,148 @@
+import os
+from time import time
+
+import pytest
+from scrapy import Request
+from scrapy.downloadermiddlewares.httpcache import HttpCacheMiddleware
+from scrapy.http import HtmlResponse, Response
+from scrapy.spiders import Spider
+from scrapy.utils.test import get_crawler
+
+from steamscraping.httpcache import CompressedCacheStorage, cache_key
+
+GAME_URL = 'https://store.steampowered.com/app/620/Portal_2/'
+
+
+def make_response(body=b'<html>Portal 2</html>', headers=None):
+    headers = dict(headers or {}, **{'Content-Type': 'text/html'})
+    return HtmlResponse(GAME_URL, body=body, headers=headers)
+
+
+class TestCompressedCacheStorage:
+    """Test class for testing compressed cache storage."""
+
+    @pytest.fixture
+    def crawler(self, tmp_path):
+        return get_crawler(Spider, {
+            'HTTPCACHE_ENABLED': True,
+            'HTTPCACHE_DIR': str(tmp_path),
+            'HTTPCACHE_STORAGE':
+                'steamscraping.httpcache.CompressedCacheStorage',
+            'HTTPCACHE_POLICY':
+                'steamscraping.httpcache.RevalidatingPolicy',
+            'HTTPCACHE_ALWAYS_STORE': True,
+            'HTTPCACHE_MAX_AGE': 60,
+            'HTTPCACHE_MAX_SIZE': 0,
+        })
+
+    @pytest.fixture
+    def spider(self, crawler):
+        return crawler._create_spider('games')
+
+    def open_storage(self, crawler, spider):
+        storage = CompressedCacheStorage(crawler.settings)
+        storage.open_spider(spider)
+        return storage
+
+    def test_key(self):
+        """Test, that urls of one page share the same key."""
+        assert (cache_key(Request(GAME_URL + '?snr=1_7_7_230_150_1')) ==
+                cache_key(Request(GAME_URL)))
+        assert (cache_key(Request(GAME_URL + '?l=russian')) !=
+                cache_key(Request(GAME_URL)))
+        assert (cache_key(Request('https://store.steampowered.com/app/620/'))
+                != cache_key(Request(GAME_URL)))
+        search_url = 'https://store.steampowered.com/search/?page=2'
+        assert (cache_key(Request(search_url + '&snr=1_7_7_230_150_1')) ==
+                cache_key(Request(search_url)))
+        assert (cache_key(Request(search_url)) !=
+                cache_key(Request(search_url.replace('2', '3'))))
+
+    def test_store_and_retrieve(self, crawler, spider):
+        """Test, that response is stored compressed and restored."""
+        storage = self.open_storage(crawler, spider)
+        request = Request(GAME_URL)
+        assert storage.retrieve_response(spider, request) is None
+
+        body = b'<html>' + b'Portal 2 ' * 1000 + b'</html>'
+        storage.store_response(spider, request,
+                               make_response(body, {'ETag': '"abc"'}))
+        response = storage.retrieve_response(spider, request)
+        assert isinstance(response, HtmlResponse)
+        assert response.body == body
+        assert response.headers['ETag'] == b'"abc"'
+        assert storage._total_size < len(body) / 10
+
+    def test_evict_by_age(self, crawler, spider):
+        """Test, that entries unused for too long are removed."""
+        storage = self.open_storage(crawler, spider)
+        old_request = Request(GAME_URL)
+        new_request = Request('https://store.steampowered.com/app/400/')
+        storage.store_response(spider, old_request, make_response())
+        storage.store_response(spider, new_request, make_response())
+        old_time = time() - 120
+        os.utime(storage._get_path(old_request), (old_time, old_time))
+
+        storage = self.open_storage(crawler, spider)
+        assert storage.retrieve_response(spider, old_request) is None
+        assert storage.retrieve_response(spider, new_request) is not None
+        assert crawler.stats.get_value('httpcache/evicted') == 1
+
+    def test_evict_by_size(self, crawler, spider):
+        """Test, that least recently used entries are removed."""
+        storage = self.open_storage(crawler, spider)
+        requests = [Request('https://store.steampowered.com/app/{}/'
+                            .format(app_id)) for app_id in range(3)]
+        for i, request in enumerate(requests):
+            storage.store_response(spider, request, make_response())
+            entry_time = time() - 10 + i
+            os.utime(storage._get_path(request), (entry_time, entry_time))
+        storage.retrieve_response(spider, requests[0])
+
+        storage.max_size = storage._total_size - 1
+        storage._evict_by_size()
+        assert storage.retrieve_response(spider, requests[0]) is not None
+        assert storage.retrieve_response(spider, requests[1]) is None
+        assert storage.retrieve_response(spider, requests[2]) is not None
+
+    def test_redirect(self, crawler, spider):
+        """Test, that cached redirect is not served for its location."""
+        middleware = HttpCacheMiddleware.from_crawler(crawler)
+        middleware.spider_opened(spider)
+
+        request = Request('https://store.steampowered.com/app/620/')
+        assert middleware.process_request(request, spider) is None
+        redirect = Response(request.url, status=301,
+                            headers={'Location': GAME_URL})
+        middleware.process_response(request, redirect, spider)
+        assert crawler.stats.get_value('httpcache/store') == 1
+
+        assert middleware.process_request(Request(GAME_URL), spider) is None
+        cached = middleware.process_request(
+            Request(request.url + '?snr=1_7_7_230_150_1'), spider
+        )
+        assert cached.status == 301
+        middleware.spider_closed(spider)
+
+    def test_revalidation(self, crawler, spider):
+        """Test, that stale response is revalidated and served on 304."""
+        middleware = HttpCacheMiddleware.from_crawler(crawler)
+        middleware.spider_opened(spider)
+
+        request = Request(GAME_URL)
+        assert middleware.process_request(request, spider) is None
+        response = make_response(headers={'ETag': '"abc"',
+                                          'Cache-Control': 'no-cache'})
+        middleware.process_response(request, response, spider)
+        assert crawler.stats.get_value('httpcache/miss') == 1
+        assert crawler.stats.get_value('httpcache/store') == 1
+
+        request = Request(GAME_URL + '?snr=1_7_7_230_150_1')
+        assert middleware.process_request(request, spider) is None
+        assert request.headers['If-None-Match'] == b'"abc"'
+        not_modified = Response(request.url, status=304)
+        cached = middleware.process_response(request, not_modified, spider)
+        assert cached.status == 200
+        assert cached.body == response.body
+        assert crawler.stats.get_value('httpcache/revalidate') == 1
+        middleware.spider_closed(spider)
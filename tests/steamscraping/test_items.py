@@ -0,0 +1,142 @@
+import pickle
+import subprocess
+import sys
+from datetime import datetime
+
+import freezegun
+import pytest
+from scrapy.loader import ItemLoader
+from scrapy.settings import Settings
+
+from steamscraping.items import (Game, GameRequirements,
+                                 GameRequirementsBuilder, LanguageSelectError,
+                                 StrToDate, item_settings)
+
+FULL_REQUIREMENTS = [
+    '\n\t\t\t', 'Minimum:', 'Requires a 64-bit processor and OS',
+    'OS:', ' Windows 7', 'Processor:', ' Intel Core i5-2400',
+    'Memory:', ' 8 GB RAM', 'Graphics:', ' GeForce GTX 660',
+    'DirectX:', ' Version 11', 'Storage:', ' 20 GB available space',
+    '\n\t\t\t', 'Recommended:', 'OS:', ' Windows 10',
+    'Processor:', ' Intel Core i7-4770', 'Memory:', ' 16 GB RAM',
+    'Graphics:', ' GeForce GTX 970', 'DirectX:', ' Version 12',
+    'Storage:', ' 20 GB available space', '\n'
+]
+
+
+class TestGameRequirementsBuilder:
+    """Test class for testing building system requirements."""
+    build = GameRequirementsBuilder()
+
+    def test_full(self):
+        """Test page with minimum and recommended requirements."""
+        requirements = self.build(FULL_REQUIREMENTS)
+        assert requirements == GameRequirements(
+            min_os='Windows 7', min_cpu='Intel Core i5-2400',
+            min_ram='8 GB RAM', min_gpu='GeForce GTX 660',
+            min_directx='Version 11', min_storage='20 GB available space',
+            rec_os='Windows 10', rec_cpu='Intel Core i7-4770',
+            rec_ram='16 GB RAM', rec_gpu='GeForce GTX 970',
+            rec_directx='Version 12', rec_storage='20 GB available space'
+        )
+
+    @pytest.mark.parametrize('test_input', [
+        FULL_REQUIREMENTS[:FULL_REQUIREMENTS.index('Recommended:')],
+        # there is no label Minimum on pages without recommended section
+        FULL_REQUIREMENTS[2:FULL_REQUIREMENTS.index('Recommended:')],
+    ])
+    def test_without_recommended(self, test_input):
+        """Test page without recommended requirements."""
+        requirements = self.build(test_input)
+        assert requirements.min_os == 'Windows 7'
+        assert requirements.min_storage == '20 GB available space'
+        assert requirements.rec_os is None
+        assert requirements.rec_cpu is None
+
+    def test_labels(self):
+        """Test labels with star, aliases and labels without value."""
+        requirements = self.build(['Minimum:', 'OS *:', 'Windows 10',
+                                   'Processor:', 'Memory:', '4 GB RAM',
+                                   'Hard Drive:', '2 GB'])
+        assert requirements.min_os == 'Windows 10'
+        assert requirements.min_cpu is None
+        assert requirements.min_ram == '4 GB RAM'
+        assert requirements.min_storage == '2 GB'
+
+    def test_empty(self):
+        """Test game without requirements."""
+        assert self.build([]) == GameRequirements()
+
+
+class TestGameRequirements:
+    """Test class for testing storing system requirements."""
+
+    def test_compact(self):
+        """Test, that requirements don't have instance dict."""
+        requirements = GameRequirements(min_os='Windows 10')
+        assert not hasattr(requirements, '__dict__')
+        assert requirements.as_dict()['min_os'] == 'Windows 10'
+
+    def test_pickle(self):
+        """Test, that requirements can be sent to other process."""
+        requirements = GameRequirements(min_os='Windows 10')
+        assert pickle.loads(pickle.dumps(requirements)) == requirements
+
+
+class TestGame:
+    """Test class for testing processors of game fields."""
+
+    @freezegun.freeze_time('2019-08-18')
+    def test_single_values(self):
+        """Test, that fields with one value are not lists."""
+        loader = ItemLoader(item=Game(), DAYS_EARLIER=20, REVIEWS_TO_PASS=500)
+        loader.add_value('num_reviews', ['\n\t(5,134)\n', '(187,443)'])
+        loader.add_value('release_date', ['10 Aug, 2019'])
+        game = loader.load_item()
+        assert game['num_reviews'] == 187443
+        assert game['release_date'] == datetime(2019, 8, 10)
+
+    @freezegun.freeze_time('2019-08-18')
+    def test_filtered(self):
+        """Test, that old games and games without reviews are filtered."""
+        loader = ItemLoader(item=Game(), DAYS_EARLIER=20, REVIEWS_TO_PASS=500)
+        loader.add_value('num_reviews', ['(12)'])
+        loader.add_value('release_date', ['18 Apr, 2011'])
+        game = loader.load_item()
+        assert 'num_reviews' not in game
+        assert 'release_date' not in game
+
+    @freezegun.freeze_time('2019-08-18')
+    def test_not_filtered(self):
+        """Test, that games are not filtered without item settings."""
+        loader = ItemLoader(item=Game())
+        loader.add_value('num_reviews', ['(12)'])
+        loader.add_value('release_date', ['18 Apr, 2011'])
+        game = loader.load_item()
+        assert game['num_reviews'] == 12
+        assert game['release_date'] == datetime(2011, 4, 18)
+
+
+class TestItemSettings:
+    """Test class for testing settings of item processors."""
+
+    def test_item_settings(self):
+        assert item_settings(Settings({'DAYS_EARLIER': '20'})) == {
+            'LANGUAGE': 'english', 'DAYS_EARLIER': 20
+        }
+
+    def test_language(self):
+        assert StrToDate()('18 Apr, 2011', {'LANGUAGE': 'russian'}) == \
+            '18 Apr, 2011'
+        with pytest.raises(LanguageSelectError):
+            StrToDate()('18 Apr, 2011', {'LANGUAGE': 'german'})
+
+    def test_lazy_import(self):
+        """Test, that items don't load project settings and app config."""
+        modules = subprocess.check_output([
+            sys.executable, '-c',
+            'import sys, steamscraping.items; print(*sys.modules)'
+        ], text=True).split()
+        assert 'steamscraping.items' in modules
+        assert 'steamscraping.settings' not in modules
+        assert 'app_config' not in modules
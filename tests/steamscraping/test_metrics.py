@@ -0,0 +1,97 @@
+from scrapy import Request
+from scrapy.http import HtmlResponse
+from scrapy.utils.test import get_crawler
+
+from steamscraping.metrics import Histogram, Metrics, get_metrics
+from steamscraping.middlewares import (SteamscrapingDownloaderMiddleware,
+                                       SteamscrapingSpiderMiddleware)
+from steamscraping.spiders.game import GameParser
+from tests.conftest import fake_response_from_file
+
+
+class TestHistogram:
+    """Test class for testing histograms."""
+
+    def test_observe(self):
+        """Test counting values by buckets."""
+        histogram = Histogram((1, 2, 4))
+        for value in (0.5, 1, 3, 3, 10):
+            histogram.observe(value)
+        assert histogram.counts == [2, 0, 2, 1]
+        assert histogram.count == 5
+        assert histogram.sum == 17.5
+        assert histogram.quantile(0.5) == 4
+        assert histogram.quantile(1) == 10
+
+    def test_prometheus(self):
+        """Test export in prometheus text format."""
+        metrics = Metrics()
+        metrics.observe('latency_seconds', 1.5, buckets=(1, 2), host='a')
+        metrics.set_gauge('queue_depth', 7)
+        assert metrics.to_prometheus().splitlines() == [
+            '# TYPE steamscraping_queue_depth gauge',
+            'steamscraping_queue_depth 7',
+            '# TYPE steamscraping_latency_seconds histogram',
+            'steamscraping_latency_seconds_bucket{host="a",le="1"} 0',
+            'steamscraping_latency_seconds_bucket{host="a",le="2"} 1',
+            'steamscraping_latency_seconds_bucket{host="a",le="+Inf"} 1',
+            'steamscraping_latency_seconds_sum{host="a"} 1.5',
+            'steamscraping_latency_seconds_count{host="a"} 1',
+        ]
+
+
+class TestMiddlewares:
+    """Test class for testing collecting of metrics by middlewares."""
+    game_url = 'https://store.steampowered.com/app/620/Portal_2/'
+
+    @staticmethod
+    def create_spider():
+        crawler = get_crawler(GameParser, {'METRICS_ENABLED': True,
+                                           'CRAWL_STATE_ENABLED': False})
+        return crawler._create_spider()
+
+    def test_disabled(self):
+        """Test, that metrics are not collected if they are disabled."""
+        crawler = get_crawler(GameParser, {'METRICS_ENABLED': False})
+        assert get_metrics(crawler) is None
+
+    def test_download(self):
+        """Test recording of download latency and response size."""
+        spider = self.create_spider()
+        middleware = SteamscrapingDownloaderMiddleware.from_crawler(
+            spider.crawler
+        )
+        request = Request(self.game_url, meta={'download_latency': 0.25})
+        response = HtmlResponse(self.game_url, body=b'x' * 2000)
+        assert middleware.process_response(request, response,
+                                           spider) is response
+
+        metrics = spider.metrics
+        latency = metrics.histogram('download_latency_seconds',
+                                    host='store.steampowered.com')
+        size = metrics.histogram('response_bytes',
+                                 host='store.steampowered.com', status=200)
+        assert (latency.count, latency.sum) == (1, 0.25)
+        assert (size.count, size.sum) == (1, 2000)
+
+    def test_callback(self):
+        """Test recording time of callback and item processors."""
+        spider = self.create_spider()
+        middleware = SteamscrapingSpiderMiddleware.from_crawler(
+            spider.crawler
+        )
+        response = fake_response_from_file(
+            'app_620.html', self.game_url,
+            meta={'rule': 0}, response_class=HtmlResponse
+        )
+        response.request.callback = spider.parse_start_url
+        games = list(middleware.process_spider_output(
+            response, spider.parse_game(response), spider
+        ))
+
+        assert games[0]['title'] == 'Portal 2'
+        metrics = spider.metrics
+        assert metrics.histogram('callback_seconds',
+                                 callback='parse_game').count == 1
+        assert metrics.histogram('item_field_seconds', field='title',
+                                 stage='output').count == 1
@@ -0,0 +1,205 @@
+import pytest
+from scrapy import Request
+from scrapy.downloadermiddlewares.cookies import CookiesMiddleware
+from scrapy.exceptions import IgnoreRequest, NotConfigured
+from scrapy.http import HtmlResponse, Response, TextResponse
+from scrapy.utils.test import get_crawler
+
+from steamscraping import settings
+from steamscraping.middlewares import (AgeCheckMiddleware,
+                                       TrimResponseMiddleware)
+from steamscraping.spiders.game import GameParser
+from tests.conftest import fake_response_from_file
+
+GAME_URL = 'https://store.steampowered.com/app/620/Portal_2/'
+
+
+def create_trim_middleware(**settings_dict):
+    crawler = get_crawler(GameParser, dict({
+        'TRIM_RESPONSE_ENABLED': True,
+        'TRIM_RESPONSE_REGIONS': settings.TRIM_RESPONSE_REGIONS,
+        'TRIM_RESPONSE_MAX_SIZE': 0,
+    }, **settings_dict))
+    return TrimResponseMiddleware.from_crawler(crawler), crawler
+
+
+def parse_game(response):
+    spider = get_crawler(GameParser)._create_spider()
+    return dict(next(spider.parse_game(response)))
+
+
+class TestTrimResponseMiddleware:
+    """Test class for testing removing of heavy regions of game pages."""
+
+    @pytest.fixture
+    def response(self):
+        return fake_response_from_file('app_620.html', GAME_URL,
+                                       response_class=HtmlResponse)
+
+    def test_same_game(self, response):
+        """Test, that the game is the same with and without trimming."""
+        middleware, crawler = create_trim_middleware()
+        trimmed = middleware.process_response(response.request, response,
+                                              None)
+        assert len(trimmed.body) < len(response.body)
+        for region in (b'<script', b'app_reviews_hash', b'highlight_ctn',
+                       b'global_header', b'footer_text'):
+            assert region in response.body
+            assert region not in trimmed.body
+        assert parse_game(trimmed) == parse_game(response)
+        assert crawler.stats.get_value('trim/responses') == 1
+        assert crawler.stats.get_value('trim/bytes_removed') == \
+            len(response.body) - len(trimmed.body)
+
+    def test_heavy_page(self, response):
+        """Test page with many reviews and inline json."""
+        reviews = b''.join(
+            b'<div class="review_box"><div class="content">'
+            b'<div>Review text %d</div></div></div>' % i for i in range(100)
+        )
+        body = response.body.replace(
+            b'<div id="Reviews_summary">',
+            b'<div id="Reviews_summary">' + reviews
+        ).replace(
+            b'</head>',
+            b'<script>var g_Data = {"reviews": "<div>"};</script>'
+            b'<STYLE type="text/css">.x {}</STYLE></head>'
+        )
+        heavy = response.replace(body=body)
+        middleware, _ = create_trim_middleware()
+        trimmed = middleware.process_response(heavy.request, heavy, None)
+        assert b'Review text' not in trimmed.body
+        assert b'g_Data' not in trimmed.body
+        assert b'STYLE' not in trimmed.body
+        assert parse_game(trimmed) == parse_game(response)
+
+    def test_max_size(self, response):
+        """Test truncating of pages, which are too large after trimming."""
+        middleware, crawler = create_trim_middleware(TRIM_RESPONSE_MAX_SIZE=100)
+        trimmed = middleware.process_response(response.request, response,
+                                              None)
+        assert trimmed.body == middleware.trim(response.body)[:100]
+        assert crawler.stats.get_value('trim/truncated') == 1
+
+    @pytest.mark.parametrize('url, response_class, status', [
+        ('https://store.steampowered.com/agecheck/app/620/', HtmlResponse,
+         200),
+        ('https://store.steampowered.com/search/?page=2', HtmlResponse, 200),
+        ('https://store.steampowered.com/app/620/', TextResponse, 200),
+        ('https://store.steampowered.com/app/620/', HtmlResponse, 302),
+    ])
+    def test_other_responses(self, url, response_class, status):
+        """Test, that only game pages are trimmed."""
+        middleware, _ = create_trim_middleware()
+        response = response_class(url, status=status, encoding='utf-8',
+                                  body=b'<script>var a;</script>')
+        assert middleware.process_response(response.request, response,
+                                           None) is response
+
+    def test_not_closed_region(self):
+        """Test, that not closed region is not removed."""
+        middleware, _ = create_trim_middleware()
+        body = b'<div id="footer"><div>text</div>'
+        assert middleware.trim(body) == body
+
+    def test_not_configured(self):
+        with pytest.raises(NotConfigured):
+            create_trim_middleware(TRIM_RESPONSE_ENABLED=False)
+
+
+class TestAgeCheckMiddleware:
+    """Test class for testing age check cookies and recovery."""
+
+    @pytest.fixture
+    def crawler(self):
+        return get_crawler(GameParser, {
+            'AGECHECK_ENABLED': True,
+            'AGECHECK_COOKIES': settings.AGECHECK_COOKIES,
+            'AGECHECK_MAX_RETRIES': 2,
+        })
+
+    @staticmethod
+    def redirect(request, location):
+        return Response(request.url, status=302, request=request,
+                        headers={'Location': location})
+
+    def test_seed(self, crawler):
+        """Test, that cookies are set once per cookie jar."""
+        middleware = AgeCheckMiddleware.from_crawler(crawler)
+        cookies = CookiesMiddleware()
+        search_url = 'https://store.steampowered.com/search/?page=2'
+        for url, jar in ((search_url, None), (GAME_URL, None),
+                         (GAME_URL, 'other')):
+            request = Request(url, cookies={'birthtime': '1'},
+                              meta={'cookiejar': jar})
+            middleware.process_request(request, None)
+            cookies.process_request(request, None)
+            assert b'birthtime=1' in request.headers['Cookie']
+            assert b'lastagecheckage=1-0-2000' in request.headers['Cookie']
+        request = Request(GAME_URL)
+        middleware.process_request(request, None)
+        assert request.cookies == {}
+        assert crawler.stats.get_value('agecheck/seeded') == 2
+
+        request = Request(GAME_URL, meta={'dont_merge_cookies': True,
+                                          'cookiejar': 'new'})
+        middleware.process_request(request, None)
+        assert request.cookies == {}
+
+    def test_language(self):
+        """Test, that language cookie is set from LANGUAGE of the crawl."""
+        crawler = get_crawler(GameParser, {
+            'AGECHECK_ENABLED': True,
+            'AGECHECK_COOKIES': settings.AGECHECK_COOKIES,
+            'LANGUAGE': 'russian',
+        })
+        middleware = AgeCheckMiddleware.from_crawler(crawler)
+        assert middleware.cookies['Steam_language'] == 'russian'
+        assert middleware.cookies['mature_content'] == '1'
+
+    def test_recover(self, crawler):
+        """Test, that game page is requested again with cookies."""
+        middleware = AgeCheckMiddleware.from_crawler(crawler)
+        request = Request(GAME_URL, cookies=[{'name': 'birthtime',
+                                              'value': '1'}])
+        response = self.redirect(request, '/agecheck/app/620/')
+        retry = middleware.process_response(request, response, None)
+        assert retry.url == GAME_URL
+        assert retry.dont_filter
+        assert retry.meta['agecheck_retries'] == 1
+        assert {cookie['name']: cookie['value'] for cookie in retry.cookies} \
+            == dict(settings.AGECHECK_COOKIES, Steam_language='english')
+
+        response = HtmlResponse(GAME_URL, request=retry)
+        assert middleware.process_response(retry, response, None) is response
+        assert crawler.stats.get_value('agecheck/redirects') == 1
+        assert crawler.stats.get_value('agecheck/recovered') == 1
+
+    def test_give_up(self, crawler):
+        """Test, that game page is not requested more than max retries."""
+        middleware = AgeCheckMiddleware.from_crawler(crawler)
+        request = Request(GAME_URL)
+        for _ in range(2):
+            request = middleware.process_response(
+                request, self.redirect(request, '/agecheck/app/620/'), None
+            )
+        with pytest.raises(IgnoreRequest):
+            middleware.process_response(
+                request, self.redirect(request, '/agecheck/app/620/'), None
+            )
+        assert crawler.stats.get_value('agecheck/redirects') == 3
+        assert crawler.stats.get_value('agecheck/gave_up') == 1
+
+    def test_other_redirect(self, crawler):
+        middleware = AgeCheckMiddleware.from_crawler(crawler)
+        request = Request('https://store.steampowered.com/app/620/')
+        response = self.redirect(request, GAME_URL)
+        assert middleware.process_response(request, response,
+                                           None) is response
+
+    def test_not_configured(self):
+        for name in ('AGECHECK_ENABLED', 'COOKIES_ENABLED'):
+            crawler = get_crawler(GameParser, {'AGECHECK_ENABLED': True,
+                                               name: False})
+            with pytest.raises(NotConfigured):
+                AgeCheckMiddleware.from_crawler(crawler)
@@ -0,0 +1,251 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from unittest.mock import patch, MagicMock
+
+import pytest
+from scrapy.exceptions import DropItem
+from scrapy.http import HtmlResponse
+from scrapy.utils.test import get_crawler
+from twisted.internet import defer
+from sqlalchemy import create_engine
+
+from steamscraping.db import games
+from steamscraping.items import Game, GameDiff, RawGame
+from steamscraping.parsepool import init_worker, parse_game_page
+from steamscraping.pipelines import DatabasePipeline, ParsePoolPipeline
+from steamscraping.spiders.game import GameParser
+from tests.conftest import fake_response_from_file
+
+
+def run_inline(self, func, *args):
+    """Run function in the calling thread instead of thread pool."""
+    return defer.maybeDeferred(func, *args)
+
+
+def make_game(game_id, title='Game', price=100):
+    return Game(game_id=game_id, title=title, price=price,
+                tags=['Action', 'Indie'])
+
+
+def select_games(db_url):
+    engine = create_engine(db_url)
+    with engine.connect() as connection:
+        rows = connection.execute(
+            games.select().order_by(games.c.game_id)
+        ).fetchall()
+    engine.dispose()
+    return [(row.game_id, row.title, row.price) for row in rows]
+
+
+class TestDatabasePipeline:
+    """Test class for testing storing games into database."""
+
+    @pytest.fixture
+    def db_url(self, tmp_path):
+        return 'sqlite:///{}'.format(tmp_path / 'games.db')
+
+    @patch.object(DatabasePipeline, '_run_in_thread', run_inline)
+    def test_flush_by_batch_size(self, db_url):
+        """Test, that full batch is written immediately."""
+        pipeline = DatabasePipeline(db_url, batch_size=2, flush_interval=0)
+        pipeline.open_spider(MagicMock())
+        pipeline.process_item(make_game(1), None)
+        assert select_games(db_url) == []
+        pipeline.process_item(make_game(2), None)
+        assert select_games(db_url) == [(1, 'Game', 100), (2, 'Game', 100)]
+        pipeline.close_spider(None)
+
+    @patch.object(DatabasePipeline, '_run_in_thread', run_inline)
+    def test_upsert(self, db_url):
+        """Test, that games with the same id are updated."""
+        pipeline = DatabasePipeline(db_url, batch_size=2, flush_interval=0)
+        pipeline.open_spider(MagicMock())
+        pipeline.process_item(make_game(1, price=100), None)
+        pipeline.process_item(make_game(2, price=100), None)
+        pipeline.process_item(make_game(1, 'New title', 50), None)
+        pipeline.process_item(make_game(1, 'Newest title', 40), None)
+        pipeline.process_item(make_game(3), None)
+        pipeline.close_spider(None)
+        assert select_games(db_url) == [(1, 'Newest title', 40),
+                                         (2, 'Game', 100),
+                                         (3, 'Game', 100)]
+
+    @patch.object(DatabasePipeline, '_run_in_thread', run_inline)
+    def test_diff(self, db_url):
+        """Test, that only changed columns are updated by diffs."""
+        pipeline = DatabasePipeline(db_url, batch_size=100, flush_interval=0)
+        pipeline.open_spider(MagicMock())
+        pipeline.process_item(make_game(1, price=100), None)
+        pipeline.process_item(make_game(2, price=100), None)
+        pipeline.flush()
+        pipeline.process_item(GameDiff(game_id=1, changed={'price': 50}),
+                              None)
+        pipeline.process_item(make_game(2, 'New title', 100), None)
+        pipeline.process_item(GameDiff(game_id=2, changed={'price': None}),
+                              None)
+        pipeline.close_spider(None)
+        assert select_games(db_url) == [(1, 'Game', 50),
+                                         (2, 'New title', None)]
+
+    @patch.object(DatabasePipeline, '_run_in_thread', run_inline)
+    def test_failed_row(self, db_url):
+        """Test, that only the bad row of the failed batch is lost."""
+        crawler = get_crawler()
+        pipeline = DatabasePipeline(db_url, batch_size=3, flush_interval=0,
+                                    stats=crawler.stats)
+        pipeline.open_spider(MagicMock())
+        pipeline.process_item(make_game(1, 'T' * 1000), None)
+        bad = make_game(2)
+        # value, which can't be stored
+        bad['tags'] = [object()]
+        pipeline.process_item(bad, None)
+        pipeline.process_item(make_game(3), None)
+        pipeline.close_spider(None)
+        assert select_games(db_url) == [(1, 'T' * 1000, 100),
+                                         (3, 'Game', 100)]
+        assert crawler.stats.get_value('db/failed_batches') == 1
+        assert crawler.stats.get_value('db/failed_rows') == 1
+        assert crawler.stats.get_value('db/rows') == 2
+
+    @patch.object(DatabasePipeline, '_run_in_thread', run_inline)
+    def test_flush_on_close(self, db_url):
+        """Test, that not full batch is written on spider closing."""
+        pipeline = DatabasePipeline(db_url, batch_size=100, flush_interval=0)
+        pipeline.open_spider(MagicMock())
+        pipeline.process_item(make_game(1), None)
+        pipeline.close_spider(None)
+        assert select_games(db_url) == [(1, 'Game', 100)]
+
+    def test_backpressure(self, db_url):
+        """Test, that items are held while database is busy."""
+        writes = []
+
+        def run_later(self, func, *args):
+            if func != self._write_rows:
+                return defer.maybeDeferred(func, *args)
+            d = defer.Deferred()
+            d.addCallback(lambda _: func(*args))
+            writes.append(d)
+            return d
+
+        with patch.object(DatabasePipeline, '_run_in_thread', run_later):
+            pipeline = DatabasePipeline(db_url, batch_size=1,
+                                        flush_interval=0,
+                                        max_pending_batches=1)
+            pipeline.open_spider(MagicMock())
+            item = make_game(1)
+            result = pipeline.process_item(item, None)
+            assert isinstance(result, defer.Deferred)
+            assert not result.called
+
+            writes[0].callback(None)
+            assert result.called
+            assert result.result is item
+            pipeline.close_spider(None)
+
+
+GAME_URL = 'https://store.steampowered.com/app/620/Portal_2/'
+
+
+def create_spider(**settings):
+    crawler = get_crawler(GameParser, dict({'CRAWL_STATE_ENABLED': False,
+                                            'DAYS_EARLIER': 20,
+                                            'REVIEWS_TO_PASS': 500},
+                                           **settings))
+    return crawler._create_spider()
+
+
+def raw_game(spider):
+    response = fake_response_from_file('app_620.html', GAME_URL,
+                                       response_class=HtmlResponse)
+    return next(spider.parse_game(response))
+
+
+class TestParsePoolPipeline:
+    """Test class for testing parsing of games in process pool."""
+
+    def parse_inline(self, func, *args):
+        """Run parsing in the calling process instead of process pool."""
+        return defer.maybeDeferred(func, *args)
+
+    def test_raw_game(self):
+        """Test, that spider yields page, if it is parsed in pool."""
+        spider = create_spider(PARSE_POOL_ENABLED=True)
+        item = raw_game(spider)
+        assert isinstance(item, RawGame)
+        assert item['game_id'] == 620
+        assert item['encoding'] == 'utf-8'
+
+    def test_same_game(self):
+        """Test, that game from pool is the same, as parsed by spider."""
+        spider = create_spider(PARSE_POOL_ENABLED=True)
+        init_worker(spider.selectors, spider.game_root_css,
+                    spider.item_context)
+        pipeline = ParsePoolPipeline(workers=1, max_pending=1)
+        with patch.object(ParsePoolPipeline, '_run_in_pool',
+                          self.parse_inline):
+            result = pipeline.process_item(raw_game(spider), spider)
+
+        expected = next(create_spider().parse_game(fake_response_from_file(
+            'app_620.html', GAME_URL, response_class=HtmlResponse
+        )))
+        assert isinstance(result.result, Game)
+        assert result.result == expected
+        # other items are passed as is
+        assert pipeline.process_item(expected, spider) is expected
+
+    def test_failed(self):
+        """Test, that game is dropped, if parsing failed."""
+        spider = create_spider(PARSE_POOL_ENABLED=True)
+        pipeline = ParsePoolPipeline(workers=1, max_pending=1,
+                                     stats=spider.crawler.stats)
+
+        def fail(self, func, *args):
+            return defer.fail(ValueError('broken page'))
+
+        with patch.object(ParsePoolPipeline, '_run_in_pool', fail):
+            result = pipeline.process_item(raw_game(spider), spider)
+        failures = []
+        result.addErrback(failures.append)
+        assert failures[0].check(DropItem)
+        assert spider.crawler.stats.get_value('parsepool/failed') == 1
+
+    def test_backpressure(self):
+        """Test, that pages wait for free worker."""
+        spider = create_spider(PARSE_POOL_ENABLED=True)
+        parsing = []
+
+        def parse_later(self, func, *args):
+            d = defer.Deferred()
+            parsing.append(d)
+            return d
+
+        with patch.object(ParsePoolPipeline, '_run_in_pool', parse_later):
+            pipeline = ParsePoolPipeline(workers=1, max_pending=1)
+            first = pipeline.process_item(raw_game(spider), spider)
+            second = pipeline.process_item(raw_game(spider), spider)
+            games = []
+            second.addCallback(games.append)
+            assert len(parsing) == 1
+
+            parsing[0].callback({'game_id': 620})
+            assert first.result == Game(game_id=620)
+            assert len(parsing) == 2 and not games
+            parsing[1].callback({'game_id': 620})
+            assert games == [Game(game_id=620)]
+
+    def test_process_pool(self):
+        """Test parsing of the page in worker process."""
+        spider = create_spider(PARSE_POOL_ENABLED=True)
+        item = raw_game(spider)
+        with ProcessPoolExecutor(
+                1, mp_context=multiprocessing.get_context('spawn'),
+                initializer=init_worker,
+                initargs=(spider.selectors, spider.game_root_css,
+                          spider.item_context)) as executor:
+            values = executor.submit(
+                parse_game_page, item['url'], item['body'], item['encoding'],
+                item['game_id'], item['game_values']
+            ).result(timeout=60)
+        assert values['game_id'] == 620
+        assert values['title'] == 'Portal 2'
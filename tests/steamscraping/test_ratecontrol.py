@@ -0,0 +1,149 @@
+from types import SimpleNamespace
+
+from scrapy import Request
+from scrapy.core.downloader import Downloader
+from scrapy.http import HtmlResponse
+from scrapy.utils.test import get_crawler
+
+from steamscraping.ratecontrol import (AdaptiveRateMiddleware, HostRate,
+                                       RateController, parse_retry_after)
+from steamscraping.spiders.game import GameParser
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class TestHostRate:
+    """Test class for testing rate of a host."""
+
+    def test_throttled(self):
+        """Test pause and decrease of the rate."""
+        host_rate = HostRate(RateController(start_rate=4))
+        assert host_rate.delay == 0.25
+        host_rate.on_throttled(0, 30)
+        host_rate.on_throttled(0.5, 10)
+        assert host_rate.paused_until == 30
+        assert host_rate.delay == 0.5
+
+
+class TestRetryAfter:
+    """Test class for testing parsing of Retry-After header."""
+
+    def test_seconds(self):
+        assert parse_retry_after(b'120', 0) == 120
+
+    def test_date(self):
+        assert parse_retry_after(b'Thu, 01 Jan 1970 00:01:40 GMT', 40) == 60
+
+    def test_invalid(self):
+        assert parse_retry_after(b'soon', 0) is None
+        assert parse_retry_after(None, 0) is None
+
+
+class TestAdaptiveRateMiddleware:
+    """Test class for testing adaptive rate control."""
+    game_url = 'https://store.steampowered.com/app/620/Portal_2/'
+
+    @staticmethod
+    def create_middleware(**settings):
+        crawler = get_crawler(GameParser, dict({
+            'CRAWL_STATE_ENABLED': False,
+            'METRICS_ENABLED': False,
+            'RATE_CONTROL_ENABLED': True,
+            'RATE_CONTROL_START_RATE': 4,
+            'RATE_CONTROL_BACKOFF': 5,
+        }, **settings))
+        spider = crawler._create_spider()
+        crawler.engine = SimpleNamespace(downloader=Downloader(crawler))
+        middleware = AdaptiveRateMiddleware.from_crawler(crawler)
+        middleware.clock = FakeClock()
+        return middleware, spider
+
+    def throttle(self, middleware, spider, request, retry_after=None):
+        headers = {'Retry-After': retry_after} if retry_after else {}
+        response = HtmlResponse(self.game_url, status=429, headers=headers,
+                                body=b'Too Many Requests')
+        return middleware.process_response(request, response, spider)
+
+    @staticmethod
+    def get_slot(spider, request):
+        _, slot = spider.crawler.engine.downloader._get_slot(request, spider)
+        return slot
+
+    def test_delay(self):
+        """Test, that requests wait in the downloader slot."""
+        middleware, spider = self.create_middleware()
+        request = Request(self.game_url)
+        assert middleware.process_request(request, spider) is None
+        slot = self.get_slot(spider, request)
+        assert slot.delay == 0.25
+        assert slot.concurrency == 4
+        assert spider.crawler.stats.get_value('ratecontrol/delayed') is None
+
+    def test_increase(self):
+        """Test additive increase of rate on successful responses."""
+        middleware, spider = self.create_middleware()
+        request = Request(self.game_url)
+        response = HtmlResponse(self.game_url, body=b'game')
+        for _ in range(8):
+            assert middleware.process_response(request, response,
+                                               spider) is response
+        stats = spider.crawler.stats
+        assert 4.9 < stats.get_value('ratecontrol/rate') < 5
+        assert stats.get_value('ratecontrol/concurrency') == 5
+
+    def test_throttled(self):
+        """Test requeue of throttled request and decrease of rate."""
+        middleware, spider = self.create_middleware()
+        request = Request(self.game_url)
+        retry = self.throttle(middleware, spider, request, retry_after='30')
+
+        assert isinstance(retry, Request)
+        assert retry.url == request.url and retry.dont_filter
+        assert retry.meta['throttle_retries'] == 1
+        stats = spider.crawler.stats
+        assert stats.get_value('ratecontrol/throttled') == 1
+        assert stats.get_value('ratecontrol/rate') == 2
+        assert stats.get_value('ratecontrol/concurrency') == 2
+        assert stats.get_value('retry/count') is None
+        # host is paused, so requests wait in the slot for Retry-After
+        assert middleware.process_request(Request(self.game_url),
+                                          spider) is None
+        slot = self.get_slot(spider, request)
+        assert slot.lastseen == middleware.clock.now + 30
+        assert slot.delay == 0.5
+        assert stats.get_value('ratecontrol/delayed') == 1
+
+    def test_cooldown(self):
+        """Test, that burst of 429 decreases rate once."""
+        middleware, spider = self.create_middleware()
+        for _ in range(5):
+            self.throttle(middleware, spider, Request(self.game_url))
+        assert spider.crawler.stats.get_value('ratecontrol/rate') == 2
+        middleware.clock.now += 10
+        self.throttle(middleware, spider, Request(self.game_url))
+        assert spider.crawler.stats.get_value('ratecontrol/rate') == 1
+
+    def test_backoff(self):
+        """Test exponential backoff without Retry-After."""
+        middleware, spider = self.create_middleware()
+        request = Request(self.game_url, meta={'throttle_retries': 3})
+        self.throttle(middleware, spider, request)
+        host_rate = middleware.controller.get('store.steampowered.com')
+        pause = host_rate.paused_until - middleware.clock.now
+        assert 20 <= pause <= 40
+
+    def test_give_up(self):
+        """Test, that response is passed after max retries."""
+        middleware, spider = self.create_middleware(
+            RATE_CONTROL_MAX_RETRIES=2
+        )
+        request = Request(self.game_url, meta={'throttle_retries': 2})
+        response = self.throttle(middleware, spider, request)
+        assert response.status == 429
+        assert spider.crawler.stats.get_value('ratecontrol/gave_up') == 1
@@ -0,0 +1,235 @@
+from datetime import datetime
+
+import sqlite3
+
+import pytest
+from scrapy.crawler import Crawler
+from scrapy.exceptions import NotConfigured
+from scrapy.http import HtmlResponse
+from scrapy.settings import Settings
+from scrapy.utils.test import get_crawler
+from twisted.python.failure import Failure
+
+from steamscraping.items import Game
+from steamscraping.recrawl import RecrawlQueue
+from steamscraping.spiders.game import GameParser
+from steamscraping.spiders.recrawl import RecrawlParser
+from tests.conftest import fake_response_from_file
+
+HOUR = 60 * 60
+DAY = 24 * HOUR
+
+
+class TestRecrawlQueue:
+    """Test class for testing priority queue of tracked games."""
+
+    @pytest.fixture
+    def queue(self, tmp_path):
+        queue = RecrawlQueue(str(tmp_path / 'recrawl.db'), min_interval=HOUR,
+                             max_interval=16 * HOUR, track_interval=30 * DAY)
+        yield queue
+        queue.close()
+
+    def test_interval(self, queue):
+        assert queue.interval(1) == HOUR
+        assert queue.interval(0.5) == 4 * HOUR
+        assert queue.interval(0) == 16 * HOUR
+
+    def test_update(self, queue):
+        """Test, that changed fields are detected and kept in history."""
+        release_date = datetime(2019, 8, 1)
+        assert queue.update(1, 999, 500, release_date, now=0) == ()
+        assert queue.update(1, 999, 500, None, now=HOUR) == ()
+        assert queue.update(1, 499, 600, None, now=2 * HOUR) == \
+            ('price', 'num_reviews')
+        assert queue.update(1, 499, 700, None, now=3 * HOUR) == \
+            ('num_reviews',)
+        assert queue.history(1) == [(0, 999, 500), (2 * HOUR, 499, 600),
+                                    (3 * HOUR, 499, 700)]
+        released_at, = queue.connection.execute(
+            'SELECT released_at FROM recrawl_games WHERE game_id = 1'
+        ).fetchone()
+        assert released_at == release_date.timestamp()
+
+    def test_due(self, queue):
+        """Test, that volatile and stale games are due first."""
+        for game_id in (1, 2, 3):
+            queue.update(game_id, 999, 500, None, now=0)
+        # game 1 changes on every fetch, game 2 never changes
+        for now in range(HOUR, 6 * HOUR, HOUR):
+            queue.update(1, 999, 500 + now, None, now=now)
+            queue.update(2, 999, 500, None, now=now)
+        assert len(queue) == 3
+        assert queue.due(5 * HOUR, limit=10) == [3]
+        # game 1 was fetched later, but it changes more often
+        assert queue.due(8 * HOUR, limit=10) == [1, 3]
+        assert queue.due(8 * HOUR, limit=1) == [1]
+        assert queue.count_due(8 * HOUR) == 2
+        assert queue.due(30 * HOUR, limit=10) == [1, 3, 2]
+
+    def test_postpone(self, queue):
+        queue.update(1, 999, 500, None, now=0)
+        queue.postpone(1, now=10 * HOUR)
+        queue.postpone(2, now=10 * HOUR)
+        assert queue.due(13 * HOUR, limit=10) == []
+        assert queue.due(14 * HOUR, limit=10) == [1]
+
+    def test_prune(self, queue):
+        """Test, that old games are not tracked anymore."""
+        now = datetime(2019, 8, 18).timestamp()
+        queue.update(1, 999, 500, datetime(2019, 8, 1), now=now)
+        queue.update(2, 999, 500, datetime(2019, 7, 1), now=now)
+        queue.update(3, 999, 500, 'Coming soon', now=now)
+        assert queue.prune(now) == 1
+        assert queue.due(now + 16 * HOUR, limit=10) == [1, 3]
+        assert queue.history(2)
+
+    def test_url(self, queue):
+        """Test, that url of the game is kept from previous fetches."""
+        url = 'https://store.steampowered.com/app/1/Game/'
+        queue.update(1, 999, 500, None, now=0, url=url)
+        queue.update(1, 999, 500, None, now=HOUR)
+        queue.update(2, 999, 500, None, now=0)
+        assert queue.due_games(30 * HOUR, limit=10) == [(2, None), (1, url)]
+
+    def test_previous_version(self, tmp_path):
+        """Test, that url column is added to queue without it."""
+        path = str(tmp_path / 'recrawl.db')
+        connection = sqlite3.connect(path)
+        connection.execute(
+            'CREATE TABLE recrawl_games (game_id INTEGER PRIMARY KEY, '
+            'released_at REAL, fetched_at REAL NOT NULL, '
+            'due_at REAL NOT NULL, interval REAL NOT NULL, '
+            'volatility REAL NOT NULL, price INTEGER, num_reviews INTEGER)'
+        )
+        connection.execute('INSERT INTO recrawl_games VALUES '
+                           '(1, NULL, 0, 0, 3600, 0.5, 999, 500)')
+        connection.commit()
+        connection.close()
+
+        queue = RecrawlQueue(path, min_interval=HOUR, max_interval=HOUR)
+        assert queue.due_games(HOUR, limit=10) == [(1, None)]
+        queue.close()
+
+    def test_persistence(self, tmp_path):
+        path = str(tmp_path / 'recrawl.db')
+        queue = RecrawlQueue(path, min_interval=HOUR, max_interval=HOUR)
+        queue.update(1, 999, 500, None, now=0)
+        queue.close()
+
+        queue = RecrawlQueue(path, min_interval=HOUR, max_interval=HOUR)
+        assert queue.due(HOUR, limit=10) == [1]
+        queue.close()
+
+
+class TestRecrawlParser:
+    """Test class for testing refetching of tracked games."""
+
+    @staticmethod
+    def create_spider(tmp_path, spidercls=RecrawlParser, **settings):
+        crawler = get_crawler(spidercls, dict({
+            'RECRAWL_ENABLED': True,
+            'RECRAWL_QUEUE_PATH': str(tmp_path / 'recrawl.db'),
+            'RECRAWL_MIN_INTERVAL': 0.001,
+            'RECRAWL_MAX_INTERVAL': 0.001,
+            'RECRAWL_TRACK_DAYS': 0,
+            'RECRAWL_BATCH_SIZE': 10,
+        }, **settings))
+        return crawler._create_spider()
+
+    def test_track_games(self, tmp_path):
+        """Test, that games of the games crawl are added to the queue."""
+        spider = self.create_spider(tmp_path, spidercls=GameParser)
+        spider._save_game_state(Game(game_id=620, price=999,
+                                     num_reviews=1000))
+        spider._save_game_state(Game(game_id=620, price=499,
+                                     num_reviews=1000))
+        assert len(spider.recrawl_queue) == 1
+        stats = spider.crawler.stats
+        assert stats.get_value('recrawl/tracked') == 2
+        assert stats.get_value('recrawl/changed/price') == 1
+        assert stats.get_value('recrawl/changed/num_reviews') is None
+        spider.closed('finished')
+
+    def test_start_requests(self, tmp_path):
+        """Test, that due games are requested in order of the queue."""
+        spider = self.create_spider(tmp_path,
+                                    GAME_EXTRACTION_MODE='appdetails')
+        for now, game_id in enumerate((30, 10, 20)):
+            spider.recrawl_queue.update(game_id, 999, 1000, None, now=now)
+        requests = list(spider.start_requests())
+        assert [request.meta['game_id'] for request in requests] == \
+            [30, 10, 20]
+        assert requests[0].meta['game_url'] == \
+            'https://store.steampowered.com/app/30/'
+        assert [request.priority for request in requests] == [0, -1, -2]
+        assert spider.crawler.stats.get_value('recrawl/due') == 3
+
+        # failed game is not due until the next interval
+        failure = Failure(Exception('Connection refused'))
+        failure.request = requests[0]
+        spider.game_failed(failure)
+        assert spider.recrawl_queue.due(HOUR, limit=10) == [10, 20]
+        assert spider.crawler.stats.get_value('recrawl/failed') == 1
+        spider.closed('finished')
+
+    @pytest.mark.parametrize('spidercls, filtered', [
+        (GameParser, True),
+        (RecrawlParser, False),
+    ])
+    def test_filters(self, tmp_path, spidercls, filtered):
+        """Test, that refetched games are not filtered by release date and
+        num of reviews."""
+        spider = self.create_spider(tmp_path, spidercls,
+                                    CRAWL_STATE_ENABLED=False,
+                                    DAYS_EARLIER=30, REVIEWS_TO_PASS=500000)
+        response = fake_response_from_file(
+            'app_620.html', 'https://store.steampowered.com/app/620/',
+            response_class=HtmlResponse
+        )
+        game, = spider.parse_game(response)
+        assert game['game_id'] == 620
+        if filtered:
+            assert 'release_date' not in game
+            assert 'num_reviews' not in game
+        else:
+            assert game['release_date'] == datetime(2011, 4, 18)
+            assert game['num_reviews'] == 187443
+        spider.closed('finished')
+
+    def test_canonical_url(self, tmp_path):
+        """Test, that games are refetched by urls of their pages."""
+        spider = self.create_spider(tmp_path, CRAWL_STATE_ENABLED=False)
+        response = fake_response_from_file(
+            'app_620.html',
+            'https://store.steampowered.com/app/620/Portal_2/'
+            '?snr=1_7_7_230_150_1',
+            response_class=HtmlResponse
+        )
+        list(spider.parse_game(response))
+        # game is due at once
+        spider.recrawl_queue.postpone(620, now=0)
+        request, = spider.start_requests()
+        assert request.url == \
+            'https://store.steampowered.com/app/620/Portal_2/'
+        spider.closed('finished')
+
+    def test_not_configured(self, tmp_path):
+        """Test, that spider fails without recrawl queue (-s
+        RECRAWL_ENABLED=0 overrides settings of the spider)."""
+        settings = Settings({'RECRAWL_QUEUE_PATH':
+                             str(tmp_path / 'recrawl.db'),
+                             'REQUEST_FINGERPRINTER_IMPLEMENTATION': '2.7'})
+        settings.set('RECRAWL_ENABLED', False, priority='cmdline')
+        crawler = Crawler(RecrawlParser, settings)
+        with pytest.raises(NotConfigured):
+            crawler._create_spider()
+
+    def test_time_budget(self, tmp_path):
+        """Test, that no games are requested after the time budget."""
+        spider = self.create_spider(tmp_path, RECRAWL_TIME_BUDGET=-1)
+        spider.recrawl_queue.update(10, 999, 1000, None, now=0)
+        assert list(spider.start_requests()) == []
+        assert spider.crawler.stats.get_value('recrawl/deferred') == 1
+        spider.closed('finished')
+
@@ -0,0 +1,150 @@
+from unittest.mock import MagicMock
+
+import pytest
+from scrapy import Request
+from scrapy.exceptions import DontCloseSpider
+from scrapy.utils.test import get_crawler
+
+from steamscraping.sharding import SqliteShardQueue
+from steamscraping.spiders.game import GameParser
+
+STORE_URL = 'https://store.steampowered.com'
+
+
+def game(app_id):
+    return app_id, '{}/app/{}/'.format(STORE_URL, app_id)
+
+
+class TestSqliteShardQueue:
+    """Test class for testing shared queue of games."""
+
+    @pytest.fixture
+    def queue(self, tmp_path):
+        queue = SqliteShardQueue(str(tmp_path / 'shards.db'), 'test',
+                                 num_shards=2, claim_timeout=60)
+        yield queue
+        queue.close()
+
+    def test_claim(self, queue):
+        """Test claiming games of own shard before other shards."""
+        queue.put([game(10), game(11), game(12), game(13)])
+        queue.put([game(10)])
+        assert queue.claim('a', 0, 1, now=0) == [game(10)]
+        assert queue.claim('b', 1, 10, now=0) == [game(11), game(13),
+                                                  game(12)]
+        assert queue.claim('a', 0, 10, now=0) == []
+
+    def test_workers(self, tmp_path):
+        """Test, that workers with own connections share games."""
+        path = str(tmp_path / 'shards.db')
+        first = SqliteShardQueue(path, 'test', num_shards=2)
+        second = SqliteShardQueue(path, 'test', num_shards=2)
+        first.put([game(10), game(11)])
+        second.put([game(10), game(12)])
+        claimed = (first.claim('a', 0, 10, now=0) +
+                   second.claim('b', 1, 10, now=0))
+        assert sorted(claimed) == [game(10), game(11), game(12)]
+        first.close()
+        second.close()
+
+    def test_finished(self, queue):
+        """Test, that crawl is finished after discovery and all games."""
+        queue.put([game(10)])
+        queue.finish_discovery()
+        assert not queue.is_finished(now=0)
+        queue.claim('a', 0, 10, now=0)
+        assert queue.is_finished(now=0)
+        # worker of claimed game is considered dead after timeout
+        assert not queue.is_finished(now=100)
+        assert queue.claim('b', 1, 10, now=100) == [game(10)]
+        queue.done(10)
+        assert queue.is_finished(now=1000)
+        assert queue.count() == {SqliteShardQueue.DONE: 1}
+
+    def test_start_discovery(self, queue):
+        """Test, that the next run with the same crawl id starts again."""
+        queue.put([game(10)])
+        queue.finish_discovery()
+        queue.claim('a', 0, 10, now=0)
+        queue.done(10)
+        queue.save_stats('a', {'item_scraped_count': 1})
+        assert queue.is_finished(now=0)
+
+        queue.start_discovery()
+        assert not queue.is_finished(now=0)
+        assert queue.stats() == {}
+        queue.put([game(10)])
+        assert queue.claim('a', 0, 10, now=0) == [game(10)]
+
+    def test_stats(self, queue):
+        """Test aggregation of stats of workers."""
+        queue.save_stats('a', {'item_scraped_count': 3, 'finish_reason':
+                               'finished'})
+        queue.save_stats('b', {'item_scraped_count': 4})
+        assert queue.stats() == {'item_scraped_count': 7}
+
+
+class TestShardedSpider:
+    """Test class for testing crawling of shared queue by spider."""
+
+    @staticmethod
+    def create_spider(tmp_path, index):
+        crawler = get_crawler(GameParser, {
+            'CRAWL_STATE_ENABLED': False,
+            'SHARDING_ENABLED': True,
+            'SHARD_COUNT': 2,
+            'SHARD_INDEX': index,
+            'SHARD_CRAWL_ID': 'test',
+            'SHARD_QUEUE_CLASS': 'steamscraping.sharding.SqliteShardQueue',
+            'SHARD_QUEUE_PATH': str(tmp_path / 'shards.db'),
+        })
+        spider = crawler._create_spider()
+        crawler.engine = MagicMock()
+        return spider
+
+    def test_discovery(self, tmp_path):
+        """Test, that only the first worker discovers games."""
+        discovering = self.create_spider(tmp_path, 0)
+        worker = self.create_spider(tmp_path, 1)
+        assert list(discovering.start_requests())
+        assert not list(worker.start_requests())
+
+        request = Request(STORE_URL + '/app/11/Game/?snr=1_7_7_230_150_1')
+        assert discovering.process_game_request(request) is None
+        discovering.shard_queue.flush()
+        with pytest.raises(DontCloseSpider):
+            worker.spider_idle(worker)
+
+        scheduled = worker.crawler.engine.crawl.call_args[0][0]
+        assert scheduled.url == STORE_URL + '/app/11/Game/'
+        assert scheduled.callback == worker.parse_game
+        assert scheduled.meta['shard_claimed'] is True
+
+    def test_next_run(self, tmp_path):
+        """Test, that games of the previous run with the same crawl id are
+        crawled again."""
+        spider = self.create_spider(tmp_path, 0)
+        spider.shard_queue.put([game(10)])
+        spider.shard_queue.done(10)
+        spider.shard_queue.finish_discovery()
+        spider.closed('finished')
+
+        spider = self.create_spider(tmp_path, 0)
+        assert not spider.shard_queue.is_finished(now=0)
+        request = Request(STORE_URL + '/app/10/')
+        assert spider.process_game_request(request) is None
+        with pytest.raises(DontCloseSpider):
+            spider.spider_idle(spider)
+        assert spider.crawler.stats.get_value('sharding/claimed') == 1
+
+    def test_idle(self, tmp_path):
+        """Test, that spider is closed after discovery and all games."""
+        spider = self.create_spider(tmp_path, 0)
+        spider.shard_queue.put([game(10)])
+        with pytest.raises(DontCloseSpider):
+            spider.spider_idle(spider)
+        assert spider.shard_queue.is_finished(now=0) is True
+
+        spider._save_game_state({'game_id': 10})
+        spider.spider_idle(spider)
+        assert spider.crawler.stats.get_value('sharding/done') == 1